@@ -1,194 +1,511 @@
 import os
 import sys
 import io
-
-import numpy as np
-import pandas as pd
+import uuid
+import logging
+import threading
 
 import streamlit as st
-import pdfplumber
 from pathlib import Path
-import tempfile
 
-import ib_result_handler_summary as data_handler_sum
-import ib_result_handler_subject as data_handler_sub
-#import ib_result_consolidator as consolidator
+import ib_result_cache as data_cache
+import ib_result_perf as data_perf
+import ib_result_pipeline as data_pipeline
+import ib_result_session as data_session
+import ib_result_jobs as data_jobs
+import ib_result_lazy as data_lazy
+
+# Modules that pull in pandas, pdfplumber or openpyxl load when first used (the first upload,
+# consolidation or download), so a new session renders without them
+data_handler_sum    = data_lazy.lazy_import('ib_result_handler_summary')
+data_handler_sub    = data_lazy.lazy_import('ib_result_handler_subject')
+data_pdf            = data_lazy.lazy_import('ib_result_pdf')
+data_detect         = data_lazy.lazy_import('ib_result_detect')
+consolidator        = data_lazy.lazy_import('ib_result_consolidator')
+data_export         = data_lazy.lazy_import('ib_result_export')
+data_viewer         = data_lazy.lazy_import('ib_result_viewer')
+data_archive        = data_lazy.lazy_import('ib_result_archive')
+
+logger = logging.getLogger(__name__)
+
+# Rows shown in the live preview while extraction is still running
+INT_PREVIEW_ROWS = 20
+# Seconds between status refreshes while a consolidation job is waiting or running
+FLOAT_JOB_POLL_S = 1.0
+
+
+@st.cache_resource(show_spinner=False)
+def get_archive(str_path):
+    """The ResultArchive at str_path, shared by all sessions (its schema is set up once)."""
+    return data_archive.ResultArchive(str_path)
+
+
+class ExtractionProgress:
+    """
+    Progress of extraction in a consolidation job: pages and rows per file, and a preview
+    of the first parsed rows while the rest are still being extracted. Updated from the
+    job's thread; render() draws it on the script thread while the page polls the job.
+    """
+
+    def __init__(self, int_preview_rows=INT_PREVIEW_ROWS):
+        self.int_preview_rows = int_preview_rows
+        # file label -> [pages done, page count, rows, finished]
+        self.dict_files = {}
+        self.str_preview_label = None
+        self.preview = data_pdf.ColumnBuffer()
+        self.lock = threading.Lock()
+
+    def start(self, str_label):
+        """Start tracking one file; returns the callback for handler.extract_results."""
+        with self.lock:
+            self.dict_files[str_label] = [0, 0, 0, False]
+            # Preview the first file only; the reports have different columns
+            if self.str_preview_label is None:
+                self.str_preview_label = str_label
+
+        def func_progress(int_done, int_count, dict_batch):
+            int_batch = max((len(v) for v in dict_batch.values()), default=0)
+            with self.lock:
+                lst_file = self.dict_files[str_label]
+                lst_file[0], lst_file[1] = int_done, int_count
+                lst_file[2] += int_batch
+                if str_label == self.str_preview_label and int_batch and self.preview.int_rows < self.int_preview_rows:
+                    self.preview.extend(dict_batch)
+
+        return func_progress
+
+    def finish(self, str_label, int_rows):
+        """Mark a file as done (also covers cache hits, where no page callbacks run)."""
+        with self.lock:
+            lst_file = self.dict_files[str_label]
+            lst_file[2], lst_file[3] = int_rows, True
+
+    def render(self):
+        with self.lock:
+            dict_files = {str_label: list(lst_file) for str_label, lst_file in self.dict_files.items()}
+            df_preview = self.preview.to_frame().head(self.int_preview_rows) if self.preview.int_rows else None
+        for str_label, (int_done, int_count, int_rows, bool_finished) in dict_files.items():
+            if bool_finished:
+                st.progress(1.0, text=f"{str_label}: {int_rows:,} rows")
+            elif int_count:
+                st.progress(int_done / int_count, text=f"{str_label}: page {int_done} of {int_count}")
+            else:
+                st.progress(0.0, text=f"{str_label}: extracting...")
+        st.markdown(f"**{sum(lst_file[2] for lst_file in dict_files.values()):,}** rows extracted")
+        if df_preview is not None and not all(lst_file[3] for lst_file in dict_files.values()):
+            st.dataframe(df_preview)
+
 
 class IBResultProcessor:
     def __init__(self):
-        self.file_types = {
-            'Results summary'       : 'IB Result (Student Level)',
-            'Subject Results'       : 'IB Result (Subject Level)',
-            '(EXTENDED ESSAY)'      : 'IB Result (Subject Level) - Extended Essay',
-            '(THEORY OF KNOWLEDGE)' : 'IB Result (Subject Level) - Theory of Knowledge'
-        }
-
-        self.file_type_header_map = {
-            'Results summary'       :   '',
-            '(EXTENDED ESSAY)'      :   '_sub_ee',
-            '(THEORY OF KNOWLEDGE)' :   '_sub_tk',
-            'Subject Results'       :   '_sub'
-        }
-
-        self.merge_steps = {
-            "Subject Results": {
-                'merge_file_substring'  : '',
-                'index_cols'            : ['session_number', 'personal_code', 'subject'],
-                'merge_cols'            : ['pg', 'scaled_total'],
-                'rename_map'            : {'pg': 'PG'}
-            },
-            "(EXTENDED ESSAY)": {
-                'merge_file_substring'  : '(EXTENDED ESSAY)',
-                'index_cols'            : ['session_number', 'personal_code', 'subject'],
-                'merge_cols'            : ['pg'],
-                'rename_map'            : {'pg': 'ee_pg'}
-            },
-            "(THEORY OF KNOWLEDGE)": {
-                'merge_file_substring'  : '(THEORY OF KNOWLEDGE)',
-                'index_cols'            : ['session_number', 'personal_code', 'subject'],
-                'merge_cols'            : ['pg'],
-                'rename_map'            : {'pg': 'tk_pg'}
-            }
-        }
+        # Report types and merge steps shared with the batch CLI
+        self.file_types = data_pipeline.dict_file_types
+        self.file_type_header_map = data_pipeline.dict_header_map
+        self.merge_steps = data_pipeline.dict_merge_steps
+
+        # Extraction processes per PDF (None = IB_EXTRACT_WORKERS env / serial, 0 = all CPUs)
+        self.int_extract_workers = None
+        # Parsed records are cached on disk by content hash, so unchanged PDFs are never re-parsed
+        self.extraction_cache = data_cache.ExtractionCache()
 
         # Initialize session state
         if 'processed_files' not in st.session_state:
             st.session_state.processed_files = {key: None for key in self.file_types}
         
-        if 'consolidated_df' not in st.session_state:
-            st.session_state.consolidated_df = None
-            
-        if 'formatted_df' not in st.session_state:
-            st.session_state.formatted_df = None
+        # Uploads seen so far: Streamlit file_id -> ((name, size, SHA-256), detected header or None)
+        if 'uploads' not in st.session_state:
+            st.session_state.uploads = {}
+
+        # Identifies the current results (see results_fingerprint) for the export cache
+        if 'results_fingerprint' not in st.session_state:
+            st.session_state.results_fingerprint = None
+
+        # Report display name -> its rows the merge left out for duplicate keys, of the current results
+        if 'dropped_rows' not in st.session_state:
+            st.session_state.dropped_rows = {}
+
+        # Memoized consolidation stages; a re-run only recomputes what a changed file affects
+        if 'pipeline' not in st.session_state:
+            st.session_state.pipeline = data_pipeline.ResultPipeline(self.merge_steps, self.file_types)
+
+        # Extraction results shared with other sessions that uploaded the same PDFs
+        if 'leases' not in st.session_state:
+            st.session_state.leases = data_cache.ResultLeases()
+
+        # Result frames ('consolidated_df', 'formatted_df') within the session's memory budget;
+        # over budget they are spilled to disk and mapped back in when shown or downloaded
+        if 'store' not in st.session_state:
+            st.session_state.store = data_session.SessionStore(pipeline=st.session_state.pipeline,
+                                                               leases=st.session_state.leases,
+                                                               sources=st.session_state.processed_files)
+
+        # Filter indexes of the shown results: frame name -> (results fingerprint, ResultIndex)
+        if 'result_indexes' not in st.session_state:
+            st.session_state.result_indexes = {}
+
+        # Consolidation runs as a job on the shared queue; the session polls it until it finishes
+        if 'user_id' not in st.session_state:
+            st.session_state.user_id = uuid.uuid4().hex
+        if 'job' not in st.session_state:
+            st.session_state.job = None
+            st.session_state.job_progress = None
+            st.session_state.job_message = None
+
+        # Stage timings for this session; each stage/file keeps its latest measurement
+        if 'perf' not in st.session_state:
+            st.session_state.perf = data_perf.PerfRecorder()
 
     # =============================================================================================
 
 
     # =============================================================================================
     # get header of the file
-    def detect_file_type(self, pdf_path):
-        """Detect the type of IB result file based on its first page content."""
+    def detect_file_type(self, pdf_source):
+        """
+        Detect the type of IB result file from the text of its first page.
+        Returns (header, confidence); header is None if no known header was found.
+        """
         try:
-            with pdfplumber.open(pdf_path) as pdf:
-                if not pdf.pages:
-                    st.warning(f"Warning: Could not read pages from a PDF.")
-                    return None
-                first_page_text = pdf.pages[0].extract_text()
-                for header in self.file_type_header_map:
-                    if header in first_page_text:
-                        return header
-                print(first_page_text)
-            return None
+            # Sessions detecting the same PDF at the same time share one detection
+            file_type, float_confidence = data_cache.shared_results.run(
+                f"detect-{pdf_source.str_digest}",
+                lambda: data_detect.detect_file_type(pdf_source, self.file_type_header_map)
+            )
+            if file_type is None:
+                st.warning(f"Warning: No known IB result header on the first page of the PDF.")
+            return file_type, float_confidence
         except Exception as e:
             st.error(f"Error reading PDF: {str(e)}")
-            return None
+            return None, 0.0
 
-    def process_uploaded_file(self, uploaded_file):
-        """Process the uploaded file and return its type"""
+    def process_uploaded_file(self, uploaded_file, source=None):
+        """Process the uploaded file and return its type and detection confidence"""
         if uploaded_file is not None:
-            # Create a temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-                tmp_file.write(uploaded_file.getvalue())
-                file_type = self.detect_file_type(tmp_file.name)
-                
-                print("======")
-                print(file_type)
-                print("======")
-                #sys.exit()
-
-                if file_type:
-                    # Store the temp file path in session state
-                    st.session_state.processed_files[file_type] = tmp_file.name
-                    return file_type
-                else:
-                    st.error("Could not determine file type")
-                    return None
-
-    def consolidate_data(self):
-        """Consolidates data using the file paths stored in session_state."""
-        # You would adapt your existing consolidation logic to read from the paths
-        # in st.session_state.processed_files.
-        # This is a placeholder for your detailed logic.
+            # Keep the upload in memory; detection and extraction share its PDF handle
+            if source is None:
+                source = data_pdf.PdfSource(uploaded_file.getvalue(), uploaded_file.name)
+            with st.session_state.perf.stage('detect', bool_replace=True, file=uploaded_file.name):
+                file_type, float_confidence = self.detect_file_type(source)
+
+            logger.debug("Detected %r as %s (confidence %.2f)", uploaded_file.name, file_type, float_confidence)
+
+            if file_type:
+                # Replacing a file of the same type releases the old one (handle and any spill file)
+                old_source = st.session_state.processed_files[file_type]
+                if old_source is not None:
+                    old_source.close()
+                st.session_state.processed_files[file_type] = source
+                return file_type, float_confidence
+            else:
+                source.close()
+                st.error("Could not determine file type")
+                return None, 0.0
+        return None, 0.0
+
+    def sync_uploads(self, uploaded_files):
+        """
+        Bring processed_files in line with the files in the uploader.
+        Uploads are tracked by Streamlit's file_id; a new one is hashed once and identified by
+        (name, size, SHA-256). Only new uploads whose identity is not already tracked are
+        detected (a re-upload of the same file is not), and a corrected file under the same
+        name is picked up since its hash differs. A removed upload drops its file from
+        processed_files, falling back to another upload of that type still in the uploader.
+        Returns [(uploaded_file, header, confidence)] for the uploads detected in this run.
+        """
+        dict_uploads = st.session_state.uploads
+        dict_files = {uploaded_file.file_id: uploaded_file for uploaded_file in uploaded_files or []}
+        lst_processed = []
+
+        # Removed uploads
+        set_evicted = set()
+        for file_id in [file_id for file_id in dict_uploads if file_id not in dict_files]:
+            identity, file_type = dict_uploads.pop(file_id)
+            source = st.session_state.processed_files.get(file_type) if file_type else None
+            if source is not None and source.str_digest == identity[2] and \
+                    not any(other == identity for other, _ in dict_uploads.values()):
+                source.close()
+                st.session_state.processed_files[file_type] = None
+                set_evicted.add(file_type)
+
+        # New uploads, in uploader order
+        for file_id, uploaded_file in dict_files.items():
+            if file_id in dict_uploads:
+                continue
+            source = data_pdf.PdfSource(uploaded_file.getvalue(), uploaded_file.name)
+            identity = (uploaded_file.name, uploaded_file.size, source.str_digest)
+            tracked = next((file_type for other, file_type in dict_uploads.values() if other == identity), False)
+            if tracked is not False:
+                dict_uploads[file_id] = (identity, tracked)
+                continue
+            file_type, float_confidence = self.process_uploaded_file(uploaded_file, source)
+            dict_uploads[file_id] = (identity, file_type)
+            set_evicted.discard(file_type)
+            lst_processed.append((uploaded_file, file_type, float_confidence))
+
+        # A type whose file was removed falls back to the latest other upload of that type
+        for file_type in set_evicted:
+            for file_id, (identity, other_type) in reversed(dict_uploads.items()):
+                if other_type == file_type:
+                    uploaded_file = dict_files[file_id]
+                    st.session_state.processed_files[file_type] = data_pdf.PdfSource(uploaded_file.getvalue(),
+                                                                                     uploaded_file.name)
+                    break
+        # New PDFs count towards the session's memory budget
+        if lst_processed:
+            st.session_state.store.enforce_budget()
+        return lst_processed
+
+    def extraction_key(self, header, source):
+        """Key of a PDF's extraction result, in the extraction cache and in SharedResults."""
+        handler = data_handler_sum if header == data_pipeline.STR_MAIN_HEADER else data_handler_sub
+        return self.extraction_cache.make_key(handler, source.str_digest)
+
+    def consolidate_data(self, dict_sources, pipeline, perf, progress, leases):
+        """
+        Consolidates data from the in-memory PDFs in dict_sources (a snapshot of
+        st.session_state.processed_files).
+        A PDF another session is already extracting is not extracted again: the job waits
+        for that extraction and shares its result through leases (ResultLeases).
+        Runs as a job on the shared job queue, off the script thread, so it does not use
+        st.* or st.session_state; extraction progress goes to progress (ExtractionProgress).
+        Returns (df_merged, df_merged_final, key of the results, {report: source rows
+        not merged because of duplicate keys}).
+        """
         try:
-
-            #======================================================================================
-            #print("========= Process Summary File ==========")
-
-            student_file = st.session_state.processed_files['Results summary']
-            if not student_file:
-                st.error("Student Level Result file is required for processing!")
-                return None, None
-
-            # --- This part should be adapted from your `ib_result_consolidator.py` ---
-            # For demonstration, we'll create dummy dataframes.
-            # In your real app, you would call your extraction and merging functions here.
-            
-
-
-            #======================================================================================
-            # 1.0 Extract from student file
-            df_main = data_handler_sum.extract_results(student_file)
-            df_main = data_handler_sum.reformat_results(df_main)
-            
-            #======================================================================================
-            # 1.2 Extract from Subject file
-            df_sub = pd.DataFrame()
-            for key in self.file_types:
-                if key != next(iter(self.file_types)):
-                    print(key)
-                    subject_file = st.session_state.processed_files[key]
-                    if subject_file:
-                        print(key)
-                        tmp_df_sub, str_subject_type = data_handler_sub.extract_results(subject_file)
-                        #df_sub = pd.concat([df_sub, tmp_df_sub], ignore_index=True)
-                        tmp_df_sub = data_handler_sub.reformat_results(tmp_df_sub)
-
-                        #==========================================================================
-                        # 1.2.1 Format from Subject file
-                        step = self.merge_steps[key]
-                        cols_to_use = step['index_cols'] + step['merge_cols']
-                        #df_merge = df_sub[cols_to_use]
-                        df_merge = tmp_df_sub[cols_to_use]
-
-                        if step['rename_map']:
-                            df_merge = df_merge.rename(columns=step['rename_map'])
-                        df_merged = pd.merge(df_main, df_merge, on=step['index_cols'], how='left', suffixes=('', '_new'))
-                        # If any columns are meant to update existing ones, do so
-                        for col in step['merge_cols']:
-                            target_col = step['rename_map'][col] if step['rename_map'] and col in step['rename_map'] else col
-                            if target_col in df_main.columns and f"{target_col}_new" in df_merged.columns:
-                                df_merged[target_col] = df_merged[f"{target_col}_new"].combine_first(df_merged[target_col])
-                                df_merged.drop(columns=[f"{target_col}_new"], inplace=True)
-                        #==========================================================================
-                        df_main = df_merged.copy()
-                        #df_sub = pd.concat([df_sub, tmp_df_sub], ignore_index=True)
-                        #==========================================================================
-            #df_sub = data_handler_sub.reformat_results(df_sub)
             #======================================================================================
-
-            # Format and save to CSV/Excel
-            #df_sub         = data_handler_sum.reformat_results_sub(df_main)
-            #df_overall     = data_handler_sum.reformat_results_overall(df_main)
-            df_sub          = data_handler_sum.reformat_results_sub(df_merged)
-            df_overall      = data_handler_sum.reformat_results_overall(df_merged)
-            df_merged_final = pd.merge(df_sub, df_overall, on=data_handler_sum.common_keys, how='outer')
+            # 1.0 Extract and reformat each file, merge the subject files into the student file
+            #     step by step and reshape; stages whose inputs did not change are reused.
+            #     Pages are extracted on the process pool shared by all sessions' jobs
+            def func_extract(header, handler, source):
+                func_progress = progress.start(self.file_types[header])
+                def extract():
+                    return self.extraction_cache.extract_results(
+                        handler, source, source.str_digest,
+                        int_workers=self.int_extract_workers, func_progress=func_progress,
+                        executor=data_jobs.job_queue.process_pool()
+                    )
+                result = leases.acquire(self.extraction_key(header, source), extract)
+                progress.finish(self.file_types[header], len(result[0] if isinstance(result, tuple) else result))
+                return result
+
+            df_merged, df_merged_final = pipeline.run(dict_sources, func_extract, perf)
+            # Let go of shared results of PDFs that were replaced since the last run
+            leases.retain({self.extraction_key(header, source)
+                           for header, source in dict_sources.items() if source is not None})
             #======================================================================================
-            return df_merged, df_merged_final
-
             # df_merged - Raw
             # df_merged_final - formatted
-            #df_main = df_merged.copy()
-            #formatted_df = df_merged_final.copy()
-            #return df_main, formatted_df
+            return df_merged, df_merged_final, pipeline.str_result_key, pipeline.dropped_rows()
 
-        except Exception as e:
-            st.error(f"Error during consolidation: {str(e)}")
-            return None, None
+        finally:
+            # Release PDF handles and spill files now; the bytes stay in session for the next run
+            for source in dict_sources.values():
+                if source is not None:
+                    source.close()
 
+    def submit_consolidation(self):
+        """Queue consolidation of the uploaded files as this session's job."""
+        progress = ExtractionProgress()
+        try:
+            job = data_jobs.job_queue.submit(
+                st.session_state.user_id, self.consolidate_data,
+                dict(st.session_state.processed_files), st.session_state.pipeline,
+                st.session_state.perf, progress, st.session_state.leases
+            )
+        except data_jobs.QueueFullError as e:
+            st.error(f"The server is busy ({e}). Please try again in a moment.")
+            return
+        st.session_state.job = job
+        st.session_state.job_progress = progress
+        # Idle eviction must not release the pipeline and leases the job is using
+        st.session_state.store.job = job
+
+    def collect_job(self):
+        """Attach the results of this session's job to the session once it has finished."""
+        job = st.session_state.job
+        if job is None or not job.done():
+            return
+        st.session_state.job = None
+        st.session_state.job_progress = None
+        st.session_state.store.job = None
+        if job.state == 'done':
+            consolidated_df, formatted_df, str_results_key, st.session_state.dropped_rows = job.result
+            st.session_state.store.put('consolidated_df', consolidated_df)
+            st.session_state.store.put('formatted_df', formatted_df)
+            st.session_state.results_fingerprint = str_results_key
+            st.session_state.job_message = ('success', "Data processing complete!", None)
+        else:
+            logger.error("Consolidation job of %s failed:\n%s", st.session_state.user_id, job.str_traceback)
+            st.session_state.job_message = ('error', f"Error during consolidation: {str(job.error)}",
+                                            job.str_traceback)
+
+    def show_job_status(self):
+        """Status of this session's job, refreshed every FLOAT_JOB_POLL_S seconds until it finishes."""
+        @st.fragment(run_every=FLOAT_JOB_POLL_S)
+        def job_status():
+            job = st.session_state.job
+            if job is None:
+                return
+            # Fragment reruns skip the full run's touch(); a waiting session is not idle
+            st.session_state.store.touch()
+            if job.done():
+                # A full run attaches the results and shows them
+                st.rerun()
+            if job.state == 'queued':
+                int_position = data_jobs.job_queue.position(job) or 0
+                st.info(f"Waiting for a free worker ({int_position} job(s) ahead)...")
+            else:
+                st.caption(f"Processing... {job.seconds():.0f}s")
+                st.session_state.job_progress.render()
+        job_status()
+
+    def export_download_button(self, str_label, str_frame, str_format, str_file_name, str_mime):
+        """
+        Download button for the stored frame str_frame as str_format ('csv', 'xlsx', 'parquet', 'arrow').
+        The file is built only when the button is clicked (on a separate thread, without a
+        rerun) and kept in the shared export cache under the results fingerprint, so
+        reruns never serialise or hash the data, nor reload a spilled frame.
+        """
+        store = st.session_state.store
+        str_fingerprint = st.session_state.results_fingerprint
+        if str_fingerprint is not None:
+            str_fingerprint = f"{str_fingerprint}/{str_frame}"
+        perf = st.session_state.perf
+
+        def build_export():
+            with perf.stage(f'export_{str_format}', bool_replace=True, file=str_frame) as stage:
+                def load():
+                    df = store.get(str_frame)
+                    stage.rows = len(df)
+                    return df
+                return data_export.export_cache.get(load, str_format, str_fingerprint)
+
+        st.download_button(
+            label=str_label,
+            data=build_export,
+            file_name=str_file_name,
+            mime=str_mime,
+            on_click="ignore"
+        )
+
+    def show_result_grid(self, str_frame):
+        """
+        One page of the stored frame str_frame, with candidate, subject and result filters.
+        Filters are answered from the frame's ResultIndex (built once per result) and only
+        the rows of the visible page are materialised and sent to the browser.
+        """
+        store = st.session_state.store
+        str_fingerprint = st.session_state.results_fingerprint
+        entry = st.session_state.result_indexes.get(str_frame)
+        if entry is None or entry[0] != str_fingerprint:
+            entry = (str_fingerprint, data_viewer.ResultIndex(store.get(str_frame)))
+            st.session_state.result_indexes[str_frame] = entry
+        result_index = entry[1]
+
+        str_page_key = f'{str_frame}_page'
+        def reset_page():
+            st.session_state[str_page_key] = 1
+
+        col_candidate, col_subject, col_result = st.columns(3)
+        str_candidate = col_candidate.text_input(
+            "Candidate", key=f'{str_frame}_candidate', on_change=reset_page,
+            placeholder="Session number, code or name"
+        )
+        str_subject = col_subject.selectbox(
+            "Subject", result_index.subjects(), index=None, placeholder="All subjects",
+            key=f'{str_frame}_subject', on_change=reset_page
+        )
+        str_result = col_result.selectbox(
+            "Result", result_index.results(), index=None, placeholder="All results",
+            key=f'{str_frame}_result', on_change=reset_page
+        )
+        rows = result_index.select(str_candidate, str_subject, str_result)
 
+        col_rows, col_page, col_status = st.columns([1, 1, 2])
+        int_page_rows = col_rows.selectbox(
+            "Rows per page", data_viewer.lst_page_rows,
+            index=data_viewer.lst_page_rows.index(data_viewer.INT_PAGE_ROWS),
+            key=f'{str_frame}_page_rows', on_change=reset_page
+        )
+        int_pages = max(1, -(-len(rows) // int_page_rows))
+        if st.session_state.get(str_page_key, 1) > int_pages:
+            st.session_state[str_page_key] = int_pages
+        int_page = col_page.number_input("Page", min_value=1, max_value=int_pages, step=1, key=str_page_key)
+        rows_page = rows[(int_page - 1) * int_page_rows:int_page * int_page_rows]
+        col_status.caption(
+            f"Rows {(int_page - 1) * int_page_rows + 1 if len(rows_page) else 0:,}–"
+            f"{(int_page - 1) * int_page_rows + len(rows_page):,} of {len(rows):,}"
+            + (f" (filtered from {result_index.int_rows:,})" if len(rows) != result_index.int_rows else "")
+        )
+        st.dataframe(store.take(str_frame, rows_page, result_index.columns_for(str_subject)))
+
+    def show_archive(self, bool_job_active):
+        """
+        Results archive: adds the consolidated results to the SQLite archive of earlier
+        sessions, and on request shows grade distributions across archived sessions.
+        Queries run only while "Show grade history" is on, so reruns don't touch the archive
+        beyond checking that it has imports (and not at all once it has).
+        """
+        store = st.session_state.store
+        archive = get_archive(data_archive.STR_ARCHIVE_PATH)
+        if store.has('consolidated_df'):
+            col_school, col_button = st.columns([3, 1], vertical_alignment='bottom')
+            str_school = col_school.text_input("School", key='archive_school',
+                                               placeholder="Name the archived results are filed under")
+            if col_button.button("Add to archive", disabled=bool_job_active or not str_school.strip()):
+                str_source = ', '.join(sorted(identity[0] for identity, _ in st.session_state.uploads.values()))
+                with st.session_state.perf.stage('archive', bool_replace=True):
+                    lst_report = archive.append(store.get('consolidated_df'), str_school.strip(), str_source)
+                for str_session, int_rows, bool_added in lst_report:
+                    if bool_added:
+                        st.success(f"Archived {int_rows:,} rows of {str_session or 'no session'} for {str_school.strip()}")
+                    else:
+                        st.info(f"{str_session or 'No session'} for {str_school.strip()} is already archived unchanged")
+
+        if not archive.has_imports() or not st.toggle("Show grade history", key='archive_history'):
+            return
+        lst_subjects = sorted({str_subject for str_subject, _ in archive.subjects()})
+        col_subject, col_level, col_school, col_sessions = st.columns([3, 1, 2, 1])
+        str_subject = col_subject.selectbox("Subject", lst_subjects, key='archive_subject')
+        str_level = col_level.selectbox("Level", ['HL', 'SL'], index=None, placeholder="Any", key='archive_level')
+        lst_schools = sorted(archive.imports()['school'].unique())
+        str_school = col_school.selectbox("School", lst_schools, index=None, placeholder="All schools",
+                                          key='archive_history_school')
+        int_sessions = col_sessions.number_input("Sessions", min_value=1, value=5, step=1, key='archive_sessions')
+        if str_subject:
+            df_counts = archive.grade_distribution(str_subject, str_level, int_sessions, str_school)
+            st.dataframe(df_counts)
+        str_candidate = st.text_input("Candidate history", key='archive_candidate', placeholder="Personal code")
+        if str_candidate.strip():
+            st.dataframe(archive.candidate_history(str_candidate), hide_index=True)
+
+    def show_memory_status(self):
+        """Sidebar status line: memory (results and uploaded PDFs) of this session and of all sessions on the server."""
+        store = st.session_state.store
+        int_sessions, int_total_memory, int_total_spilled = data_session.registry.totals()
+        float_rss = data_perf.current_rss_mb()
+        st.sidebar.caption(
+            f"Memory: this session {store.memory_bytes() / 2**20:,.1f} MB "
+            f"({store.spilled_bytes() / 2**20:,.1f} MB on disk) · "
+            f"all {int_sessions} sessions {int_total_memory / 2**20:,.1f} MB "
+            f"({int_total_spilled / 2**20:,.1f} MB on disk)"
+            + (f" · server {float_rss:,.0f} MB" if float_rss is not None else "")
+        )
 
     def create_streamlit_app(self):
         st.title("IB Result Processor")
+
+        # Every rerun marks this session active and releases sessions idle for too long
+        st.session_state.store.touch()
+        data_session.registry.evict_idle()
+        # Results of a job that finished since the last run
+        self.collect_job()
+        bool_job_active = st.session_state.job is not None
+
+        st.session_state.perf.bool_enabled = st.sidebar.checkbox(
+            "Record performance", value=data_perf.BOOL_PERF_ENABLED, key='perf_enabled',
+            help="Time each pipeline stage (wall, CPU, memory, rows); shown under Performance"
+        )
         
         st.header("1. Upload Files")
         #st.sidebar.header("Upload Required Files")
@@ -198,20 +515,20 @@ class IBResultProcessor:
             "Choose one or more PDF files",
             type="pdf",
             accept_multiple_files=True,
-            key="file_uploader"
+            key="file_uploader",
+            # The running job reads the uploaded files
+            disabled=bool_job_active
         )
 
         # --- CHANGE HERE: Process uploaded files in a loop ---
-        if uploaded_files:
-            # Use a set to avoid reprocessing the same file if the user interacts with the widget again
-            if 'last_uploaded' not in st.session_state or set(f.name for f in uploaded_files) != st.session_state.last_uploaded:
-                st.session_state.last_uploaded = set(f.name for f in uploaded_files)
-                for uploaded_file in uploaded_files:
-                    file_type = self.process_uploaded_file(uploaded_file)
-                    if file_type:
-                        st.success(f"Processed '{uploaded_file.name}' as: **{self.file_types[file_type]}**")
-                    else:
-                        st.warning(f"Could not determine file type for '{uploaded_file.name}'. The file will be ignored.")
+        # Only uploads added or changed since the last run are processed; removed ones are dropped
+        if not bool_job_active:
+            for uploaded_file, file_type, float_confidence in self.sync_uploads(uploaded_files):
+                if file_type:
+                    st.success(f"Processed '{uploaded_file.name}' as: **{self.file_types[file_type]}** "
+                               f"(confidence {float_confidence:.0%})")
+                else:
+                    st.warning(f"Could not determine file type for '{uploaded_file.name}'. The file will be ignored.")
 
         # Display the status of which file types have been successfully identified
         st.header("2. Check File Status")
@@ -224,17 +541,20 @@ class IBResultProcessor:
         # =============================================================================================
 
         st.header("3. Process and Display Results")
-        if st.button("Consolidate Data"):
+        if st.button("Consolidate Data", disabled=bool_job_active):
             #if st.session_state.processed_files['student_level']:
             if st.session_state.processed_files['Results summary']:
-                with st.spinner("Processing... This may take a moment."):
-                    consolidated_df, formatted_df = self.consolidate_data()
-                    if consolidated_df is not None and formatted_df is not None:
-                        st.session_state.consolidated_df = consolidated_df
-                        st.session_state.formatted_df = formatted_df
-                        st.success("Data processing complete!")
+                self.submit_consolidation()
             else:
                 st.error("Cannot process without the 'IB Result (Student Level)' file.")
+        self.show_job_status()
+        if st.session_state.job_message is not None:
+            str_kind, str_message, str_details = st.session_state.job_message
+            st.session_state.job_message = None
+            (st.success if str_kind == 'success' else st.error)(str_message)
+            if str_details:
+                with st.expander("Error details"):
+                    st.code(str_details, language=None)
 
         # =============================================================================================
         # =============================================================================================
@@ -244,49 +564,54 @@ class IBResultProcessor:
 
 
         # =============================================================================================
-        if st.session_state.get('formatted_df') is not None:
+        store = st.session_state.store
+        if store.has('consolidated_df'):
+            for str_label, df_dropped in st.session_state.dropped_rows.items():
+                st.warning(f"{len(df_dropped):,} row(s) of {str_label} were not merged: another row "
+                           f"has the same session number, personal code and subject.")
+                with st.expander(f"Rows of {str_label} not merged"):
+                    st.dataframe(df_dropped, hide_index=True)
+        if store.has('formatted_df'):
             st.subheader("Formatted Data")
-            st.dataframe(st.session_state.formatted_df)
+            self.show_result_grid('formatted_df')
             
             # Download buttons
-            @st.cache_data
-            def convert_df_to_excel(df):
-                return df.to_excel(index=False).encode('utf-8')
-            def convert_df_to_excel_bytes(df):
-                buffer = io.BytesIO()
-                # Use an Excel writer with the buffer as the target
-                #df_reset = df.reset_index()
-                with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-                    #df_reset.to_excel(writer, index=False)
-                    #df_reset.to_excel(writer)
-                    df.to_excel(writer)
-                # Get the Excel file bytes
-                return buffer.getvalue()
-
-            excel_bytes_result_formatted = convert_df_to_excel_bytes(st.session_state.formatted_df) 
-            #excel_data = convert_df_to_excel(st.session_state.formatted_df)
-            st.download_button(
-                label="Download Formatted Data as Excel",
-                data=excel_bytes_result_formatted,
-                file_name="formatted_results.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
+            self.export_download_button("Download Formatted Data as Excel", 'formatted_df', 'xlsx',
+                                        "formatted_results.xlsx",
+                                        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+            self.export_download_button("Download Formatted Data as Parquet", 'formatted_df', 'parquet',
+                                        "formatted_results.parquet", "application/vnd.apache.parquet")
+            self.export_download_button("Download Formatted Data as Arrow", 'formatted_df', 'arrow',
+                                        "formatted_results.arrow", "application/vnd.apache.arrow.file")
         # =============================================================================================
-        if st.session_state.get('consolidated_df') is not None:
+        if store.has('consolidated_df'):
             st.subheader("Raw Aggregated Data")
-            st.dataframe(st.session_state.consolidated_df)
+            self.show_result_grid('consolidated_df')
             # Download buttons
-            @st.cache_data
-            def convert_df_to_csv(df):
-                return df.to_csv(index=False).encode('utf-8')
-            
-            csv_data_result_raw = convert_df_to_csv(st.session_state.consolidated_df)
-            st.download_button(
-                label="Download Raw Aggregated Data as csv",
-                data=csv_data_result_raw,
-                file_name="raw_results.csv",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
+            self.export_download_button("Download Raw Aggregated Data as csv", 'consolidated_df', 'csv',
+                                        "raw_results.csv", "text/csv")
+            self.export_download_button("Download Raw Aggregated Data as Parquet", 'consolidated_df', 'parquet',
+                                        "raw_results.parquet", "application/vnd.apache.parquet")
+            self.export_download_button("Download Raw Aggregated Data as Arrow", 'consolidated_df', 'arrow',
+                                        "raw_results.arrow", "application/vnd.apache.arrow.file")
+        # =============================================================================================
+        st.header("4. Results Archive")
+        self.show_archive(bool_job_active)
+        # =============================================================================================
+        perf = st.session_state.perf
+        if perf.lst_records:
+            with st.expander("Performance"):
+                st.caption("Latest run of each stage. CPU of extraction workers is counted once they exit; "
+                           "peak RSS is the process high-water mark so far.")
+                st.dataframe(perf.to_frame(), hide_index=True)
+                st.download_button(
+                    label="Download timings as JSON",
+                    data=perf.to_json(),
+                    file_name="performance.json",
+                    mime="application/json"
+                )
+        # =============================================================================================
+        self.show_memory_status()
 
 def main():
     processor = IBResultProcessor()
@@ -0,0 +1 @@
+"""Offline benchmarks for the IB result pipeline; run modules with `python -m benchmarks.<name>`."""
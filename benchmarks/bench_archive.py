@@ -0,0 +1,91 @@
+"""
+Results archive: appends synthetic consolidated results for --schools schools over
+--sessions exam sessions to a fresh SQLite archive, then times year-over-year queries
+against it (best of 5, pandas frame included) and shows the index each one uses.
+
+    python -m benchmarks.bench_archive [--schools 20] [--sessions 6] [--candidates 200]
+"""
+import os
+import time
+import sqlite3
+import tempfile
+import argparse
+
+import ib_result_archive as data_archive
+
+from benchmarks import bench_pivot
+
+
+lst_session_codes = ['M20', 'N20', 'M21', 'N21', 'M22', 'N22', 'M23', 'N23', 'M24', 'N24', 'M25']
+
+
+
+
+def best_of(func, int_repeat=5):
+    """(result, best seconds) of int_repeat calls."""
+    float_best = float('inf')
+    for _ in range(int_repeat):
+        float_start = time.perf_counter()
+        result = func()
+        float_best = min(float_best, time.perf_counter() - float_start)
+    return result, float_best
+
+def query_plan(str_path, str_sql, params):
+    with sqlite3.connect(str_path) as connection:
+        return '; '.join(row[3] for row in connection.execute('EXPLAIN QUERY PLAN ' + str_sql, params))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--schools', type=int, default=20)
+    parser.add_argument('--sessions', type=int, default=6)
+    parser.add_argument('--candidates', type=int, default=200, help="candidates per school and session")
+    args = parser.parse_args(argv)
+
+    str_path = os.path.join(tempfile.mkdtemp(prefix='ib_archive_'), 'archive.sqlite')
+    archive = data_archive.ResultArchive(str_path)
+    lst_sessions = lst_session_codes[-args.sessions:]
+
+    int_rows = 0
+    float_append = 0.0
+    df_cohort = bench_pivot.build_merged(args.candidates)
+    for int_school in range(args.schools):
+        # Same cohort for every school, with its own personal codes and final grades redrawn
+        # within each subject and level per session (so EE/TOK letter grades stay on EE/TOK
+        # rows and the distributions vary from session to session)
+        df_merged = df_cohort.copy()
+        df_merged['personal_code'] = f'(s{int_school:03d}' + df_cohort['personal_code'].str.strip('()') + ')'
+        for int_session, str_session in enumerate(lst_sessions):
+            int_seed = int_school * 100 + int_session
+            df_merged['FG'] = df_cohort.groupby(['subject_', 'sub'], dropna=False, observed=True)['FG'].transform(
+                lambda s: s.sample(frac=1, replace=True, random_state=int_seed).to_numpy()
+            )
+            df_merged['session'] = str_session
+            float_start = time.perf_counter()
+            archive.append(df_merged, f'School {int_school:03d}')
+            float_append += time.perf_counter() - float_start
+            int_rows += len(df_merged)
+    print(f"archived {int_rows:,} rows ({args.schools} schools x {len(lst_sessions)} sessions) "
+          f"in {float_append:.2f}s ({int_rows / float_append:,.0f} rows/s), "
+          f"{os.path.getsize(str_path) / 2**20:,.1f} MiB")
+
+    str_personal_code = archive.query('SELECT personal_code FROM results LIMIT 1')['personal_code'][0]
+    lst_queries = [
+        ("HL maths grades, last 5 sessions, all schools",
+         lambda: archive.grade_distribution('Mathematics', 'HL', 5),
+         *archive._grade_distribution_sql('Mathematics', 'HL', 5, None, 'FG')[:2]),
+        ("HL maths grades, last 5 sessions, one school",
+         lambda: archive.grade_distribution('Mathematics', 'HL', 5, 'School 000'),
+         *archive._grade_distribution_sql('Mathematics', 'HL', 5, 'School 000', 'FG')[:2]),
+        ("history of one candidate",
+         lambda: archive.candidate_history(str_personal_code),
+         f"SELECT * FROM results r WHERE personal_code IN (?, ?) AND {data_archive.STR_CURRENT_FILTER}",
+         [str_personal_code, str_personal_code.strip('()')]),
+    ]
+    print(f"{'query':<48}{'rows':>6}{'ms':>9}  plan")
+    for str_name, func_query, str_sql, params in lst_queries:
+        df, float_seconds = best_of(func_query)
+        print(f"{str_name:<48}{len(df):>6}{float_seconds * 1000:>9.1f}  {query_plan(str_path, str_sql, params)}")
+    print(archive.grade_distribution('Mathematics', 'HL', 5).to_string())
+
+if __name__ == '__main__':
+    main()
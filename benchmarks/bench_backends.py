@@ -0,0 +1,83 @@
+"""
+Extraction backends: pdfplumber's extract_text() against the text-run backend of
+ib_result_pdf, on the four synthetic reports in both PDF layouts of synthetic_reports
+('lines': one run per line in reading order; 'runs': a run per word, lines out of
+order). Reports best-of-3 wall time per backend, and checks conformance: every page
+must give the same text, and so the same line list for parse_page. Exits with status 1
+on any difference, printing the first differing line.
+
+    python -m benchmarks.bench_backends [--sizes 50 200] [--seeds 0 1]
+"""
+import io
+import sys
+import argparse
+
+import pdfplumber
+
+import ib_result_pdf as data_pdf
+
+from benchmarks import bench_merge
+from benchmarks import synthetic_reports
+
+
+lst_default_sizes = [50, 200]
+lst_layouts = ['lines', 'runs']
+STR_REFERENCE = data_pdf.PdfplumberBackend.str_name
+
+
+
+
+def page_texts(bytes_pdf, str_backend):
+    """[(page index, text)] of every page of the PDF with one backend."""
+    with pdfplumber.open(io.BytesIO(bytes_pdf)) as pdf:
+        return list(data_pdf.get_backend(str_backend).page_texts(pdf.pages))
+
+def first_difference(lst_expected, lst_actual):
+    """Description of the first page line that differs, or None if the pages are the same."""
+    if len(lst_expected) != len(lst_actual):
+        return f"{len(lst_actual)} pages instead of {len(lst_expected)}"
+    for (int_page, str_expected), (_, str_actual) in zip(lst_expected, lst_actual):
+        lst_expected_lines = (str_expected or '').splitlines()
+        lst_actual_lines = (str_actual or '').splitlines()
+        for int_line in range(max(len(lst_expected_lines), len(lst_actual_lines))):
+            str_a = lst_expected_lines[int_line] if int_line < len(lst_expected_lines) else None
+            str_b = lst_actual_lines[int_line] if int_line < len(lst_actual_lines) else None
+            if str_a != str_b:
+                return f"page {int_page + 1} line {int_line + 1}: {str_a!r} != {str_b!r}"
+    return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=lst_default_sizes)
+    parser.add_argument('--seeds', type=int, nargs='+', default=[0])
+    args = parser.parse_args(argv)
+
+    lst_others = [str_name for str_name in data_pdf.dict_backends if str_name != STR_REFERENCE]
+    print(f"{'candidates':>10}{'seed':>6}  {'layout':<7}{'report':<24}{'pages':>6}"
+          + ''.join(f"{str_name + ' s':>14}" for str_name in [STR_REFERENCE] + lst_others) + "  same")
+    int_failures = 0
+    for int_candidates in args.sizes:
+        for int_seed in args.seeds:
+            for str_layout in lst_layouts:
+                dict_pdfs = synthetic_reports.report_pdfs(int_candidates, int_seed, str_layout)
+                for header, bytes_pdf in dict_pdfs.items():
+                    lst_reference, float_reference, _ = bench_merge.measure(lambda: page_texts(bytes_pdf, STR_REFERENCE))
+                    str_row = (f"{int_candidates:>10}{int_seed:>6}  {str_layout:<7}{header:<24}"
+                               f"{len(lst_reference):>6}{float_reference:>14.3f}")
+                    lst_problems = []
+                    for str_name in lst_others:
+                        lst_texts, float_seconds, _ = bench_merge.measure(lambda: page_texts(bytes_pdf, str_name))
+                        str_row += f"{float_seconds:>14.3f}"
+                        str_difference = first_difference(lst_reference, lst_texts)
+                        if str_difference is not None:
+                            lst_problems.append(f"{str_name}: {str_difference}")
+                    print(str_row + f"  {not lst_problems}")
+                    for str_problem in lst_problems:
+                        print(f"    {str_problem}")
+                    int_failures += bool(lst_problems)
+    if int_failures:
+        print(f"FAIL: {int_failures} report(s) differ between backends")
+    return 1 if int_failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,59 @@
+"""
+File-type detection on a batch of in-memory uploads: first-page content-stream
+detector (ib_result_detect) vs. the old pdfplumber extract_text() of page 0.
+
+    python -m benchmarks.bench_detect [--uploads 50] [--candidates 200]
+"""
+import io
+import time
+import argparse
+
+import pdfplumber
+
+import ib_result_detect as data_detect
+from ib_result_pipeline import dict_header_map
+
+from benchmarks import synthetic_reports
+
+
+
+
+def detect_legacy(bytes_data):
+    with pdfplumber.open(io.BytesIO(bytes_data)) as pdf:
+        first_page_text = pdf.pages[0].extract_text()
+        for header in dict_header_map:
+            if header in first_page_text:
+                return header
+    return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--uploads', type=int, default=50)
+    parser.add_argument('--candidates', type=int, default=200)
+    args = parser.parse_args(argv)
+
+    lst_cohort = synthetic_reports.make_cohort(args.candidates)
+    lst_reports = [
+        ('Results summary', synthetic_reports.pdf_bytes(synthetic_reports.summary_pages(lst_cohort))),
+        ('Subject Results', synthetic_reports.pdf_bytes(synthetic_reports.subject_pages(lst_cohort))),
+        ('(EXTENDED ESSAY)', synthetic_reports.pdf_bytes(synthetic_reports.ee_pages(lst_cohort))),
+        ('(THEORY OF KNOWLEDGE)', synthetic_reports.pdf_bytes(synthetic_reports.tk_pages(lst_cohort)))
+    ]
+    lst_batch = [lst_reports[i % len(lst_reports)] for i in range(args.uploads)]
+
+    float_start = time.perf_counter()
+    for str_expected, bytes_data in lst_batch:
+        header, float_confidence = data_detect.detect_file_type(bytes_data, dict_header_map)
+        assert header == str_expected, (header, str_expected)
+    float_fast = time.perf_counter() - float_start
+
+    float_start = time.perf_counter()
+    for str_expected, bytes_data in lst_batch:
+        assert detect_legacy(bytes_data) == str_expected
+    float_legacy = time.perf_counter() - float_start
+
+    print(f"{args.uploads} uploads: content-stream detector {float_fast:.3f}s, "
+          f"pdfplumber extract_text {float_legacy:.3f}s ({float_legacy / float_fast:.0f}x)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Excel export: pd.ExcelWriter(engine='openpyxl') + df.to_excel, as the app used to run it,
+against the write-only ib_result_export.write_excel, on the formatted (two-level header)
+results. Reports best-of-3 wall time, peak traced memory and whether both workbooks hold
+the same cells and merged ranges.
+
+    python -m benchmarks.bench_export [--sizes 500 2000 5000]
+"""
+import io
+import argparse
+
+import pandas as pd
+
+import openpyxl
+
+import ib_result_handler_summary as data_handler_sum
+import ib_result_export as data_export
+
+from benchmarks import bench_merge, bench_pivot
+
+
+lst_default_sizes = [500, 2000, 5000]
+
+
+
+
+def build_formatted(int_candidates):
+    """Formatted results as consolidate_data builds them."""
+    df_merged = bench_pivot.build_merged(int_candidates)
+    df_sub = data_handler_sum.reformat_results_sub(df_merged)
+    df_overall = data_handler_sum.reformat_results_overall(df_merged)
+    return pd.merge(df_sub, df_overall, on=data_handler_sum.common_keys, how='outer')
+
+def excel_legacy(df):
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+        df.to_excel(writer)
+    return buffer.getvalue()
+
+def excel_streaming(df):
+    buffer = io.BytesIO()
+    data_export.write_excel(df, buffer)
+    return buffer.getvalue()
+
+def workbook_cells(bytes_xlsx):
+    """Non-empty cell values and merged ranges of the first sheet."""
+    worksheet = openpyxl.load_workbook(io.BytesIO(bytes_xlsx), read_only=False).active
+    dict_cells = {
+        (cell.row, cell.column): cell.value
+        for row in worksheet.iter_rows() for cell in row if cell.value not in (None, '')
+    }
+    return dict_cells, sorted(str(r) for r in worksheet.merged_cells.ranges)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=lst_default_sizes)
+    args = parser.parse_args(argv)
+
+    print(f"{'candidates':>10}{'columns':>9}{'pandas s':>10}{'stream s':>10}{'pandas MiB':>12}{'stream MiB':>12}  same")
+    for int_candidates in args.sizes:
+        df = build_formatted(int_candidates)
+        bytes_legacy, float_legacy, float_legacy_mib = bench_merge.measure(excel_legacy, df)
+        bytes_stream, float_stream, float_stream_mib = bench_merge.measure(excel_streaming, df)
+        bool_same = workbook_cells(bytes_legacy) == workbook_cells(bytes_stream)
+        print(f"{int_candidates:>10}{df.shape[1]:>9}{float_legacy:>10.3f}{float_stream:>10.3f}"
+              f"{float_legacy_mib:>12.1f}{float_stream_mib:>12.1f}  {bool_same}")
+
+if __name__ == '__main__':
+    main()
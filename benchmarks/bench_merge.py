@@ -0,0 +1,115 @@
+"""
+Merge stage: the old per-file pd.merge + '_new' combine_first + copy() loop against
+ib_result_consolidator.merge_all_results. Reports best-of-3 wall time and peak traced memory
+(tracemalloc; numpy buffers are traced, Arrow-backed string buffers are not) and checks the outputs match.
+
+    python -m benchmarks.bench_merge [--sizes 500 2000 5000]
+"""
+import time
+import argparse
+import tracemalloc
+
+import pandas as pd
+
+import ib_result_pdf as data_pdf
+import ib_result_handler_summary as data_handler_sum
+import ib_result_handler_subject as data_handler_sub
+import ib_result_consolidator as consolidator
+
+from benchmarks import synthetic_reports
+
+
+lst_default_sizes = [500, 2000, 5000]
+
+# Same steps as IBResultProcessor.merge_steps
+dict_merge_steps = {
+    'Subject Results'       : (synthetic_reports.subject_pages,
+                               {'index_cols': ['session_number', 'personal_code', 'subject'],
+                                'merge_cols': ['pg', 'scaled_total'], 'rename_map': {'pg': 'PG'}}),
+    '(EXTENDED ESSAY)'      : (synthetic_reports.ee_pages,
+                               {'index_cols': ['session_number', 'personal_code', 'subject'],
+                                'merge_cols': ['pg'], 'rename_map': {'pg': 'ee_pg'}}),
+    '(THEORY OF KNOWLEDGE)' : (synthetic_reports.tk_pages,
+                               {'index_cols': ['session_number', 'personal_code', 'subject'],
+                                'merge_cols': ['pg'], 'rename_map': {'pg': 'tk_pg'}})
+}
+
+
+
+
+def frames_from_pages(lst_pages, func_parse_page, bool_subject):
+    records = data_pdf.ColumnBuffer()
+    for lst_lines in lst_pages:
+        rec = func_parse_page(synthetic_reports.page_text(lst_lines))
+        records.extend(rec[0] if bool_subject else rec)
+    return records.to_frame()
+
+def build_inputs(int_candidates):
+    """Reformatted summary frame plus (subject frame, step) pairs, as consolidate_data has them."""
+    lst_cohort = synthetic_reports.make_cohort(int_candidates)
+    df_main = frames_from_pages(synthetic_reports.summary_pages(lst_cohort), data_handler_sum.parse_page, False)
+    df_main = data_handler_sum.reformat_results(df_main)
+    lst_sources = []
+    for func_pages, step in dict_merge_steps.values():
+        df_source = frames_from_pages(func_pages(lst_cohort), data_handler_sub.parse_page, True)
+        lst_sources.append((data_handler_sub.reformat_results(df_source), step))
+    return df_main, lst_sources
+
+def merge_legacy(df_main, lst_sources):
+    """The loop consolidate_data used to run, kept here as the reference."""
+    for tmp_df_sub, step in lst_sources:
+        cols_to_use = step['index_cols'] + step['merge_cols']
+        df_merge = tmp_df_sub[cols_to_use]
+        if step['rename_map']:
+            df_merge = df_merge.rename(columns=step['rename_map'])
+        df_merged = pd.merge(df_main, df_merge, on=step['index_cols'], how='left', suffixes=('', '_new'))
+        for col in step['merge_cols']:
+            target_col = step['rename_map'][col] if step['rename_map'] and col in step['rename_map'] else col
+            if target_col in df_main.columns and f"{target_col}_new" in df_merged.columns:
+                df_merged[target_col] = df_merged[f"{target_col}_new"].combine_first(df_merged[target_col])
+                df_merged.drop(columns=[f"{target_col}_new"], inplace=True)
+        df_main = df_merged.copy()
+    return df_main
+
+def same_values(df_left, df_right):
+    """
+    Equal values, ignoring dtype and the kind of missing marker: pd.merge turns
+    mismatched categoricals into object columns holding pd.NA where the engine keeps NaN.
+    """
+    def normalise(df):
+        return df.astype(object).where(df.notna(), None)
+    return normalise(df_left).equals(normalise(df_right))
+
+def measure(func, *args, int_repeat=3):
+    """
+    Returns (result, best seconds, peak traced MiB).
+    Time and memory come from separate runs, as tracing slows allocation-heavy code unevenly.
+    """
+    float_best = float('inf')
+    for _ in range(int_repeat):
+        float_start = time.perf_counter()
+        result = func(*args)
+        float_best = min(float_best, time.perf_counter() - float_start)
+
+    tracemalloc.start()
+    func(*args)
+    _, int_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, float_best, int_peak / 2**20
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=lst_default_sizes)
+    args = parser.parse_args(argv)
+
+    print(f"{'candidates':>10}{'rows':>9}{'legacy s':>10}{'engine s':>10}{'legacy MiB':>12}{'engine MiB':>12}  same")
+    for int_candidates in args.sizes:
+        df_main, lst_sources = build_inputs(int_candidates)
+        df_legacy, float_legacy, float_legacy_mib = measure(merge_legacy, df_main, lst_sources)
+        df_engine, float_engine, float_engine_mib = measure(consolidator.merge_all_results, df_main, lst_sources)
+        bool_same = same_values(df_legacy, df_engine)
+        print(f"{int_candidates:>10}{len(df_main):>9}{float_legacy:>10.3f}{float_engine:>10.3f}"
+              f"{float_legacy_mib:>12.1f}{float_engine_mib:>12.1f}  {bool_same}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Subject reshape: the old pd.pivot_table + column reorder version of
+ib_result_handler_summary.reformat_results_sub against the current direct one.
+Reports best-of-3 wall time per cohort size and checks the outputs are identical
+(values, dtypes, index and column order).
+
+    python -m benchmarks.bench_pivot [--sizes 500 2000 5000]
+"""
+import argparse
+
+import pandas as pd
+
+import ib_result_handler_summary as data_handler_sum
+import ib_result_consolidator as consolidator
+
+from benchmarks import bench_merge
+
+
+lst_default_sizes = [500, 2000, 5000]
+
+
+
+
+def reformat_results_sub_legacy(df):
+    """The pivot_table version reformat_results_sub used to be, kept here as the reference."""
+    pattern = r'(?i)\b(' + '|'.join(data_handler_sum.lst_exclude_keyword_ee_tok) + r')\b'
+    df = df[~df['subject'].str.extract(pattern, expand=False).notna()]
+
+    pivot_table = pd.pivot_table(
+      df,
+      values    =   ['sub', 'uni_pg', 'PG', 'FG', 'scaled_total'],
+      index     =   ['session_number', 'personal_code', 'name', 'birth_date'],
+      columns   =   ['subject_'],
+      aggfunc   =   'first',
+      observed  =   True
+    )
+    pivot_table.columns = pivot_table.columns.reorder_levels([1, 0])
+    pivot_table = pivot_table.sort_index(axis=1, level=0)
+
+    subjects = pivot_table.columns.get_level_values(0).unique()
+    new_columns = []
+    for subject in subjects:
+        for col in ['sub', 'uni_pg', 'PG', 'FG', 'scaled_total']:
+            new_columns.append((subject, col))
+    return pivot_table.reindex(columns=pd.MultiIndex.from_tuples(new_columns))
+
+def build_merged(int_candidates):
+    """Merged raw frame, as consolidate_data passes it to reformat_results_sub."""
+    df_main, lst_sources = bench_merge.build_inputs(int_candidates)
+    return consolidator.merge_all_results(df_main, lst_sources)
+
+def same_frames(df_legacy, df_direct):
+    try:
+        pd.testing.assert_frame_equal(df_legacy, df_direct)
+    except AssertionError:
+        return False
+    return True
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=lst_default_sizes)
+    args = parser.parse_args(argv)
+
+    print(f"{'candidates':>10}{'rows':>9}{'columns':>9}{'pivot s':>10}{'direct s':>10}  same")
+    for int_candidates in args.sizes:
+        df_merged = build_merged(int_candidates)
+        df_legacy, float_legacy, _ = bench_merge.measure(reformat_results_sub_legacy, df_merged)
+        df_direct, float_direct, _ = bench_merge.measure(data_handler_sum.reformat_results_sub, df_merged)
+        print(f"{int_candidates:>10}{len(df_merged):>9}{df_direct.shape[1]:>9}{float_legacy:>10.3f}"
+              f"{float_direct:>10.3f}  {same_frames(df_legacy, df_direct)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Record accumulation scaling: parse_page + column buffers for 100 to 10,000 candidates.
+Time per row should stay flat as the cohort grows. --legacy also times the old
+`records = records + rec` / pd.json_normalize path for comparison (quadratic; slow at the top end).
+
+    python -m benchmarks.bench_records [--sizes 100 1000 10000] [--legacy]
+"""
+import sys
+import time
+import argparse
+
+import pandas as pd
+
+import ib_result_pdf as data_pdf
+import ib_result_handler_summary as data_handler_sum
+import ib_result_handler_subject as data_handler_sub
+
+from benchmarks import synthetic_reports
+
+
+lst_default_sizes = [100, 300, 1000, 3000, 10000]
+
+
+
+
+def _columns_to_records(dict_columns):
+    lst_keys = list(dict_columns)
+    return [dict(zip(lst_keys, row)) for row in zip(*dict_columns.values())]
+
+def run_columnar(lst_texts, func_parse_page, bool_subject):
+    records = data_pdf.ColumnBuffer()
+    for text in lst_texts:
+        rec = func_parse_page(text)
+        records.extend(rec[0] if bool_subject else rec)
+    return records.to_frame()
+
+def run_legacy(lst_texts, func_parse_page, bool_subject):
+    records = []
+    for text in lst_texts:
+        rec = func_parse_page(text)
+        rec = _columns_to_records(rec[0] if bool_subject else rec)
+        records = records + rec
+    return pd.json_normalize(records)
+
+def time_call(func, *args):
+    float_start = time.perf_counter()
+    df = func(*args)
+    return time.perf_counter() - float_start, len(df)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=lst_default_sizes)
+    parser.add_argument('--legacy', action='store_true', help='also time the list-concatenation path')
+    args = parser.parse_args(argv)
+
+    print(f"{'report':<10}{'candidates':>12}{'rows':>10}{'seconds':>10}{'us/row':>10}{'legacy us/row':>16}")
+    for int_candidates in args.sizes:
+        lst_cohort = synthetic_reports.make_cohort(int_candidates)
+        for str_report, lst_pages, func_parse_page, bool_subject in [
+            ('summary', synthetic_reports.summary_pages(lst_cohort), data_handler_sum.parse_page, False),
+            ('subject', synthetic_reports.subject_pages(lst_cohort), data_handler_sub.parse_page, True)
+        ]:
+            lst_texts = [synthetic_reports.page_text(p) for p in lst_pages]
+            float_seconds, int_rows = time_call(run_columnar, lst_texts, func_parse_page, bool_subject)
+            str_legacy = ''
+            if args.legacy:
+                float_legacy, _ = time_call(run_legacy, lst_texts, func_parse_page, bool_subject)
+                str_legacy = f"{float_legacy / int_rows * 1e6:.2f}"
+            print(f"{str_report:<10}{int_candidates:>12}{int_rows:>10}{float_seconds:>10.3f}"
+                  f"{float_seconds / int_rows * 1e6:>10.2f}{str_legacy:>16}")
+            sys.stdout.flush()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Summary reformat: the old per-row regex version of
+ib_result_handler_summary.reformat_results against the current one, which derives the
+subject and candidate columns once per distinct value. Reports best-of-3 wall time per
+cohort size and checks the outputs are identical (values, dtypes, column order).
+
+    python -m benchmarks.bench_reformat [--sizes 500 2000 5000]
+"""
+import re
+import argparse
+
+import numpy as np
+
+import ib_result_schema as data_schema
+import ib_result_handler_summary as data_handler_sum
+
+from benchmarks import bench_merge
+from benchmarks import bench_pivot
+from benchmarks import synthetic_reports
+
+
+lst_default_sizes = [500, 2000, 5000]
+
+
+
+
+def reformat_results_legacy(df):
+    """The per-row version reformat_results used to be, kept here as the reference."""
+    df[['session', 'subject']] = df['subject'].str.split(' - ', n=1, expand=True)
+    df[['session', 'candidate']] = df['candidate'].str.split(' - ', n=1, expand=True)
+    df[['subject_', 'sub']] = df['subject'].str.extract(r'^(.*?)(\b(?:SL|HL|EE|TK)\b.*)$')
+    df[['session_number', 'personal_code']] = df['candidate'].str.extract(r'^(.+?)\s*(\([^)]+\))$')
+    df['subject_'] = df['subject_'].str.strip()
+    df['sub'] = df['sub'].str.strip()
+
+    df['uni_pg'] = data_schema.blank_column(df, 'grade')
+    df['PG'] = data_schema.blank_column(df, 'grade')
+    df['FG'] = df['grade']
+    df['scaled_total'] = data_schema.blank_column(df, 'decimal')
+
+    for i in data_handler_sum.lst_exclude_keyword_ee_tok:
+        pattern = r'^(.*?)\s' + '+'.join(i) + r'\b'
+        df[i + '_sub'] = df['subject'].str.extract(pattern, flags=re.IGNORECASE)
+        df[i + '_fg'] = np.where(df['subject'].str.contains(i, case=False, na=False), df['grade'], np.nan)
+        df[i + '_pg'] = data_schema.blank_column(df, 'grade')
+    return data_schema.apply_schema(df)
+
+def build_extracted(int_candidates):
+    """Summary frame as extract_results returns it."""
+    lst_cohort = synthetic_reports.make_cohort(int_candidates)
+    return bench_merge.frames_from_pages(synthetic_reports.summary_pages(lst_cohort),
+                                         data_handler_sum.parse_page, False)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=lst_default_sizes)
+    args = parser.parse_args(argv)
+
+    print(f"{'candidates':>10}{'rows':>9}{'per-row s':>11}{'by value s':>12}  same")
+    for int_candidates in args.sizes:
+        df_extracted = build_extracted(int_candidates)
+        # Both versions add columns to their input; each run gets its own copy
+        df_legacy, float_legacy, _ = bench_merge.measure(lambda: reformat_results_legacy(df_extracted.copy()))
+        df_current, float_current, _ = bench_merge.measure(lambda: data_handler_sum.reformat_results(df_extracted.copy()))
+        print(f"{int_candidates:>10}{len(df_extracted):>9}{float_legacy:>11.3f}{float_current:>12.3f}"
+              f"  {bench_pivot.same_frames(df_legacy, df_current)}")
+
+if __name__ == '__main__':
+    main()
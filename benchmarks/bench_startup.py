@@ -0,0 +1,79 @@
+"""
+Cold start of the Streamlit app: time from a fresh interpreter to the first render of
+app.py (through streamlit's AppTest, no files uploaded), with the heavy dependencies
+deferred as the app does now and with them imported up front as it used to. Each run is
+a new process; the best of --repeat is reported.
+
+Also a regression guard: exits with status 1 if the first render imported any module in
+lst_deferred, or took longer than --max-seconds (when given).
+
+    python -m benchmarks.bench_startup [--repeat 3] [--max-seconds 2.0]
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+
+# Modules the first render must not import (loaded at upload, consolidation or download)
+lst_deferred = ['pandas', 'numpy', 'pyarrow', 'pdfplumber', 'pdfminer', 'openpyxl']
+STR_APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app.py')
+
+# Run in a fresh interpreter: argv[1] app path, argv[2] modules to import first ('' = none)
+STR_PROBE = """
+import sys, json, time, importlib
+float_start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+float_harness = time.perf_counter() - float_start
+for str_name in filter(None, sys.argv[2].split(',')):
+    importlib.import_module(str_name)
+at = AppTest.from_file(sys.argv[1], default_timeout=120).run()
+print(json.dumps({
+    'seconds': time.perf_counter() - float_start - float_harness,
+    'exceptions': [str(e.value) for e in at.exception],
+    'loaded': [m for m in sys.argv[3].split(',') if m in sys.modules],
+}))
+"""
+
+
+
+
+def first_render(lst_preload=()):
+    """One cold start in a new process: dict with seconds, exceptions and loaded deferred modules."""
+    completed = subprocess.run(
+        [sys.executable, '-c', STR_PROBE, STR_APP_PATH, ','.join(lst_preload), ','.join(lst_deferred)],
+        capture_output=True, text=True, check=True, cwd=os.path.dirname(STR_APP_PATH)
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--max-seconds', type=float, default=None,
+                        help="fail if the (deferred) first render takes longer than this")
+    args = parser.parse_args(argv)
+
+    # The old eager imports of app.py and the modules it imported
+    lst_eager = ['pandas', 'numpy', 'pdfplumber', 'openpyxl', 'ib_result_handler_summary',
+                 'ib_result_handler_subject', 'ib_result_detect', 'ib_result_consolidator', 'ib_result_viewer']
+    lst_lazy_runs = [first_render() for _ in range(args.repeat)]
+    lst_eager_runs = [first_render(lst_eager) for _ in range(args.repeat)]
+
+    float_lazy = min(run['seconds'] for run in lst_lazy_runs)
+    float_eager = min(run['seconds'] for run in lst_eager_runs)
+    print(f"{'imports':>10}{'first render s':>16}")
+    print(f"{'deferred':>10}{float_lazy:>16.3f}")
+    print(f"{'eager':>10}{float_eager:>16.3f}")
+
+    lst_problems = sorted({str_name for run in lst_lazy_runs for str_name in run['loaded']})
+    lst_problems = [f"first render imported {', '.join(lst_problems)}"] if lst_problems else []
+    lst_problems += [f"first render raised {e}" for run in lst_lazy_runs for e in run['exceptions']][:1]
+    if args.max_seconds is not None and float_lazy > args.max_seconds:
+        lst_problems.append(f"first render took {float_lazy:.3f}s (limit {args.max_seconds:.3f}s)")
+    for str_problem in lst_problems:
+        print(f"FAIL: {str_problem}")
+    return 1 if lst_problems else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
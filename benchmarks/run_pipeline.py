@@ -0,0 +1,185 @@
+"""
+End-to-end pipeline benchmark on synthetic reports.
+For each cohort size the four report PDFs are generated in memory, then detection,
+extraction, reformat, merge, pivot, overall summary and Excel export are timed
+separately and written to a JSON file. With --baseline the run is compared stage
+by stage against an earlier JSON and exits non-zero on a regression.
+
+    python -m benchmarks.run_pipeline --sizes 10 100 1000 --output bench_pipeline.json
+    python -m benchmarks.run_pipeline --sizes 10 100 --baseline bench_pipeline.json
+"""
+import io
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import contextlib
+import subprocess
+from datetime import datetime, timezone
+from importlib import metadata
+
+import pandas as pd
+
+import ib_result_pdf as data_pdf
+import ib_result_detect as data_detect
+import ib_result_handler_summary as data_handler_sum
+import ib_result_handler_subject as data_handler_sub
+import ib_result_consolidator as consolidator
+import ib_result_export as data_export
+from ib_result_pipeline import dict_merge_steps, dict_header_map
+
+from benchmarks import synthetic_reports
+
+
+lst_default_sizes       = [10, 100, 1000]
+lst_packages            = ['pandas', 'numpy', 'pdfplumber', 'pdfminer.six', 'openpyxl', 'pyarrow']
+# Stages faster than this in the baseline are too noisy to flag
+FLOAT_NOISE_FLOOR       = 0.005
+
+
+
+
+
+class StageTimer:
+    """Collects wall time per named stage; stdout of the stage (debug prints) is swallowed."""
+
+    def __init__(self):
+        self.dict_seconds = {}
+
+    @contextlib.contextmanager
+    def stage(self, str_name):
+        float_start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+        self.dict_seconds[str_name] = self.dict_seconds.get(str_name, 0.0) + time.perf_counter() - float_start
+
+def run_once(int_candidates, int_seed=0, int_workers=1):
+    """Generate one cohort and time every pipeline stage; returns a JSON-ready dict."""
+    dict_pdfs = synthetic_reports.report_pdfs(int_candidates, int_seed)
+    timer = StageTimer()
+
+    dict_sources = {}
+    with timer.stage('detect'):
+        for str_expected, bytes_pdf in dict_pdfs.items():
+            source = data_pdf.PdfSource(bytes_pdf)
+            header, _ = data_detect.detect_file_type(source, dict_header_map)
+            if header != str_expected:
+                raise RuntimeError(f"detected {header!r} for a {str_expected!r} report")
+            dict_sources[header] = source
+
+    dict_frames = {}
+    with timer.stage('extract'):
+        dict_frames['Results summary'] = data_handler_sum.extract_results(dict_sources['Results summary'], int_workers)
+        for header in dict_merge_steps:
+            dict_frames[header], _ = data_handler_sub.extract_results(dict_sources[header], int_workers)
+    for source in dict_sources.values():
+        source.close()
+
+    with timer.stage('reformat'):
+        df_main = data_handler_sum.reformat_results(dict_frames['Results summary'])
+        lst_sources = [
+            (data_handler_sub.reformat_results(dict_frames[header]), step)
+            for header, step in dict_merge_steps.items()
+        ]
+
+    with timer.stage('merge'):
+        df_merged = consolidator.merge_all_results(df_main, lst_sources)
+
+    with timer.stage('pivot'):
+        df_sub = data_handler_sum.reformat_results_sub(df_merged)
+
+    with timer.stage('overall'):
+        df_overall = data_handler_sum.reformat_results_overall(df_merged)
+        df_final = pd.merge(df_sub, df_overall, on=data_handler_sum.common_keys, how='outer')
+
+    with timer.stage('excel'):
+        buffer = io.BytesIO()
+        data_export.write_excel(df_final, buffer)
+
+    return {
+        'candidates'    : int_candidates,
+        'seed'          : int_seed,
+        'workers'       : int_workers,
+        'pdf_bytes'     : {header: len(b) for header, b in dict_pdfs.items()},
+        'rows'          : {'summary': len(df_main), 'merged': len(df_merged), 'formatted': len(df_final),
+                           'excel_bytes': len(buffer.getvalue())},
+        'seconds'       : timer.dict_seconds,
+        'total_seconds' : sum(timer.dict_seconds.values())
+    }
+
+def _package_version(str_name):
+    try:
+        return metadata.version(str_name)
+    except metadata.PackageNotFoundError:
+        return None
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def environment():
+    return {
+        'timestamp' : datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python'    : platform.python_version(),
+        'platform'  : platform.platform(),
+        'cpu_count' : os.cpu_count(),
+        'git_commit': _git_commit(),
+        'packages'  : {name: _package_version(name) for name in lst_packages}
+    }
+
+def compare(dict_result, dict_baseline, float_tolerance):
+    """Print stage ratios against a baseline run; returns the list of regressed (size, stage)."""
+    dict_base_runs = {run['candidates']: run for run in dict_baseline['runs']}
+    lst_regressions = []
+    for run in dict_result['runs']:
+        base = dict_base_runs.get(run['candidates'])
+        if base is None:
+            continue
+        for str_stage, float_seconds in run['seconds'].items():
+            float_base = base['seconds'].get(str_stage)
+            if not float_base:
+                continue
+            float_ratio = float_seconds / float_base
+            bool_regressed = float_base >= FLOAT_NOISE_FLOOR and float_ratio > float_tolerance
+            print(f"{run['candidates']:>8} {str_stage:<10} {float_base:>9.3f}s -> {float_seconds:>9.3f}s "
+                  f"x{float_ratio:.2f}{'  REGRESSION' if bool_regressed else ''}")
+            if bool_regressed:
+                lst_regressions.append((run['candidates'], str_stage))
+    return lst_regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=lst_default_sizes,
+                        help='cohort sizes in candidates (10 to 5000)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=1, help='extraction processes (0 = all CPUs)')
+    parser.add_argument('--output', default='bench_pipeline.json')
+    parser.add_argument('--baseline', help='earlier JSON result to compare against')
+    parser.add_argument('--tolerance', type=float, default=1.25, help='allowed slowdown ratio per stage')
+    args = parser.parse_args(argv)
+
+    dict_result = {'environment': environment(), 'runs': []}
+    for int_candidates in args.sizes:
+        run = run_once(int_candidates, args.seed, args.workers)
+        dict_result['runs'].append(run)
+        str_stages = '  '.join(f"{k} {v:.3f}" for k, v in run['seconds'].items())
+        print(f"{int_candidates:>6} candidates: {str_stages}  | total {run['total_seconds']:.3f}s")
+        sys.stdout.flush()
+
+    with open(args.output, 'w') as f:
+        json.dump(dict_result, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            dict_baseline = json.load(f)
+        if compare(dict_result, dict_baseline, args.tolerance):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
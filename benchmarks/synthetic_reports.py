@@ -0,0 +1,243 @@
+"""
+Synthetic IB report generator: random but reproducible cohorts rendered in the page
+layouts parse_page expects, as text or as minimal PDFs.
+
+    python -m benchmarks.synthetic_reports --candidates 500 --out synthetic_pdfs/
+"""
+import os
+import zlib
+import random
+import argparse
+
+
+#============================================================================
+# Layouts mirror what ib_result_handler_summary/subject.parse_page expect
+str_session_code        = 'M25'
+lst_subjects            = [
+    'Mathematics: analysis and approaches HL',
+    'Mathematics: applications and interpretation SL',
+    'English A: literature SL',
+    'Chinese A: language and literature HL',
+    'Chemistry HL',
+    'Physics SL',
+    'Biology HL',
+    'History SL',
+    'Economics HL',
+    'Spanish B SL'
+]
+lst_ee_subjects         = ['Physics EE', 'History EE', 'Chemistry EE', 'English A: literature EE']
+str_tk_subject          = 'Theory of knowledge TK'
+lst_results             = ['Diploma awarded', 'Diploma not awarded', 'Bilingual diploma awarded']
+
+int_subjects_per_candidate  = 6
+int_rows_per_subject_page   = 40
+
+# PDF page geometry (A4, points) for the text-only PDFs written by pdf_bytes
+int_page_width              = 595
+int_page_height             = 842
+int_font_size               = 9
+int_line_height             = 12
+int_margin                  = 40
+#============================================================================
+
+
+
+
+def make_cohort(int_candidates, int_seed=0):
+    """
+    Random but reproducible cohort.
+    Returns a list of candidate dicts with their subject grades, EE and TOK.
+    """
+    rnd = random.Random(int_seed)
+    lst_cohort = []
+    for i in range(int_candidates):
+        lst_cohort.append({
+            'session_number'    : f"{100000 + i:06d}",
+            'personal_code'     : f"({rnd.choice('abcdefghjk')}{rnd.choice('mnpqrstvwxyz')}{i:04d})",
+            'name'              : f"Surname{i}, Given{i}",
+            'birth_date'        : f"{rnd.randint(1, 28):02d}/{rnd.randint(1, 12):02d}/2007",
+            'subjects'          : {s: (rnd.randint(1, 7), rnd.randint(1, 7), round(rnd.uniform(20, 99), 2))
+                                   for s in rnd.sample(lst_subjects, int_subjects_per_candidate)},
+            'ee'                : (rnd.choice(lst_ee_subjects), rnd.choice('ABCDE'), rnd.choice('ABCDE')),
+            'tk'                : (rnd.choice('ABCDE'), rnd.choice('ABCDE')),
+            'pt_ee_tok'         : rnd.randint(0, 3),
+            'pt_total'          : rnd.randint(18, 45),
+            'result'            : rnd.choice(lst_results)
+        })
+    return lst_cohort
+
+def summary_pages(lst_cohort):
+    """'Results summary' report: one page per candidate."""
+    lst_pages = []
+    for c in lst_cohort:
+        lst_lines = [
+            'Results summary',
+            'Date printed: 05 Jul 2025',
+            f"Candidate {str_session_code} - {c['session_number']} {c['personal_code']}",
+            f"Name {c['name']}",
+            'Category Diploma',
+            f"Birth Date {c['birth_date']}",
+            'Grade Subject'
+        ]
+        for str_subject, (_, int_grade, _) in c['subjects'].items():
+            lst_lines.append(f"{int_grade} {str_session_code} - {str_subject}")
+        lst_lines.append(f"{c['ee'][2]} {str_session_code} - {c['ee'][0]}")
+        lst_lines.append(f"{c['tk'][1]} {str_session_code} - {str_tk_subject}")
+        lst_lines += [
+            f"EE/TOK points: {c['pt_ee_tok']}",
+            f"Total Points: {c['pt_total']}",
+            f"Result: {c['result']}"
+        ]
+        lst_pages.append(lst_lines)
+    return lst_pages
+
+def _subject_block_pages(str_subject_type, lst_header, lst_rows):
+    str_title = 'Subject Results' + (' ' + str_subject_type if str_subject_type else '')
+    lst_pages = []
+    for int_start in range(0, len(lst_rows), int_rows_per_subject_page):
+        lst_lines = [str_title] + lst_header + lst_rows[int_start:int_start + int_rows_per_subject_page]
+        lst_lines.append(f"Page {int_start // int_rows_per_subject_page + 1}")
+        lst_pages.append(lst_lines)
+    return lst_pages
+
+def _candidate_label(c):
+    return f"{c['session_number']} {c['personal_code']} - {c['name']}"
+
+def subject_pages(lst_cohort):
+    """'Subject Results' report: pages of predicted grade, grade and scaled total per subject."""
+    lst_pages = []
+    for str_subject in lst_subjects:
+        lst_rows = [
+            f"{c['subjects'][str_subject][0]} {c['subjects'][str_subject][1]} "
+            f"{c['subjects'][str_subject][2]:.2f} {_candidate_label(c)}"
+            for c in lst_cohort if str_subject in c['subjects']
+        ]
+        if lst_rows:
+            lst_header = [f"Predicted Grade Scaled total {str_subject}", 'Session Candidate']
+            lst_pages += _subject_block_pages('', lst_header, lst_rows)
+    return lst_pages
+
+def ee_pages(lst_cohort):
+    """'Subject Results (EXTENDED ESSAY)' report."""
+    lst_pages = []
+    for str_subject in lst_ee_subjects:
+        lst_rows = [f"{c['ee'][1]} {c['ee'][2]} {_candidate_label(c)}" for c in lst_cohort if c['ee'][0] == str_subject]
+        if lst_rows:
+            lst_header = [f"Predicted grade Grade {str_subject}"]
+            lst_pages += _subject_block_pages('(EXTENDED ESSAY)', lst_header, lst_rows)
+    return lst_pages
+
+def tk_pages(lst_cohort):
+    """'Subject Results (THEORY OF KNOWLEDGE)' report."""
+    lst_rows = [f"{c['tk'][0]} {c['tk'][1]} {_candidate_label(c)}" for c in lst_cohort]
+    lst_header = [f"Predicted grade Grade {str_tk_subject}"]
+    return _subject_block_pages('(THEORY OF KNOWLEDGE)', lst_header, lst_rows)
+
+def page_text(lst_lines):
+    """Join page lines the way pdfplumber's extract_text returns them."""
+    return '\n'.join(lst_lines)
+
+def _escape_pdf_string(str_text):
+    return str_text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+def _line_ops(lst_lines, str_layout):
+    if str_layout == 'lines':
+        # One run per line, top to bottom
+        lst_ops = [f"BT /F1 {int_font_size} Tf {int_line_height} TL {int_margin} {int_page_height - int_margin} Td"]
+        lst_ops += [f"({_escape_pdf_string(str_line)}) Tj T*" for str_line in lst_lines]
+        return lst_ops + ["ET"]
+    # 'runs': every word its own string in a TJ array, spaced by kerning instead of a space
+    # character, and lines placed absolutely and written bottom to top
+    lst_ops = [f"BT /F1 {int_font_size} Tf"]
+    for i in reversed(range(len(lst_lines))):
+        str_words = ' -600 '.join(f"({_escape_pdf_string(str_word)})" for str_word in lst_lines[i].split())
+        lst_ops.append(f"1 0 0 1 {int_margin} {int_page_height - int_margin - i * int_line_height} Tm [{str_words}] TJ")
+    return lst_ops + ["ET"]
+
+def _split(lst_items, int_parts):
+    """lst_items in int_parts consecutive chunks of (nearly) equal length."""
+    int_size, int_extra = divmod(len(lst_items), int_parts)
+    lst_chunks, int_start = [], 0
+    for i in range(int_parts):
+        int_stop = int_start + int_size + (i < int_extra)
+        lst_chunks.append(lst_items[int_start:int_stop])
+        int_start = int_stop
+    return lst_chunks
+
+def pdf_bytes(lst_pages, bool_compress=True, str_layout='lines', int_streams=1):
+    """
+    Minimal text-only PDF: one Helvetica text line per entry, top to bottom,
+    so pdfplumber's extract_text() returns page_text(lines) for every page.
+    str_layout: 'lines' writes one text run per line in reading order; 'runs' writes
+    each word as its own run and the lines out of order, as other PDF generators do.
+    int_streams: content streams per page; a page's operators are split between them
+    in order (a reader concatenates them), as incremental PDF writers produce.
+    """
+    lst_objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,   # page tree, filled in once the page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"
+    ]
+    lst_page_refs = []
+    str_filter = ' /Filter /FlateDecode' if bool_compress else ''
+    for lst_lines in lst_pages:
+        lst_contents_refs = []
+        for lst_ops in _split(_line_ops(lst_lines, str_layout), int_streams):
+            bytes_stream = '\n'.join(lst_ops).encode('cp1252')
+            if bool_compress:
+                bytes_stream = zlib.compress(bytes_stream)
+            lst_objects.append(f"<< /Length {len(bytes_stream)}{str_filter} >>\nstream\n".encode() + bytes_stream + b"\nendstream")
+            lst_contents_refs.append(f"{len(lst_objects)} 0 R")
+        str_contents = lst_contents_refs[0] if int_streams == 1 else f"[{' '.join(lst_contents_refs)}]"
+        lst_objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {int_page_width} {int_page_height}] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {str_contents} >>".encode()
+        )
+        lst_page_refs.append(len(lst_objects))
+    str_kids = ' '.join(f"{i} 0 R" for i in lst_page_refs)
+    lst_objects[1] = f"<< /Type /Pages /Kids [{str_kids}] /Count {len(lst_page_refs)} >>".encode()
+
+    buffer = bytearray(b"%PDF-1.4\n")
+    lst_offsets = []
+    for i, bytes_object in enumerate(lst_objects, start=1):
+        lst_offsets.append(len(buffer))
+        buffer += f"{i} 0 obj\n".encode() + bytes_object + b"\nendobj\n"
+    int_xref = len(buffer)
+    buffer += f"xref\n0 {len(lst_objects) + 1}\n0000000000 65535 f \n".encode()
+    for int_offset in lst_offsets:
+        buffer += f"{int_offset:010d} 00000 n \n".encode()
+    buffer += f"trailer\n<< /Size {len(lst_objects) + 1} /Root 1 0 R >>\nstartxref\n{int_xref}\n%%EOF\n".encode()
+    return bytes(buffer)
+
+# File name and page builder per report, keyed like IBResultProcessor.file_types
+dict_report_builders = {
+    'Results summary'       : ('display_report.pdf', summary_pages),
+    'Subject Results'       : ('display_report_.pdf', subject_pages),
+    '(EXTENDED ESSAY)'      : ('display_report_ee.pdf', ee_pages),
+    '(THEORY OF KNOWLEDGE)' : ('display_report_tk.pdf', tk_pages)
+}
+
+def report_pdfs(int_candidates, int_seed=0, str_layout='lines'):
+    """All four reports for one cohort: {file type header: PDF bytes}."""
+    lst_cohort = make_cohort(int_candidates, int_seed)
+    return {
+        header: pdf_bytes(func_pages(lst_cohort), str_layout=str_layout)
+        for header, (_, func_pages) in dict_report_builders.items()
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--candidates', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default='synthetic_pdfs')
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.out, exist_ok=True)
+    for header, bytes_pdf in report_pdfs(args.candidates, args.seed).items():
+        str_path = os.path.join(args.out, dict_report_builders[header][0])
+        with open(str_path, 'wb') as f:
+            f.write(bytes_pdf)
+        print(f"{header:<24} {len(bytes_pdf):>10,} bytes  {str_path}")
+
+if __name__ == '__main__':
+    main()
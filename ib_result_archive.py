@@ -0,0 +1,299 @@
+import os
+import re
+import sqlite3
+import contextlib
+from datetime import datetime, timezone
+
+import ib_result_lazy as data_lazy
+
+# The app checks the archive on every run; frames are only built for imports and queries
+pd = data_lazy.lazy_import('pandas')
+data_schema = data_lazy.lazy_import('ib_result_schema')
+data_export = data_lazy.lazy_import('ib_result_export')
+
+
+#============================================================================
+# SQLite file holding every archived consolidation
+STR_ARCHIVE_PATH        = os.environ.get(
+                            'IB_RESULT_ARCHIVE',
+                            os.path.join(os.path.expanduser('~'), '.local', 'share',
+                                         'ib_result_processor', 'archive.sqlite')
+                          )
+# Bump whenever the tables below change
+ARCHIVE_VERSION         = 1
+# Seconds a writer waits for another process's write to finish
+FLOAT_ARCHIVE_TIMEOUT_S = 30.0
+# Index rows sampled by ANALYZE after an import
+INT_ANALYSIS_LIMIT      = 1000
+
+# Columns of the consolidated (raw) results kept per row, in this order
+lst_archive_columns = [
+    'session', 'session_number', 'personal_code', 'candidate', 'name', 'category', 'birth_date',
+    'date_printed', 'subject', 'subject_', 'sub', 'grade', 'PG', 'FG', 'uni_pg', 'scaled_total',
+    'ee_sub', 'ee_pg', 'ee_fg', 'tk_sub', 'tk_pg', 'tk_fg', 'pt_ee_tok', 'pt_total', 'result'
+]
+# SQLite column type per ib_result_schema column kind; grades stay text since EE/TOK use A-E
+dict_sql_type = {
+    'category'  : 'TEXT',
+    'string'    : 'TEXT',
+    'grade'     : 'TEXT',
+    'points'    : 'INTEGER',
+    'decimal'   : 'REAL'
+}
+
+# Exam session codes: M25 = May 2025, N24 = November 2024
+re_session = re.compile(r'^\s*([MN])\s*(\d{2}|\d{4})\s*$', re.IGNORECASE)
+dict_session_month = {'M': 5, 'N': 11}
+
+# WHERE clause keeping only rows of results r from current imports
+STR_CURRENT_FILTER      = 'r.import_id IN (SELECT MAX(import_id) FROM imports GROUP BY school, session)'
+#============================================================================
+
+
+
+
+def session_order(str_session):
+    """Chronological sort key (year * 12 + month) of an exam session code; None if it is not one."""
+    match = re_session.match(str(str_session))
+    if not match:
+        return None
+    int_year = int(match.group(2))
+    if int_year < 100:
+        int_year += 2000
+    return int_year * 12 + dict_session_month[match.group(1).upper()]
+
+def _glob_prefix(str_prefix):
+    """GLOB pattern matching values starting with str_prefix (GLOB is case-sensitive and can use an index)."""
+    return re.sub(r'([*?\[])', r'[\1]', str_prefix) + '*'
+
+def _column_list(str_alias=''):
+    """Quoted archive columns for a SELECT or INSERT, optionally qualified by a table alias."""
+    str_prefix = f'{str_alias}.' if str_alias else ''
+    return ', '.join(f'{str_prefix}"{str_column}"' for str_column in lst_archive_columns)
+
+def _column_type(str_column):
+    return dict_sql_type[data_schema.dict_column_kind[str_column]]
+
+def _schema_sql():
+    str_columns = ',\n'.join(f'    "{str_column}" {_column_type(str_column)}' for str_column in lst_archive_columns)
+    lst_statements = [
+        """CREATE TABLE IF NOT EXISTS imports (
+            import_id       INTEGER PRIMARY KEY,
+            school          TEXT NOT NULL,
+            session         TEXT NOT NULL,
+            session_order   INTEGER,
+            content_hash    TEXT NOT NULL,
+            row_count       INTEGER NOT NULL,
+            source          TEXT,
+            imported_at     TEXT NOT NULL,
+            UNIQUE (school, session, content_hash)
+        )""",
+        f"""CREATE TABLE IF NOT EXISTS results (
+            import_id       INTEGER NOT NULL REFERENCES imports (import_id),
+            school          TEXT NOT NULL,
+        {str_columns}
+        )""",
+        'CREATE INDEX IF NOT EXISTS idx_results_personal_code ON results (personal_code)',
+        # Covers grade_distribution() of final grades: counted from the index alone
+        'CREATE INDEX IF NOT EXISTS idx_results_subject ON results (subject_, sub, session, FG, school, import_id)',
+        'CREATE INDEX IF NOT EXISTS idx_results_session ON results (session, school)',
+        'CREATE INDEX IF NOT EXISTS idx_results_import ON results (import_id)',
+        # The latest import of every school and session; earlier ones stay for the record
+        """CREATE VIEW IF NOT EXISTS current_imports AS
+            SELECT MAX(import_id) AS import_id, school, session, session_order
+            FROM imports GROUP BY school, session""",
+    ]
+    for str_table in ('imports', 'results'):
+        for str_event in ('UPDATE', 'DELETE'):
+            lst_statements.append(
+                f"""CREATE TRIGGER IF NOT EXISTS {str_table}_no_{str_event.lower()} BEFORE {str_event} ON {str_table}
+                BEGIN SELECT RAISE(ABORT, 'the results archive is append-only'); END"""
+            )
+    return lst_statements
+
+
+class ResultArchive:
+    """
+    Append-only archive of consolidated results across exam sessions and schools, in one
+    SQLite file, so trends can be queried without re-reading any PDF.
+
+    append() stores the rows of a consolidated_df (one row per candidate and subject) as one
+    import per exam session found in it, tagged with the school. Importing the same rows
+    again is a no-op; importing different rows for a school and session (e.g. after a
+    re-mark) adds a new import that supersedes the earlier one in queries, which only see
+    current_imports. Rows are never updated or deleted (triggers refuse it).
+
+    Rows are indexed by personal_code, by (subject_, sub, session) and by (session, school),
+    so per-subject and per-candidate queries read only the matching rows; final-grade
+    distributions are counted from the subject index alone. Queries keep
+    current rows with an import_id IN (...) filter rather than a join on current_imports,
+    which SQLite evaluates once instead of once per import.
+    Each call opens its own connection, so one archive can be used from any thread or process.
+    """
+
+    def __init__(self, str_path=STR_ARCHIVE_PATH):
+        self.str_path = str_path
+        self._bool_ready = False
+        # Imports are never deleted: once seen, has_imports() needs no further check
+        self._bool_has_imports = False
+
+    def exists(self):
+        return os.path.exists(self.str_path)
+
+    @contextlib.contextmanager
+    def _connect(self, bool_schema=True):
+        if bool_schema and not self._bool_ready:
+            str_dir = os.path.dirname(os.path.abspath(self.str_path))
+            os.makedirs(str_dir, exist_ok=True)
+        # Autocommit: append() opens its transactions explicitly
+        connection = sqlite3.connect(self.str_path, timeout=FLOAT_ARCHIVE_TIMEOUT_S, isolation_level=None)
+        try:
+            if bool_schema and not self._bool_ready:
+                # Readers keep reading while another process appends
+                connection.execute('PRAGMA journal_mode=WAL')
+                for str_statement in _schema_sql():
+                    connection.execute(str_statement)
+                connection.execute(f'PRAGMA user_version = {ARCHIVE_VERSION}')
+                self._bool_ready = True
+            yield connection
+        finally:
+            connection.close()
+
+    def append(self, df, str_school, str_source=None):
+        """
+        Archive the rows of a consolidated_df for str_school.
+        Returns [(session, rows, bool_added)] per exam session in df; bool_added is False
+        when exactly these rows were archived for the school and session before.
+        """
+        df = df.reset_index(drop=True).reindex(columns=lst_archive_columns)
+        str_imported_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        str_placeholders = ', '.join(['?'] * (len(lst_archive_columns) + 2))
+        lst_report = []
+        with self._connect() as connection:
+            for str_session, df_session in df.groupby(df['session'].astype(object).fillna(''), sort=False):
+                str_hash = data_export.content_hash(df_session.reset_index(drop=True))
+                # One writer at a time across processes; the duplicate check and insert are atomic
+                connection.execute('BEGIN IMMEDIATE')
+                try:
+                    if connection.execute(
+                        'SELECT 1 FROM imports WHERE school = ? AND session = ? AND content_hash = ?',
+                        (str_school, str_session, str_hash)
+                    ).fetchone():
+                        connection.execute('ROLLBACK')
+                        lst_report.append((str_session, len(df_session), False))
+                        continue
+                    int_import = connection.execute(
+                        'INSERT INTO imports (school, session, session_order, content_hash, row_count, source, imported_at) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                        (str_school, str_session, session_order(str_session), str_hash, len(df_session),
+                         str_source, str_imported_at)
+                    ).lastrowid
+                    lst_values = [df_session[str_column].astype(object).where(df_session[str_column].notna(), None)
+                                  .tolist() for str_column in lst_archive_columns]
+                    connection.executemany(
+                        f'INSERT INTO results (import_id, school, {_column_list()}) VALUES ({str_placeholders})',
+                        ((int_import, str_school, *row) for row in zip(*lst_values))
+                    )
+                    connection.execute('COMMIT')
+                except BaseException:
+                    connection.execute('ROLLBACK')
+                    raise
+                lst_report.append((str_session, len(df_session), True))
+                self._bool_has_imports = True
+            if any(bool_added for _, _, bool_added in lst_report):
+                # Sampled statistics, so the planner picks the candidate index over the session one
+                connection.execute(f'PRAGMA analysis_limit = {INT_ANALYSIS_LIMIT}')
+                connection.execute('ANALYZE')
+        return lst_report
+
+    def query(self, str_sql, params=()):
+        """DataFrame of any SQL over the archive (tables imports and results, view current_imports)."""
+        with self._connect() as connection:
+            return pd.read_sql_query(str_sql, connection, params=params)
+
+    def has_imports(self):
+        """Whether anything was archived yet (without creating the archive)."""
+        if self._bool_has_imports:
+            return True
+        if not self.exists():
+            return False
+        with self._connect(bool_schema=False) as connection:
+            try:
+                self._bool_has_imports = connection.execute('SELECT 1 FROM imports LIMIT 1').fetchone() is not None
+            except sqlite3.OperationalError:
+                return False
+        return self._bool_has_imports
+
+    def imports(self):
+        """The current import of every school and session, oldest session first."""
+        return self.query(
+            'SELECT i.school, i.session, i.row_count, i.imported_at, i.source FROM imports i '
+            'JOIN current_imports c ON c.import_id = i.import_id ORDER BY i.session_order, i.session, i.school'
+        )
+
+    def sessions(self, str_school=None):
+        """Archived exam sessions (of str_school, if given), oldest first."""
+        str_where, params = ('WHERE school = ?', (str_school,)) if str_school else ('', ())
+        with self._connect() as connection:
+            return [row[0] for row in connection.execute(
+                f'SELECT DISTINCT session, session_order FROM current_imports {str_where} '
+                'ORDER BY session_order, session', params
+            )]
+
+    def subjects(self):
+        """(subject, level) pairs in the archive, sorted."""
+        with self._connect() as connection:
+            return connection.execute(
+                'SELECT DISTINCT subject_, sub FROM results WHERE subject_ IS NOT NULL ORDER BY subject_, sub'
+            ).fetchall()
+
+    def _grade_distribution_sql(self, str_subject, str_level, int_sessions, str_school, str_grade):
+        """(SQL, params, sessions) of grade_distribution(); sessions is empty if there are none."""
+        if str_grade not in lst_archive_columns or data_schema.dict_column_kind.get(str_grade) != 'grade':
+            raise ValueError(f"{str_grade!r} is not a grade column")
+        lst_sessions = self.sessions(str_school)[-int_sessions:] if int_sessions else self.sessions(str_school)
+
+        # Unary + keeps SQLite off the (session, school) index: a few sessions match most
+        # rows, while a subject prefix matches few (sampled statistics can't tell them apart)
+        lst_where = ['r.subject_ GLOB ?', f'+r.session IN ({", ".join(["?"] * len(lst_sessions))})',
+                     f'r."{str_grade}" IS NOT NULL']
+        params = [_glob_prefix(str_subject), *lst_sessions]
+        if str_level:
+            lst_where.append('r.sub = ?')
+            params.append(str_level)
+        if str_school:
+            lst_where.append('r.school = ?')
+            params.append(str_school)
+        str_sql = (f'SELECT r.session, r."{str_grade}" AS grade, COUNT(*) AS candidates FROM results r '
+                   f'WHERE {" AND ".join(lst_where)} AND {STR_CURRENT_FILTER} GROUP BY r.session, r."{str_grade}"')
+        return str_sql, params, lst_sessions
+
+    def grade_distribution(self, str_subject, str_level=None, int_sessions=5, str_school=None, str_grade='FG'):
+        """
+        Candidates per grade and exam session for subjects starting with str_subject (e.g.
+        'Mathematics' covers both maths courses) at str_level ('HL', 'SL'; None = any), over
+        the latest int_sessions sessions (of str_school, if given; None = all schools).
+        str_grade: grade column counted ('FG' final, 'PG' predicted, 'grade' as printed).
+        Returns a DataFrame with a row per session (oldest first) and a column per grade.
+        """
+        str_sql, params, lst_sessions = self._grade_distribution_sql(
+            str_subject, str_level, int_sessions, str_school, str_grade
+        )
+        if not lst_sessions:
+            return pd.DataFrame()
+        df = self.query(str_sql, params)
+        df_counts = df.pivot(index='session', columns='grade', values='candidates')
+        df_counts = df_counts.reindex(index=[s for s in lst_sessions if s in df_counts.index],
+                                      columns=sorted(df_counts.columns, key=lambda g: (len(g), g)))
+        return df_counts.fillna(0).astype('int64').rename_axis(index='session', columns='grade')
+
+    def candidate_history(self, str_personal_code):
+        """Every current archived row of one candidate (personal code with or without brackets)."""
+        str_code = str_personal_code.strip().strip('()')
+        df = self.query(
+            f'SELECT r.school, {_column_list("r")} FROM results r '
+            'JOIN imports i ON i.import_id = r.import_id '
+            f'WHERE r.personal_code IN (?, ?) AND {STR_CURRENT_FILTER} ORDER BY i.session_order, r.subject',
+            (f'({str_code})', str_code)
+        )
+        return data_schema.apply_schema(df)
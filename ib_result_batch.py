@@ -0,0 +1,248 @@
+"""
+Headless batch consolidation of many schools' IB result PDFs.
+
+Every sub-directory of the input directory is one school; the PDFs found under it are
+classified by their first-page header (same headers as the app), extracted through the
+shared on-disk cache, merged and formatted. Schools run in a process pool, each one
+writing its outputs to <output>/<school>/, and a manifest of the run is written to
+<output>/manifest.json. With --archive, each school's raw results are also appended to
+the SQLite results archive (see ib_result_archive), tagged with the school's directory name.
+
+    python ib_result_batch.py results_2025/ --output consolidated_2025/ --jobs 8
+    python ib_result_batch.py results_2025/ --archive ~/ib_archive.sqlite
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+import traceback
+from datetime import datetime, timezone
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import ib_result_pdf as data_pdf
+import ib_result_cache as data_cache
+import ib_result_detect as data_detect
+import ib_result_perf as data_perf
+import ib_result_export as data_export
+import ib_result_pipeline as data_pipeline
+import ib_result_archive as data_archive
+
+
+#============================================================================
+# Output file names per school (as offered for download in the app)
+str_output_raw_csv      = 'raw_results.csv'
+str_output_formatted    = 'formatted_results.xlsx'
+# Typed columnar copies of the same two frames
+str_output_raw_parquet  = 'raw_results.parquet'
+str_output_formatted_parquet = 'formatted_results.parquet'
+str_manifest_name       = 'manifest.json'
+#============================================================================
+
+
+
+
+def find_schools(str_input_dir):
+    """
+    Return [(school name, [pdf paths])] for every directory under str_input_dir that holds
+    PDFs, searched recursively per top-level sub-directory. PDFs directly in
+    str_input_dir form a school named after the directory itself.
+    """
+    root = Path(str_input_dir)
+    lst_schools = []
+    lst_loose = sorted(p for p in root.iterdir() if p.is_file() and p.suffix.lower() == '.pdf')
+    if lst_loose:
+        lst_schools.append((root.resolve().name, [str(p) for p in lst_loose]))
+    for school_dir in sorted(p for p in root.iterdir() if p.is_dir()):
+        lst_pdfs = sorted(p for p in school_dir.rglob('*') if p.is_file() and p.suffix.lower() == '.pdf')
+        if lst_pdfs:
+            lst_schools.append((school_dir.name, [str(p) for p in lst_pdfs]))
+    return lst_schools
+
+def classify_pdfs(lst_pdf_paths):
+    """
+    Detect the report type of every PDF.
+    Returns (dict header -> PdfSource, list of per-file manifest entries). When two PDFs
+    have the same type the first one (path order) is used and the other is reported;
+    files that cannot be read as PDFs are reported and skipped.
+    """
+    dict_sources = {}
+    lst_files = []
+    for str_path in lst_pdf_paths:
+        with open(str_path, 'rb') as f:
+            source = data_pdf.PdfSource(f.read(), os.path.basename(str_path))
+        try:
+            header, float_confidence = data_detect.detect_file_type(source, data_pipeline.dict_header_map)
+        except Exception as e:
+            source.close()
+            lst_files.append({'path': str_path, 'type': None, 'confidence': 0.0,
+                              'status': f"unreadable ({type(e).__name__}: {e})"})
+            continue
+        dict_file = {'path': str_path, 'type': data_pipeline.dict_file_types.get(header),
+                     'confidence': float_confidence}
+        if header is None:
+            dict_file['status'] = 'unrecognised'
+            source.close()
+        elif header in dict_sources:
+            dict_file['status'] = 'duplicate (ignored)'
+            source.close()
+        else:
+            dict_file['status'] = 'used'
+            dict_sources[header] = source
+        lst_files.append(dict_file)
+    return dict_sources, lst_files
+
+def consolidate_sources(dict_sources, extraction_cache, recorder, int_extract_workers=1):
+    """
+    Extract, merge and format one school's reports (dict header -> PdfSource).
+    Returns (df_merged, df_merged_final, {report: source rows not merged because of
+    duplicate keys}) as IBResultProcessor.consolidate_data does.
+    """
+    def func_extract(header, handler, source):
+        return extraction_cache.extract_results(handler, source, int_workers=int_extract_workers)
+
+    pipeline = data_pipeline.ResultPipeline()
+    df_merged, df_merged_final = pipeline.run(dict_sources, func_extract, recorder)
+    return df_merged, df_merged_final, pipeline.dropped_rows()
+
+def process_school(str_school, lst_pdf_paths, str_output_dir, str_cache_dir=None, int_extract_workers=1,
+                   str_archive_path=None):
+    """
+    Consolidate one school and write its outputs to str_output_dir/str_school, and append
+    its raw results to the archive at str_archive_path if given.
+    Runs in a worker process; never raises, failures are reported in the returned
+    manifest entry. The handlers' debug prints are discarded.
+    """
+    float_start = time.perf_counter()
+    dict_entry = {'school': str_school, 'status': 'ok', 'files': [], 'outputs': {}, 'rows': {}}
+    recorder = data_perf.PerfRecorder(bool_enabled=True)
+    dict_sources = {}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            extraction_cache = (data_cache.ExtractionCache(str_cache_dir) if str_cache_dir
+                                else data_cache.ExtractionCache())
+            with recorder.stage('detect'):
+                dict_sources, dict_entry['files'] = classify_pdfs(lst_pdf_paths)
+            if 'Results summary' not in dict_sources:
+                dict_entry['status'] = 'skipped'
+                dict_entry['error'] = 'no Student Level (Results summary) report found'
+                return dict_entry
+
+            df_merged, df_merged_final, dict_dropped = consolidate_sources(dict_sources, extraction_cache,
+                                                                           recorder, int_extract_workers)
+            # Rows the merge left out (duplicate keys in a subject report), by report
+            dict_entry['dropped'] = {str_label: len(df) for str_label, df in dict_dropped.items()}
+
+            str_school_dir = os.path.join(str_output_dir, str_school)
+            os.makedirs(str_school_dir, exist_ok=True)
+            str_raw_path = os.path.join(str_school_dir, str_output_raw_csv)
+            str_formatted_path = os.path.join(str_school_dir, str_output_formatted)
+            with recorder.stage('export_csv'):
+                df_merged.to_csv(str_raw_path, index=False)
+            with recorder.stage('export_excel'):
+                data_export.write_excel(df_merged_final, str_formatted_path)
+            dict_parquet_paths = {'raw_parquet'        : os.path.join(str_school_dir, str_output_raw_parquet),
+                                  'formatted_parquet'  : os.path.join(str_school_dir, str_output_formatted_parquet)}
+            with recorder.stage('export_parquet'):
+                data_export.write_parquet(df_merged, dict_parquet_paths['raw_parquet'])
+                data_export.write_parquet(df_merged_final, dict_parquet_paths['formatted_parquet'])
+            if str_archive_path:
+                with recorder.stage('archive'):
+                    lst_archived = data_archive.ResultArchive(str_archive_path).append(
+                        df_merged, str_school, str_source=os.path.abspath(os.path.commonpath(lst_pdf_paths))
+                    )
+                dict_entry['archived'] = [{'session': str_session, 'rows': int_rows, 'added': bool_added}
+                                          for str_session, int_rows, bool_added in lst_archived]
+
+        dict_entry['outputs'] = {'raw_csv': str_raw_path, 'formatted_excel': str_formatted_path,
+                                 **dict_parquet_paths}
+        dict_entry['rows'] = {'raw': len(df_merged), 'formatted': len(df_merged_final)}
+        dict_entry['missing'] = [data_pipeline.dict_file_types[h] for h in data_pipeline.dict_merge_steps
+                                     if h not in dict_sources]
+    except Exception as e:
+        dict_entry['status'] = 'failed'
+        dict_entry['error'] = f"{type(e).__name__}: {e}"
+        dict_entry['traceback'] = traceback.format_exc()
+    finally:
+        for source in dict_sources.values():
+            source.close()
+        dict_entry['stages'] = recorder.lst_records
+        dict_entry['seconds'] = round(time.perf_counter() - float_start, 3)
+    return dict_entry
+
+def run_batch(str_input_dir, str_output_dir, int_jobs=None, int_extract_workers=1, str_cache_dir=None,
+              func_report=None, str_archive_path=None):
+    """
+    Consolidate every school under str_input_dir with int_jobs processes (None/0 = all CPUs),
+    appending each school's results to the archive at str_archive_path if given.
+    func_report(dict_entry) is called as each school finishes.
+    Returns the run manifest (also written to str_output_dir/manifest.json).
+    """
+    lst_schools = find_schools(str_input_dir)
+    int_jobs = data_pdf.resolve_workers(int_jobs or 0)
+    os.makedirs(str_output_dir, exist_ok=True)
+
+    str_started = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    float_start = time.perf_counter()
+    lst_entries = []
+    if lst_schools:
+        with ProcessPoolExecutor(max_workers=min(int_jobs, len(lst_schools))) as executor:
+            lst_futures = [
+                executor.submit(process_school, str_school, lst_pdf_paths, str_output_dir,
+                                str_cache_dir, int_extract_workers, str_archive_path)
+                for str_school, lst_pdf_paths in lst_schools
+            ]
+            for future in as_completed(lst_futures):
+                dict_entry = future.result()
+                lst_entries.append(dict_entry)
+                if func_report is not None:
+                    func_report(dict_entry)
+
+    dict_manifest = {
+        'input_dir'         : os.path.abspath(str_input_dir),
+        'output_dir'        : os.path.abspath(str_output_dir),
+        'started'           : str_started,
+        'seconds'           : round(time.perf_counter() - float_start, 3),
+        'jobs'              : int_jobs,
+        'extract_workers'   : int_extract_workers,
+        'archive'           : os.path.abspath(str_archive_path) if str_archive_path else None,
+        'counts'            : {str_status: sum(e['status'] == str_status for e in lst_entries)
+                               for str_status in ('ok', 'skipped', 'failed')},
+        'schools'           : sorted(lst_entries, key=lambda e: e['school'])
+    }
+    with open(os.path.join(str_output_dir, str_manifest_name), 'w') as f:
+        json.dump(dict_manifest, f, indent=2)
+    return dict_manifest
+
+def _print_entry(dict_entry):
+    str_detail = dict_entry.get('error') or f"{dict_entry['rows'].get('formatted', 0):,} candidates"
+    print(f"{dict_entry['status']:<8} {dict_entry['school']:<30} {dict_entry['seconds']:>8.2f}s  {str_detail}")
+    sys.stdout.flush()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input_dir', help='directory with one sub-directory of PDFs per school')
+    parser.add_argument('--output', default='batch_output', help='output directory (default: batch_output)')
+    parser.add_argument('--jobs', type=int, default=0, help='schools processed in parallel (0 = all CPUs)')
+    parser.add_argument('--extract-workers', type=int, default=1,
+                        help='extraction processes per PDF inside each school job (default: 1)')
+    parser.add_argument('--cache-dir', help='extraction cache directory (default: IB_RESULT_CACHE_DIR)')
+    parser.add_argument('--archive', nargs='?', const=data_archive.STR_ARCHIVE_PATH, metavar='PATH',
+                        help='also append the results to this SQLite archive '
+                             '(no PATH: IB_RESULT_ARCHIVE or the default location)')
+    args = parser.parse_args(argv)
+
+    dict_manifest = run_batch(args.input_dir, args.output, args.jobs, args.extract_workers,
+                              args.cache_dir, func_report=_print_entry, str_archive_path=args.archive)
+    dict_counts = dict_manifest['counts']
+    print(f"{len(dict_manifest['schools'])} schools in {dict_manifest['seconds']:.2f}s: "
+          f"{dict_counts['ok']} ok, {dict_counts['skipped']} skipped, {dict_counts['failed']} failed")
+    print(f"Manifest written to {os.path.join(args.output, str_manifest_name)}")
+    if dict_counts['failed']:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,303 @@
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+import weakref
+
+import ib_result_lazy as data_lazy
+
+# The app holds a cache and leases per session from the start; Arrow and the PDF
+# reader load with the first extraction
+pa = data_lazy.lazy_import('pyarrow')
+pq = data_lazy.lazy_import('pyarrow.parquet')
+data_pdf = data_lazy.lazy_import('ib_result_pdf')
+
+logger = logging.getLogger(__name__)
+
+
+#============================================================================
+# Cache location and size bound (least recently used entries are evicted first)
+STR_CACHE_DIR           = os.environ.get(
+                            'IB_RESULT_CACHE_DIR',
+                            os.path.join(os.path.expanduser('~'), '.cache', 'ib_result_processor')
+                          )
+INT_CACHE_MAX_BYTES     = int(os.environ.get('IB_RESULT_CACHE_MB', '512')) * 1024 * 1024
+
+STR_CACHE_SUFFIX        = '.parquet'
+# Parquet schema metadata key holding the non-DataFrame part of a handler's return value
+BYTES_META_EXTRA        = b'ib_result_extra'
+INT_HASH_CHUNK          = 1024 * 1024
+#============================================================================
+
+
+
+
+def hash_bytes(bytes_data):
+    """SHA-256 hex digest of an in-memory upload."""
+    return hashlib.sha256(bytes_data).hexdigest()
+
+def hash_file(str_path):
+    """SHA-256 hex digest of a file on disk, read in chunks."""
+    hasher = hashlib.sha256()
+    with open(str_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(INT_HASH_CHUNK), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class ExtractionCache:
+    """
+    On-disk cache of handler extract_results() output.
+    Entries are keyed by handler module, its PARSER_VERSION, the extraction backend
+    and the SHA-256 of the PDF, stored as one Parquet file each, and evicted
+    least-recently-used once the directory grows past int_max_bytes.
+    """
+
+    def __init__(self, str_cache_dir=STR_CACHE_DIR, int_max_bytes=INT_CACHE_MAX_BYTES):
+        self.str_cache_dir = str_cache_dir
+        self.int_max_bytes = int_max_bytes
+        os.makedirs(self.str_cache_dir, exist_ok=True)
+
+    def make_key(self, handler, str_digest, str_backend=None):
+        str_backend = data_pdf.get_backend(str_backend).str_name
+        # The default backend keeps the key entries had before backends were pluggable
+        str_backend = '' if str_backend == data_pdf.PdfplumberBackend.str_name else f"-{str_backend}"
+        return f"{handler.__name__}-v{handler.PARSER_VERSION}{str_backend}-{str_digest}"
+
+    def _path(self, str_key):
+        return os.path.join(self.str_cache_dir, str_key + STR_CACHE_SUFFIX)
+
+    def get(self, str_key):
+        """Return (df, lst_extra) for a cached entry, or None on a miss."""
+        str_path = self._path(str_key)
+        try:
+            table = pq.read_table(str_path)
+        except FileNotFoundError:
+            return None
+        except (OSError, pa.ArrowException):
+            # Truncated or unreadable entry: drop it and treat as a miss
+            self._remove(str_path)
+            return None
+
+        # Touch the entry so eviction sees it as recently used
+        try:
+            os.utime(str_path)
+        except OSError:
+            pass
+
+        metadata = table.schema.metadata or {}
+        lst_extra = json.loads(metadata.get(BYTES_META_EXTRA, b'[]'))
+        return table.to_pandas(), lst_extra
+
+    def put(self, str_key, df, lst_extra=None):
+        """Store a DataFrame (plus JSON-serialisable extras) and enforce the size bound."""
+        table = pa.Table.from_pandas(df)
+        metadata = dict(table.schema.metadata or {})
+        metadata[BYTES_META_EXTRA] = json.dumps(lst_extra or []).encode('utf-8')
+        table = table.replace_schema_metadata(metadata)
+
+        # Write to a temp file first so readers never see a partial entry
+        fd, str_tmp_path = tempfile.mkstemp(dir=self.str_cache_dir, suffix='.tmp')
+        os.close(fd)
+        try:
+            pq.write_table(table, str_tmp_path)
+            os.replace(str_tmp_path, self._path(str_key))
+        except (OSError, pa.ArrowException) as e:
+            self._remove(str_tmp_path)
+            logger.warning("Extraction cache write of %s failed: %s", str_key, e)
+            return
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in int_max_bytes."""
+        lst_entries = []
+        for entry in os.scandir(self.str_cache_dir):
+            if entry.is_file() and entry.name.endswith(STR_CACHE_SUFFIX):
+                stat = entry.stat()
+                lst_entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        int_total = sum(size for _, size, _ in lst_entries)
+        for _, int_size, str_path in sorted(lst_entries):
+            if int_total <= self.int_max_bytes:
+                break
+            self._remove(str_path)
+            int_total -= int_size
+
+    def _remove(self, str_path):
+        try:
+            os.remove(str_path)
+        except OSError:
+            pass
+
+    def extract_results(self, handler, pdf_path, str_digest=None, **kwargs):
+        """
+        Cached handler.extract_results(pdf_path, **kwargs).
+        pdf_path: anything the handlers accept (PdfSource, bytes or a path); the digest
+        is computed from it when not given.
+        Returns exactly what the handler returns: a DataFrame, or a tuple whose
+        first item is the DataFrame (e.g. (df, str_subject_type) for the subject handler).
+        """
+        if str_digest is None:
+            if isinstance(pdf_path, data_pdf.PdfSource):
+                str_digest = pdf_path.str_digest
+            elif isinstance(pdf_path, (bytes, bytearray)):
+                str_digest = hash_bytes(pdf_path)
+            else:
+                str_digest = hash_file(pdf_path)
+        str_key = self.make_key(handler, str_digest, kwargs.get('str_backend'))
+
+        cached = self.get(str_key)
+        if cached is not None:
+            df, lst_extra = cached
+            return (df, *lst_extra) if lst_extra else df
+
+        result = handler.extract_results(pdf_path, **kwargs)
+        if isinstance(result, tuple):
+            df, lst_extra = result[0], list(result[1:])
+        else:
+            df, lst_extra = result, []
+        self.put(str_key, df, lst_extra)
+        return result
+
+
+class _Flight:
+    """One shared computation: its result (or error) once event is set, and how many hold it."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+        self.int_refs = 0
+
+
+class SharedResults:
+    """
+    Process-wide single-flight table of read-only results, keyed by content hash.
+
+    The first acquire() of a key computes the value; concurrent acquire() calls of the
+    same key (other sessions uploading the same PDF) wait for that computation and
+    get the same object instead of repeating it. Every successful acquire() returns the
+    flight holding the value and takes a reference to it, which release() gives back;
+    the value is dropped once all references were released. If the computation fails,
+    every waiter gets its error, no reference is kept and the key is forgotten, so a
+    later call retries.
+
+    References belong to a flight, not to its key: releasing a flight that was already
+    dropped (or replaced by a newer computation of the same key) leaves the newer one alone.
+
+    Shared values must be treated as read-only; DataFrames are safe to pass on since
+    pandas copies on write (a shallow copy never changes the original).
+    """
+
+    def __init__(self):
+        self.dict_flights = {}
+        self.lock = threading.Lock()
+
+    def _forget(self, str_key, flight):
+        # Caller holds the lock
+        if self.dict_flights.get(str_key) is flight:
+            del self.dict_flights[str_key]
+
+    def acquire(self, str_key, func):
+        """
+        The flight of str_key (its result in .value), computing it with func() unless it
+        is held or in flight. Raises the computation's error without taking a reference.
+        """
+        with self.lock:
+            flight = self.dict_flights.get(str_key)
+            bool_leader = flight is None
+            if bool_leader:
+                flight = self.dict_flights[str_key] = _Flight()
+            flight.int_refs += 1
+
+        if bool_leader:
+            try:
+                flight.value = func()
+            except BaseException as e:
+                flight.error = e
+                with self.lock:
+                    flight.int_refs -= 1
+                    self._forget(str_key, flight)
+                raise
+            finally:
+                flight.event.set()
+        else:
+            flight.event.wait()
+            if flight.error is not None:
+                with self.lock:
+                    flight.int_refs -= 1
+                raise flight.error
+        return flight
+
+    def release(self, str_key, flight):
+        """Drop one reference to a flight acquire() returned; its value is freed when none is left."""
+        with self.lock:
+            flight.int_refs -= 1
+            if flight.int_refs <= 0:
+                self._forget(str_key, flight)
+
+    def run(self, str_key, func):
+        """func() deduplicated against concurrent calls of the same key; nothing is kept afterwards."""
+        flight = self.acquire(str_key, func)
+        try:
+            return flight.value
+        finally:
+            self.release(str_key, flight)
+
+    def counts(self):
+        """(results held or in flight, references to them)."""
+        with self.lock:
+            return len(self.dict_flights), sum(flight.int_refs for flight in self.dict_flights.values())
+
+shared_results = SharedResults()
+
+
+def _release_all(shared, dict_held):
+    for str_key, flight in list(dict_held.items()):
+        shared.release(str_key, flight)
+    dict_held.clear()
+
+
+class ResultLeases:
+    """
+    The SharedResults references one session holds, at most one per key.
+    retain() releases the ones no longer needed (e.g. of replaced uploads); a finalizer
+    releases the rest when Streamlit drops the session.
+    """
+
+    def __init__(self, shared=None):
+        self.shared = shared or shared_results
+        # key -> flight this session holds a reference to
+        self.dict_held = {}
+        self.lock = threading.Lock()
+        self._finalizer = weakref.finalize(self, _release_all, self.shared, self.dict_held)
+
+    def acquire(self, str_key, func):
+        flight = self.shared.acquire(str_key, func)
+        with self.lock:
+            flight_held = self.dict_held.get(str_key)
+            if flight_held is flight:
+                # Already held by this session: keep a single reference
+                self.shared.release(str_key, flight)
+            else:
+                if flight_held is not None:
+                    self.shared.release(str_key, flight_held)
+                self.dict_held[str_key] = flight
+        return flight.value
+
+    def retain(self, set_keep):
+        """Release every held key not in set_keep."""
+        with self.lock:
+            for str_key in set(self.dict_held) - set(set_keep):
+                self.shared.release(str_key, self.dict_held.pop(str_key))
+
+    def held(self):
+        """Whether this session holds any shared result."""
+        with self.lock:
+            return bool(self.dict_held)
+
+    def release_all(self):
+        with self.lock:
+            _release_all(self.shared, self.dict_held)
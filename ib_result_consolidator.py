@@ -1,5 +1,6 @@
 import re
 import sys
+import logging
 
 import numpy as np
 import pandas as pd
@@ -10,15 +11,20 @@ from pathlib import Path
 
 import ib_result_handler_summary as data_handler_sum
 import ib_result_handler_subject as data_handler_sub
+import ib_result_export as data_export
 #import ib_result_handler_summary 
 #import ib_result_handler_subject 
 
+logger = logging.getLogger(__name__)
+
 
 str_path_subject        = 'exam_results_subject_.csv'
 #str_path_student       = 'exam_results.csv'
 str_path_student        = 'raw_exam_results.csv'
 str_path_output_csv     = 'exam_results_agg.csv'
 str_path_output_excel   = 'exam_results_agg.xlsx'
+str_path_output_parquet = 'exam_results_agg.parquet'
+str_path_output_arrow   = 'exam_results_agg.arrow'
 
 lst_header_id = ['session_number', 'personal_code', 'subject']
 # Determine common keys (example: candidate, name, birth_date)
@@ -54,29 +60,101 @@ merge_steps = [
 
 
 #==================================================================================================
+def _key_index(df, index_cols):
+    return pd.MultiIndex.from_frame(df[index_cols])
+
+def merge_all_results(df_main, lst_sources, lst_dropped=None):
+    """
+    Merge engine: fill every step's columns into df_main in one indexed alignment pass.
+    df_main: DataFrame to merge into.
+    lst_sources: list of (df_source, step) pairs, step being a merge_steps entry
+                 ('index_cols', 'merge_cols', 'rename_map').
+    lst_dropped: optional list; gets one (source position, DataFrame of dropped rows)
+                 entry per source that had duplicate keys.
+    Same result as a left pd.merge per step followed by the '_new' combine_first fix-up:
+    existing target columns keep their value where the source has none, new ones are added.
+    An existing column that is still entirely blank is replaced outright, keeping the
+    source column's type.
+    The key index of df_main is built once per distinct index_cols, each source is indexed
+    once, and the columns are gathered by position, so df_main is never copied; the
+    returned frame shares its untouched columns with df_main.
+
+    Duplicate keys: one main row takes its values from one source row, so when several
+    rows of a source share the same index_cols key, the first of them is merged and the
+    others are dropped (a left merge would have duplicated the main row instead). The
+    dropped rows are logged as a warning and, if lst_dropped is given, added to it so the
+    caller can show them.
+    Returns: merged DataFrame.
+    """
+    df_merged = df_main.copy(deep=False)
+    dict_main_index = {}
+    for int_source, (df_source, step) in enumerate(lst_sources):
+        index_cols = list(step['index_cols'])
+        rename_map = step['rename_map'] or {}
+
+        str_index_key = tuple(index_cols)
+        if str_index_key not in dict_main_index:
+            dict_main_index[str_index_key] = _key_index(df_main, index_cols)
+        main_index = dict_main_index[str_index_key]
+
+        source_index = _key_index(df_source, index_cols)
+        if not source_index.is_unique:
+            mask_first = ~source_index.duplicated(keep='first')
+            df_dropped = df_source[~mask_first]
+            logger.warning("merge_all_results: %d source row(s) with a duplicate %s key not merged",
+                           len(df_dropped), '/'.join(index_cols))
+            if lst_dropped is not None:
+                lst_dropped.append((int_source, df_dropped))
+            df_source = df_source[mask_first]
+            source_index = source_index[mask_first]
+        # Position of each main row in the source, -1 where it has no match
+        indexer = source_index.get_indexer(main_index)
+
+        for col in step['merge_cols']:
+            target_col = rename_map.get(col, col)
+            values_new = pd.api.extensions.take(df_source[col].array, indexer, allow_fill=True)
+            series_new = pd.Series(values_new, index=df_merged.index, name=target_col)
+            if target_col in df_merged.columns and df_merged[target_col].notna().any():
+                df_merged[target_col] = series_new.combine_first(df_merged[target_col])
+            else:
+                df_merged[target_col] = series_new
+    return df_merged
+
+def read_merge_source(merge_file_substring, columns=None):
+    """
+    Load the subject file for one merge step (subject type inserted before the extension).
+    A Parquet/Arrow file of the same name is read instead of the CSV when present.
+    columns: load only these columns (e.g. the step's index_cols + merge_cols).
+    """
+    # ==================================================================================================
+    # Insert subject type before extension
+    str_filepath_tmp = Path(str_path_subject)
+    str_filepath_tmp = str_filepath_tmp.with_name(str_filepath_tmp.stem + merge_file_substring + str_filepath_tmp.suffix)
+    #print(str_filepath_tmp)
+    #sys.exit()
+    # ==================================================================================================
+    return data_export.read_frame(data_export.resolve_columnar(str(str_filepath_tmp)), columns)
+
 def merge_ib_results( df_main, merge_file_substring, 
                         index_cols,merge_cols, rename_map=None, how='left'
                         ):
     """
     Generic function to merge IB exam results with a subject or EE file.
-    df_main: DataFrame to merge into (can be a DataFrame or a CSV path).
-    merge_file_substring: CSV path to merge from.
+    df_main: DataFrame to merge into (can be a DataFrame or a CSV/Parquet/Arrow path).
+    merge_file_substring: subject type of the file to merge from (see read_merge_source).
     index_cols: list of columns to join on.
     merge_cols: list of columns to merge from merge_file_substring.
     rename_map: dict for renaming columns from merge_file_substring before merging.
     Returns: merged DataFrame.
     """
     if isinstance(df_main, str):
-        df_main = pd.read_csv(df_main)
+        df_main = data_export.read_frame(data_export.resolve_columnar(df_main))
+
+    df_merge = read_merge_source(merge_file_substring, index_cols + merge_cols)
+    step = {'index_cols': index_cols, 'merge_cols': merge_cols, 'rename_map': rename_map}
+    if how == 'left':
+        return merge_all_results(df_main, [(df_merge, step)])
 
-    # ==================================================================================================
-    # Insert subject type before extension
-    str_filepath_tmp = Path(str_path_subject)
-    str_filepath_tmp = str_filepath_tmp.with_name(str_filepath_tmp.stem + merge_file_substring + str_filepath_tmp.suffix)
-    #print(str_filepath_tmp)
-    #sys.exit()
-    # ==================================================================================================
-    df_merge = pd.read_csv(str_filepath_tmp)
     cols_to_use = index_cols + merge_cols
     df_merge = df_merge[cols_to_use]
     if rename_map:
@@ -97,21 +175,17 @@ def merge_ib_results( df_main, merge_file_substring,
 
 def main():
     print('start')
-    # --- Run the merges in a loop ---
-    df_main = pd.read_csv(str_path_student)
-    for step in merge_steps:
-        df_main = merge_ib_results(
-            df_main=df_main,
-            merge_file_substring=step['merge_file_substring'],
-            index_cols=step['index_cols'],
-            merge_cols=step['merge_cols'],
-            rename_map=step['rename_map']
-        )
+    # --- Run all merges in one pass ---
+    df_main = data_export.read_frame(data_export.resolve_columnar(str_path_student))
+    lst_sources = [(read_merge_source(step['merge_file_substring'], step['index_cols'] + step['merge_cols']), step)
+                   for step in merge_steps]
+    df_main = merge_all_results(df_main, lst_sources)
 
     # --- Save or inspect the final merged DataFrame ---
     #df_main = df_main.reset_index()
     
     df_main.to_csv('raw_' + str_path_output_csv, index=False)
+    data_export.write_parquet(df_main, 'raw_' + str_path_output_parquet)
     print(df_main.head())
     # ===================================================
     df_sub      = data_handler_sum.reformat_results_sub(df_main)
@@ -119,7 +193,9 @@ def main():
     merged_df = pd.merge(df_sub, df_overall, on=lst_common_keys_formatted, how='outer')
 
     merged_df.to_csv(str_path_output_csv)
-    merged_df.to_excel(str_path_output_excel)
+    data_export.write_excel(merged_df, str_path_output_excel)
+    data_export.write_parquet(merged_df, str_path_output_parquet)
+    data_export.write_arrow(merged_df, str_path_output_arrow)
     print(merged_df.head())
 
 if __name__ == '__main__':
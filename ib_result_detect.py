@@ -0,0 +1,192 @@
+import re
+
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdftypes import resolve1
+
+import ib_result_pdf as data_pdf
+
+
+#============================================================================
+# Confidence reported by detect_file_type
+FLOAT_CONF_EXACT        = 1.0   # header found verbatim in the first page's text operators
+FLOAT_CONF_SPACING      = 0.8   # found only after ignoring whitespace/case (text split into runs)
+FLOAT_CONF_PARTIAL      = 0.75  # sub-type marker found without its parent report title
+FLOAT_CONF_CONFLICT     = 0.5   # multiplier when headers of different reports are present
+
+# Headers that only appear inside another report, e.g. EE pages are titled
+# "Subject Results (EXTENDED ESSAY)"
+dict_header_parent = {
+    '(EXTENDED ESSAY)'      : 'Subject Results',
+    '(THEORY OF KNOWLEDGE)' : 'Subject Results'
+}
+
+# Literal "( ... )" or hex "< ... >" strings, array brackets and comments in a content stream
+re_stream_token = re.compile(rb'\(|<(?!<)|\[|\]|%[^\r\n]*')
+re_whitespace   = re.compile(r'\s+')
+dict_literal_escape = {
+    ord('n'): b'\n', ord('r'): b'\r', ord('t'): b'\t', ord('b'): b'\b', ord('f'): b'\f',
+    ord('('): b'(', ord(')'): b')', ord('\\'): b'\\'
+}
+#============================================================================
+
+
+
+
+def _read_literal(bytes_stream, int_pos):
+    """Read a literal string starting after its '('; returns (bytes, position after ')')."""
+    buffer = bytearray()
+    int_depth = 1
+    int_len = len(bytes_stream)
+    while int_pos < int_len:
+        c = bytes_stream[int_pos]
+        if c == 0x5C:   # backslash
+            int_pos += 1
+            if int_pos >= int_len:
+                break
+            c = bytes_stream[int_pos]
+            if c in dict_literal_escape:
+                buffer += dict_literal_escape[c]
+            elif 0x30 <= c <= 0x37:     # up to three octal digits
+                int_end = int_pos
+                while int_end < min(int_pos + 3, int_len) and 0x30 <= bytes_stream[int_end] <= 0x37:
+                    int_end += 1
+                buffer.append(int(bytes_stream[int_pos:int_end], 8) & 0xFF)
+                int_pos = int_end
+                continue
+            elif c == 0x0D and int_pos + 1 < int_len and bytes_stream[int_pos + 1] == 0x0A:
+                int_pos += 1    # escaped CRLF line continuation
+            elif c not in (0x0A, 0x0D):
+                buffer.append(c)
+        elif c == 0x28:     # (
+            int_depth += 1
+            buffer.append(c)
+        elif c == 0x29:     # )
+            int_depth -= 1
+            if int_depth == 0:
+                return bytes(buffer), int_pos + 1
+            buffer.append(c)
+        else:
+            buffer.append(c)
+        int_pos += 1
+    return bytes(buffer), int_pos
+
+def _decode_string(bytes_text):
+    # Two-byte strings with a zero high byte are UTF-16BE style; everything else is treated as single-byte
+    if len(bytes_text) >= 2 and len(bytes_text) % 2 == 0 and not any(bytes_text[0::2]):
+        return bytes_text.decode('utf-16-be', errors='ignore')
+    return bytes_text.decode('cp1252', errors='replace')
+
+def stream_strings(bytes_stream):
+    """
+    Text runs of a page content stream, without layout analysis.
+    Strings inside one TJ array are joined (they are a single run with kerning);
+    separate runs are returned separately, in stream order.
+    """
+    lst_runs = []
+    lst_array = None
+    int_pos = 0
+    while True:
+        match = re_stream_token.search(bytes_stream, int_pos)
+        if not match:
+            break
+        token = match.group()
+        int_pos = match.end()
+        if token == b'(':
+            bytes_text, int_pos = _read_literal(bytes_stream, int_pos)
+        elif token == b'<':
+            int_end = bytes_stream.find(b'>', int_pos)
+            if int_end < 0:
+                break
+            str_hex = re_whitespace.sub('', bytes_stream[int_pos:int_end].decode('ascii', errors='ignore'))
+            int_pos = int_end + 1
+            try:
+                bytes_text = bytes.fromhex(str_hex + '0' * (len(str_hex) % 2))
+            except ValueError:
+                continue
+        elif token == b'[':
+            lst_array = []
+            continue
+        elif token == b']':
+            if lst_array:
+                lst_runs.append(''.join(lst_array))
+            lst_array = None
+            continue
+        else:
+            continue    # comment
+
+        str_text = _decode_string(bytes_text)
+        if lst_array is not None:
+            lst_array.append(str_text)
+        else:
+            lst_runs.append(str_text)
+    return lst_runs
+
+def iter_first_page_streams(document):
+    """Yield the decoded content stream(s) of the first page of a pdfminer PDFDocument only."""
+    page = next(PDFPage.create_pages(document), None)
+    if page is None:
+        return
+    for stream in page.contents:
+        stream = resolve1(stream)
+        if stream is not None and hasattr(stream, 'get_data'):
+            yield stream.get_data()
+
+def _normalise(str_text):
+    return re_whitespace.sub('', str_text).lower()
+
+def _score(lst_found, dict_header_map, float_base):
+    """Pick the highest priority header (dict order) and weigh the other matches against it."""
+    for header in dict_header_map:
+        if header in lst_found:
+            float_confidence = float_base
+            str_parent = dict_header_parent.get(header)
+            if str_parent and str_parent not in lst_found:
+                float_confidence = min(float_confidence, FLOAT_CONF_PARTIAL)
+            if any(h not in (header, str_parent) for h in lst_found):
+                float_confidence *= FLOAT_CONF_CONFLICT
+            return header, float_confidence
+    return None, 0.0
+
+def detect_file_type(pdf_source, dict_header_map, bool_layout_fallback=True):
+    """
+    Classify an IB result PDF (ib_result_pdf.PdfSource, bytes or binary file object) from its first page.
+    dict_header_map: headers to look for, in priority order (e.g. IBResultProcessor.file_type_header_map).
+    A PdfSource keeps its pdfplumber handle open afterwards so extraction can reuse it.
+    Only the first page's content streams are read; their text runs are searched for
+    the headers, and only if none is found (e.g. fonts without a plain encoding)
+    does it fall back to pdfplumber's extract_text() on that page.
+    Returns (header, confidence) with confidence in [0, 1]; (None, 0.0) if nothing matched.
+    """
+    source, bool_owned = data_pdf.as_pdf_source(pdf_source)
+    try:
+        return _detect(source, dict_header_map, bool_layout_fallback)
+    finally:
+        if bool_owned:
+            source.close()
+
+def _detect(source, dict_header_map, bool_layout_fallback):
+    # pdfplumber only parses the cross-reference table on open; pages are built lazily
+    pdf = source.open()
+    # All of the page's streams: a header's parent or a conflicting header may be in a later one
+    lst_runs = []
+    for bytes_stream in iter_first_page_streams(pdf.doc):
+        lst_runs += stream_strings(bytes_stream)
+    str_text = ' '.join(lst_runs)
+    lst_found = [h for h in dict_header_map if h in str_text]
+    if lst_found:
+        return _score(lst_found, dict_header_map, FLOAT_CONF_EXACT)
+
+    str_text = _normalise(''.join(lst_runs))
+    lst_found = [h for h in dict_header_map if _normalise(h) in str_text]
+    if lst_found:
+        return _score(lst_found, dict_header_map, FLOAT_CONF_SPACING)
+
+    if not bool_layout_fallback:
+        return None, 0.0
+
+    # Layout fallback on the same handle
+    if not pdf.pages:
+        return None, 0.0
+    str_text = pdf.pages[0].extract_text() or ''
+    lst_found = [h for h in dict_header_map if h in str_text]
+    return _score(lst_found, dict_header_map, FLOAT_CONF_EXACT)
@@ -0,0 +1,282 @@
+import io
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import pyarrow as pa
+import pyarrow.feather as feather
+
+import ib_result_schema as data_schema
+import ib_result_lazy as data_lazy
+
+# Only Excel output needs openpyxl; it loads with the first workbook written
+openpyxl = data_lazy.lazy_import('openpyxl')
+openpyxl_range = data_lazy.lazy_import('openpyxl.worksheet.cell_range')
+
+
+#============================================================================
+# Rows converted to cell values at a time; bounds the export's working memory
+INT_EXCEL_CHUNK_ROWS    = 2000
+# Memory for finished exports shared by all sessions (least recently used dropped first)
+INT_EXPORT_CACHE_BYTES  = int(os.environ.get('IB_EXPORT_CACHE_MB', '256')) * 1024 * 1024
+STR_SHEET_NAME          = 'Sheet1'
+
+# Columnar files read by read_frame, preferred in this order over a CSV of the same name
+lst_columnar_suffixes   = ['.parquet', '.arrow']
+lst_arrow_suffixes      = ['.arrow', '.feather', '.ipc']
+# CSV columns kept as text so identifiers such as session numbers keep their leading zeros
+dict_csv_dtypes         = {col: data_schema.dtype_string for col, str_kind in data_schema.dict_column_kind.items() if str_kind == 'string'}
+#============================================================================
+
+
+
+
+def content_hash(df):
+    """SHA-256 over the values, index, column labels and dtypes of a DataFrame."""
+    hasher = hashlib.sha256()
+    hasher.update(repr(list(df.columns)).encode('utf-8'))
+    hasher.update(repr([str(dtype) for dtype in df.dtypes]).encode('utf-8'))
+    hasher.update(repr(list(df.index.names)).encode('utf-8'))
+    hasher.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return hasher.hexdigest()
+
+def _label_codes(index):
+    """One code array per level (outer first) for a flat or MultiIndex."""
+    if isinstance(index, pd.MultiIndex):
+        return [np.asarray(codes) for codes in index.codes]
+    return [pd.factorize(index)[0]]
+
+def _span_starts(lst_codes, int_length):
+    """
+    For each level, mark where a new merged span starts: its label or any outer
+    label changes (pandas' sparsified MultiIndex layout).
+    """
+    starts = np.zeros(int_length, dtype=bool)
+    starts[:1] = True
+    lst_starts = []
+    for codes in lst_codes:
+        starts = starts.copy()
+        starts[1:] |= codes[1:] != codes[:-1]
+        lst_starts.append(starts)
+    return lst_starts
+
+def _span_lengths(starts):
+    positions = np.flatnonzero(starts)
+    return dict(zip(positions.tolist(), np.diff(np.append(positions, len(starts))).tolist()))
+
+def _values(array_like):
+    """Cell values: Python objects with every missing marker as None (an empty cell)."""
+    return array_like.to_numpy(dtype=object, na_value=None)
+
+def write_excel(df, target, str_sheet_name=STR_SHEET_NAME, int_chunk_rows=INT_EXCEL_CHUNK_ROWS):
+    """
+    Write df to an xlsx file (path or binary file object) with the same layout as
+    df.to_excel(): column header rows (outer levels merged across their span), a row with
+    the index names under a multi-level header, then index values (repeated outer labels
+    merged) and the data.
+    The workbook is write-only: rows are streamed out as they are produced and only
+    int_chunk_rows rows are converted to cell values at a time.
+    """
+    workbook = openpyxl.Workbook(write_only=True)
+    worksheet = workbook.create_sheet(str_sheet_name)
+
+    int_index_levels = df.index.nlevels
+    int_header_rows = df.columns.nlevels
+    int_rows = len(df)
+
+    # Header: one row per column level, labels written at the start of each span
+    lst_column_codes = _label_codes(df.columns)
+    lst_column_starts = _span_starts(lst_column_codes, len(df.columns))
+    lst_column_levels = ([df.columns.get_level_values(i) for i in range(int_header_rows)]
+                         if isinstance(df.columns, pd.MultiIndex) else [df.columns])
+    bool_index_names = any(name is not None for name in df.index.names)
+    for int_level, (starts, labels) in enumerate(zip(lst_column_starts, lst_column_levels)):
+        lst_row = [None] * (int_index_levels + len(df.columns))
+        if int_header_rows > 1 and df.columns.names[int_level] is not None:
+            lst_row[int_index_levels - 1] = df.columns.names[int_level]
+        elif int_header_rows == 1 and bool_index_names:
+            lst_row[:int_index_levels] = list(df.index.names)
+        lst_labels = _values(labels)
+        for int_col, int_span in _span_lengths(starts).items():
+            lst_row[int_index_levels + int_col] = lst_labels[int_col]
+            if int_span > 1 and int_level < int_header_rows - 1:
+                worksheet.merged_cells.add(openpyxl_range.CellRange(
+                    min_col=int_index_levels + int_col + 1, max_col=int_index_levels + int_col + int_span,
+                    min_row=int_level + 1, max_row=int_level + 1
+                ))
+        worksheet.append(lst_row)
+
+    int_first_data_row = int_header_rows + 1
+    if int_header_rows > 1:
+        # Multi-level header: index names get a row of their own
+        worksheet.append(list(df.index.names) if bool_index_names else [])
+        int_first_data_row += 1
+
+    # Index labels are only written where a span starts, as merge_cells=True does
+    lst_index_starts = _span_starts(_label_codes(df.index), int_rows)
+    if int_index_levels > 1:
+        for int_level, starts in enumerate(lst_index_starts):
+            for int_row, int_span in _span_lengths(starts).items():
+                if int_span > 1:
+                    worksheet.merged_cells.add(openpyxl_range.CellRange(
+                        min_col=int_level + 1, max_col=int_level + 1,
+                        min_row=int_first_data_row + int_row, max_row=int_first_data_row + int_row + int_span - 1
+                    ))
+
+    for int_start in range(0, int_rows, int_chunk_rows):
+        int_stop = min(int_start + int_chunk_rows, int_rows)
+        lst_columns = []
+        for int_level in range(int_index_levels):
+            values = _values(df.index.get_level_values(int_level)[int_start:int_stop])
+            if int_index_levels > 1:
+                values[~lst_index_starts[int_level][int_start:int_stop]] = None
+            lst_columns.append(values)
+        for int_col in range(df.shape[1]):
+            lst_columns.append(_values(df.iloc[int_start:int_stop, int_col]))
+        for row in zip(*lst_columns):
+            worksheet.append(row)
+
+    workbook.save(target)
+
+def csv_bytes(df):
+    """UTF-8 CSV; the index is written unless it is the default row numbering."""
+    bool_index = not isinstance(df.index, pd.RangeIndex)
+    return df.to_csv(index=bool_index).encode('utf-8')
+
+def xlsx_bytes(df):
+    buffer = io.BytesIO()
+    write_excel(df, buffer)
+    return buffer.getvalue()
+
+def parquet_bytes(df):
+    buffer = io.BytesIO()
+    write_parquet(df, buffer)
+    return buffer.getvalue()
+
+def arrow_bytes(df):
+    buffer = io.BytesIO()
+    write_arrow(df, buffer)
+    return buffer.getvalue()
+
+def write_parquet(df, target):
+    """
+    Parquet file (path or binary file object). Column dtypes, the index and MultiIndex
+    columns (e.g. reformat_results_sub output) are restored by read_frame.
+    """
+    df.to_parquet(target)
+
+def write_arrow(df, target):
+    """
+    Arrow IPC file (Feather v2; path or binary file object), with the same pandas
+    metadata as Parquet. Unlike DataFrame.to_feather, any index is kept.
+    """
+    table = pa.Table.from_pandas(df)
+    with pa.ipc.new_file(target, table.schema) as writer:
+        writer.write_table(table)
+
+def read_frame(str_path, columns=None):
+    """
+    Read a frame written as Parquet, Arrow IPC or CSV (chosen by file suffix).
+    columns: read only these columns; Parquet and Arrow files skip the rest on disk.
+    CSV columns are typed with the handlers' schema, so a frame has the same dtypes (and
+    join keys match) whichever format it was read from.
+    """
+    str_suffix = os.path.splitext(str_path)[1].lower()
+    if str_suffix == '.parquet':
+        return pd.read_parquet(str_path, columns=columns)
+    if str_suffix in lst_arrow_suffixes:
+        return feather.read_table(str_path, columns=columns, memory_map=True).to_pandas()
+    return data_schema.apply_schema(pd.read_csv(str_path, usecols=columns, dtype=dict_csv_dtypes))
+
+def read_rows(str_path, positions):
+    """
+    Rows at positions of an Arrow IPC file, read through a memory map so only those rows
+    are converted. A default (range) index comes back as the rows' positions.
+    """
+    table = feather.read_table(str_path, memory_map=True)
+    df = table.take(pa.array(positions, type=pa.int64())).to_pandas()
+    if isinstance(df.index, pd.RangeIndex):
+        df.index = pd.Index(positions)
+    return df
+
+def resolve_columnar(str_path):
+    """The Parquet or Arrow sibling of str_path (same name, other suffix) if one exists, else str_path."""
+    str_stem = os.path.splitext(str_path)[0]
+    for str_suffix in lst_columnar_suffixes:
+        if os.path.exists(str_stem + str_suffix):
+            return str_stem + str_suffix
+    return str_path
+
+# Export format -> function building its bytes from a DataFrame
+dict_writers = {
+    'csv'       : csv_bytes,
+    'xlsx'      : xlsx_bytes,
+    'parquet'   : parquet_bytes,
+    'arrow'     : arrow_bytes
+}
+
+
+def fingerprint(*parts):
+    """
+    Short stable key from strings describing where a result came from (e.g. the
+    SHA-256 of each input PDF), so exports can be cached without hashing the frame.
+    """
+    return hashlib.sha256('\x1f'.join(map(str, parts)).encode('utf-8')).hexdigest()[:32]
+
+
+class ExportCache:
+    """
+    In-memory cache of finished exports keyed by (fingerprint, format), bounded by the
+    total size of the cached bytes. Shared by all sessions of the server process;
+    downloads may build exports from several threads at once.
+    """
+
+    def __init__(self, int_max_bytes=INT_EXPORT_CACHE_BYTES):
+        self.int_max_bytes = int_max_bytes
+        self.int_bytes = 0
+        self.dict_entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, df, str_format, str_fingerprint=None):
+        """
+        The export of df in str_format (a dict_writers key), built on the first request.
+        str_fingerprint must change whenever df does; without one the content hash is used.
+        df may also be a function returning the frame, called only when the export is built
+        (e.g. to reload a frame spilled to disk).
+        """
+        if str_fingerprint is None:
+            if callable(df):
+                df = df()
+            str_fingerprint = content_hash(df)
+        key = (str_fingerprint, str_format)
+        with self.lock:
+            if key in self.dict_entries:
+                self.dict_entries.move_to_end(key)
+                return self.dict_entries[key]
+
+        bytes_export = dict_writers[str_format](df() if callable(df) else df)
+
+        with self.lock:
+            if key not in self.dict_entries and len(bytes_export) <= self.int_max_bytes:
+                self.dict_entries[key] = bytes_export
+                self.int_bytes += len(bytes_export)
+                while self.int_bytes > self.int_max_bytes:
+                    _, bytes_old = self.dict_entries.popitem(last=False)
+                    self.int_bytes -= len(bytes_old)
+        return bytes_export
+
+    def clear(self):
+        with self.lock:
+            self.dict_entries.clear()
+            self.int_bytes = 0
+
+export_cache = ExportCache()
+
+
+def excel_bytes(df, str_fingerprint=None):
+    """The xlsx export of df, from the shared export cache."""
+    return export_cache.get(df, 'xlsx', str_fingerprint)
@@ -6,6 +6,10 @@ import pandas as pd
 
 import pdfplumber
 
+import ib_result_pdf as data_pdf
+import ib_result_schema as data_schema
+import ib_result_export as data_export
+
 # Path to the PDF file
 PDF_PATH = 'display_report_.pdf'
 #PDF_PATH = 'display_report_ee.pdf'
@@ -13,6 +17,8 @@ PDF_PATH = 'display_report_.pdf'
 
 # Output CSV path
 CSV_PATH = 'exam_results_subject_.csv'
+# Bump whenever parse_page/extract_results output changes; invalidates cached extractions
+PARSER_VERSION = 2
 #============================================================================
 lst_pdf_path = [
     'display_report_.pdf',  
@@ -55,101 +61,122 @@ dict_skip_line_to_data = {
     str_ee_subject_stype        : 1,
     str_tk_subject_stype        : 1,
 }
-#============================================================================
-
 
+# Tokenizer tables, built once.
+# Per subject type: number of header words before the subject name on the 'Predicted' line,
+# and the field keys that the data columns map to
+dict_subject_layout = {
+    str_subject_type: (len(' '.join(list(fields.values())[:-1]).split()), list(fields))
+    for str_subject_type, fields in dict_fields_to_extract.items()
+}
+# One match per line classifies it: subject type title, data header, or end of data
+re_line_kind = re.compile(rf'({re.escape(str_keyword_subject_type)})\s*(.*)|(Predicted)|(Page)')
+#============================================================================
 
 
 
-def pasrse_field_single(str_search_keyword, text):
-    pattern = rf"{re.escape(str_search_keyword)}\s*(.+)"
-    match = re.search(pattern, text)
 
-    m_res = (match.group(1).strip()) if match else next(iter(dict_fields_to_extract))
-    return m_res
 
 def parse_page(text):
     """
     Parse the text of one PDF page and extract student exam results.
-    Returns a dict of fields.
+    Returns a dict of columns (one list per field) and the subject type of the page.
     """
     lines = [l.strip() for l in text.splitlines() if l.strip()]
 
     str_subject_type = ""
-    data = {}
-    dict_record_lv_top = {}
-    lst_record_lv_subject = []
+    record_lv_subject = data_pdf.ColumnBuffer()
+
+
+    # One pass classifies every line
+    lst_kinds = []
+    for l in lines:
+        match = re_line_kind.match(l)
+        lst_kinds.append(match)
 
+    # Index of the next 'Page' line at or after each line (end of a data block)
+    lst_next_end = [len(lines)] * (len(lines) + 1)
+    for i in range(len(lines) - 1, -1, -1):
+        match = lst_kinds[i]
+        lst_next_end[i] = i if match and match.group(4) else lst_next_end[i + 1]
 
-    #print(len(dict_fields_to_extract.get("normal", {})))
-    # find its line index
     for i, l in enumerate(lines):
+        match = lst_kinds[i]
+        if not match:
+            continue
 
-        if l.strip().startswith(str_keyword_subject_type):
-            str_subject_type = pasrse_field_single(str_keyword_subject_type, l)
-            #print('subject: ' + str_subject_type)
-            #print(len(dict_fields_to_extract.get( (str_subject_type) , {})))
+        if match.group(1):
+            # Title line, e.g. 'Subject Results (EXTENDED ESSAY)'; '' for normal subjects
+            str_subject_type = match.group(2).strip() or next(iter(dict_fields_to_extract))
             continue
 
-        if l.startswith('Predicted'):
-            # Step 1: Get the sub-dictionary with key ''
-            default_fields = dict_fields_to_extract.get(str_subject_type, {})
-            # Step 2: Get values except the last one
-            values_except_last = list(default_fields.values())[:-1]
-            # Step 3: Join them into a string
-            result_string = ' '.join(values_except_last)
-            int_subject_pos = len(result_string.split())
+        if match.group(3):
+            # Words before the subject name on the header line, e.g. 'Predicted Grade Scaled total'
+            int_subject_pos, lst_keys = dict_subject_layout.get(str_subject_type, (0, []))
             str_subject_name = " ".join(l.split(' ')[int_subject_pos:])
 
             #skip line(s) for non EE and TK subject
-            raw_lines = lines[i + dict_skip_line_to_data.get(str_subject_type):]
+            int_start = i + dict_skip_line_to_data.get(str_subject_type)
+            raw_lines = lines[int_start:lst_next_end[min(int_start, len(lines))]]
+            dict_block = {key: [] for key in lst_keys + ['subject']}
             for line in raw_lines:
-                if line.startswith("Page") or not line.strip():
-                    break
-
                 parts = line.split(' ', int_subject_pos-1)
-                '''
-                predicted_grade = parts[0]
-                grade = parts[1]
-                scaled_total = parts[2]
-                candidate = parts[3]
-                print("Predicted Grade:", predicted_grade)
-                print("Grade:", grade)
-                print("Scaled Total:", scaled_total)
-                print("Candidate:", candidate)
-                '''
-
-                # Create new dict by zipping field keys to parts
-                dict_tmp_reocrd             = {key: parts[i] for i, key in enumerate(dict_fields_to_extract.get(str_subject_type, {}))}
-                dict_tmp_reocrd['subject']  = str_subject_name
-                lst_record_lv_subject       = lst_record_lv_subject + [dict_tmp_reocrd]
+
+                # Append each part to its field column
+                for j, key in enumerate(lst_keys):
+                    dict_block[key].append(parts[j])
+                dict_block['subject'].append(str_subject_name)
+            record_lv_subject.extend(dict_block)
                 
-    return lst_record_lv_subject, str_subject_type
+    return record_lv_subject.dict_columns, str_subject_type
+
+def iter_results(pdf_path, int_workers=None, executor=None, str_backend=None):
+    """
+    Extract results page by page, as a generator.
+    pdf_path: an ib_result_pdf.PdfSource, bytes, a binary file object (e.g. io.BytesIO) or a path.
+    int_workers: extraction processes (None = ib_result_pdf.INT_EXTRACT_WORKERS, 0 = all CPUs).
+    executor: shared process pool to extract on (see ib_result_pdf.iter_parsed_pages).
+    str_backend: page text backend (see ib_result_pdf.dict_backends; None = IB_EXTRACT_BACKEND env / pdfplumber).
+    Yields (int_pages_done, int_page_count, dict_columns, str_subject_type) with the records of one page.
+    """
+    for int_done, int_count, (rec, str_subject_type) in data_pdf.iter_parsed_pages(
+            pdf_path, parse_page, int_workers, executor, str_backend):
+        yield int_done, int_count, rec, str_subject_type
 
-def extract_results(pdf_path):
+def extract_results(pdf_path, int_workers=None, func_progress=None, executor=None, str_backend=None):
     """
     Extract results for all pages in the given PDF.
-    Returns a DataFrame.
+    pdf_path, int_workers, executor and str_backend as for iter_results.
+    func_progress: optional callback(int_pages_done, int_page_count, dict_columns) per page.
+    Returns a DataFrame and the subject type of the report.
     """
-    records = []
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            text = page.extract_text()
-            if not text:
-                continue
-            rec, str_subject_type = parse_page(text)
-            #records.append(rec)
-            records = records + rec
-
-    # Normalize into DataFrame
-    df = pd.json_normalize(records)
+    records = data_pdf.ColumnBuffer()
+    for int_done, int_count, rec, str_subject_type in iter_results(pdf_path, int_workers, executor, str_backend):
+        records.extend(rec)
+        if func_progress:
+            func_progress(int_done, int_count, rec)
+
+    # Build the DataFrame straight from the column lists, typed once here
+    df = data_schema.apply_schema(records.to_frame())
     return df, str_subject_type
 
 def reformat_results(df):
-    df[['session', 'candidate']]            = df['candidate'].str.split(' - ', n=1, expand=True)
-    df[['subject_', 'sub']]                 = df['subject'].str.extract(r'^(.*?)(\b(?:SL|HL|EE|TK)\b.*)$')
-    df[['session_number', 'personal_code']] = df['session'].str.extract(r'^(.+?)\s*(\([^)]+\))$')
-    return df
+    # String work runs once per distinct candidate / subject line, mapped back by code
+    codes_candidate, candidates = data_schema.distinct(df['candidate'])
+    codes_subject, subjects = data_schema.distinct(df['subject'])
+    df_candidate = pd.DataFrame(index=candidates.index)
+    df_candidate[['session', 'candidate']]              = candidates.str.split(' - ', n=1, expand=True)
+    df_candidate[['session_number', 'personal_code']]   = df_candidate['session'].str.extract(r'^(.+?)\s*(\([^)]+\))$')
+    df_subject = subjects.str.extract(r'^(.*?)(\b(?:SL|HL|EE|TK)\b.*)$')
+
+    df['session']           = data_schema.take(df_candidate['session'], codes_candidate, 'string')
+    df['candidate']         = data_schema.take(df_candidate['candidate'], codes_candidate, 'string')
+    df['subject_']          = data_schema.take(df_subject[0], codes_subject, 'category')
+    df['sub']               = data_schema.take(df_subject[1], codes_subject, 'category')
+    df['session_number']    = data_schema.take(df_candidate['session_number'], codes_candidate, 'string')
+    df['personal_code']     = data_schema.take(df_candidate['personal_code'], codes_candidate, 'string')
+    # Type the derived columns
+    return data_schema.apply_schema(df)
 
 def main():
     #df = extract_results(PDF_PATH)
@@ -162,6 +189,7 @@ def main():
         #print(new_CSV_PATH)
 
         df.to_csv(new_CSV_PATH, index=False)
+        data_export.write_parquet(df, new_CSV_PATH[:-len('.csv')] + '.parquet')
         print(f"Extracted {len(df)} records and saved to {CSV_PATH}")
 
 if __name__ == '__main__':
@@ -1,16 +1,20 @@
 import re
-import sys
 
 import numpy as np
 import pandas as pd
 
-import pdfplumber
+import ib_result_pdf as data_pdf
+import ib_result_schema as data_schema
+import ib_result_export as data_export
 
 # Path to the PDF file
 PDF_PATH    = 'display_report.pdf'
 # Output CSV path
 CSV_PATH    = 'exam_results.csv'
 XLSX_PATH   = 'exam_results.xlsx'
+PARQUET_PATH = 'exam_results.parquet'
+# Bump whenever parse_page/extract_results output changes; invalidates cached extractions
+PARSER_VERSION = 2
 
 
 #============================================================================
@@ -32,6 +36,17 @@ str_header_summary_student_grade_subjects   =  'Grade'
 str_header_summary_student_grade_ee_tok     = 'EE/TOK points:'
 
 lst_exclude_keyword_ee_tok = ['ee', 'tk']
+# Per-subject fields of the formatted output, in column order
+lst_subject_fields = ['sub', 'uni_pg', 'PG', 'FG', 'scaled_total']
+
+# Tokenizer tables, built once: one alternation over every field label. The value is
+# captured in a lookahead so the scan resumes right after each label, which gives the same
+# first occurrence per label as searching for each one separately (no label overlaps another).
+dict_label_to_field     = {label: key for key, label in dict_fields_to_extract.items()}
+re_field_labels         = re.compile(
+                            '(' + '|'.join(re.escape(label) for label in dict_fields_to_extract.values()) + r')(?=\s*(.+))'
+                          )
+re_grade_subject_line   = re.compile(r'^(\S+)\s+(.+)')
 #initial str for "grade" and "subject"
 common_keys = ['session_number', 'personal_code', 'name', 'birth_date']
 #============================================================================
@@ -39,31 +54,36 @@ common_keys = ['session_number', 'personal_code', 'name', 'birth_date']
 
 
 
-def pasrse_field_single(str_search_keyword, text):
-    pattern = rf"{re.escape(str_search_keyword)}\s*(.+)"
-    match = re.search(pattern, text)
-
-    m_res = (match.group(1).strip()) if match else None
-    return m_res
+def parse_fields(text):
+    """
+    Single pass over the page text for all top-level fields.
+    Returns {field: value or None}: the rest of the line after the first occurrence of
+    each field's label, stripped.
+    """
+    dict_record = dict.fromkeys(dict_fields_to_extract)
+    int_missing = len(dict_record)
+    for match in re_field_labels.finditer(text):
+        key = dict_label_to_field[match.group(1)]
+        if dict_record[key] is None:
+            dict_record[key] = match.group(2).strip()
+            int_missing -= 1
+            if not int_missing:
+                break
+    return dict_record
 
 def parse_page(text):
     """
     Parse the text of one PDF page and extract student exam results.
-    Returns a dict of fields.
+    Returns a dict of columns: one list per field, one entry per subject row.
     """
     lines = [l.strip() for l in text.splitlines() if l.strip()]
-    data = {}
-    dict_record_lv_top = {}
-    lst_record_lv_subject = []
+    dict_record_lv_subject = {key: [] for key in dict_fields_to_extract}
 
     #Extract Single field data form the page
-    for key, value in dict_fields_to_extract.items():
-        dict_record_lv_top[key] = pasrse_field_single(value, text)
+    dict_record_lv_top = parse_fields(text)
 
-    pattern = ''.join(str_header_summary_student_grade_subjects) + r'\s*(.+)'
-    #m_grade = re.search(pattern, text)
-    m_grade = re.search(r'Grade\s*(.+)', text)
-    if m_grade:
+    # 'Grade' followed by text somewhere on the page, i.e. the grade field was found
+    if dict_record_lv_top['grade'] is not None:
         # find its line index
         for i, l in enumerate(lines):
             if l.startswith(str_header_summary_student_grade_subjects):
@@ -72,136 +92,184 @@ def parse_page(text):
                 for line in raw_lines:
                     if line.startswith(str_header_summary_student_grade_ee_tok) or not line.strip():
                         break
-                    match = re.match(r'^(\S+)\s+(.+)', line.strip())
+                    match = re_grade_subject_line.match(line)
                     if match:
-                        dict_tmp_reocrd = dict_record_lv_top.copy()
-                        dict_tmp_reocrd['grade'] = match.group(1)
-                        dict_tmp_reocrd['subject'] = match.group(2)    
-                        lst_record_lv_subject = lst_record_lv_subject + [dict_tmp_reocrd]
+                        for key, value in dict_record_lv_top.items():
+                            dict_record_lv_subject[key].append(value)
+                        dict_record_lv_subject['grade'][-1] = match.group(1)
+                        dict_record_lv_subject['subject'][-1] = match.group(2)
                 break
-    
-    # for item in lst_record_lv_subject:
-    #     for key, value in item.items():
-    #         print(f"{key}: {value}")
-    #     print("=======")
-    #     #print(f"Grade: {item['Grade']}, Subject: {item['Subject']}")
-    # sys.exit(0)
-    return lst_record_lv_subject
+    return dict_record_lv_subject
 
 
-def extract_results(pdf_path):
+def iter_results(pdf_path, int_workers=None, executor=None, str_backend=None):
+    """
+    Extract results page by page, as a generator.
+    pdf_path: an ib_result_pdf.PdfSource, bytes, a binary file object (e.g. io.BytesIO) or a path.
+    int_workers: extraction processes (None = ib_result_pdf.INT_EXTRACT_WORKERS, 0 = all CPUs).
+    executor: shared process pool to extract on (see ib_result_pdf.iter_parsed_pages).
+    str_backend: page text backend (see ib_result_pdf.dict_backends; None = IB_EXTRACT_BACKEND env / pdfplumber).
+    Yields (int_pages_done, int_page_count, dict_columns) with the records of one page.
+    """
+    for int_done, int_count, rec in data_pdf.iter_parsed_pages(pdf_path, parse_page, int_workers,
+                                                                executor, str_backend):
+        yield int_done, int_count, rec
+
+def extract_results(pdf_path, int_workers=None, func_progress=None, executor=None, str_backend=None):
     """
     Extract results for all pages in the given PDF.
+    pdf_path, int_workers, executor and str_backend as for iter_results.
+    func_progress: optional callback(int_pages_done, int_page_count, dict_columns) per page.
     Returns a DataFrame.
     """
-    records = []
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            text = page.extract_text()
-            if not text:
-                continue
-            rec = parse_page(text)
-            #records.append(rec)
-            records = records + rec
-
-    # Normalize into DataFrame
-    df = pd.json_normalize(records)
+    records = data_pdf.ColumnBuffer()
+    for int_done, int_count, rec in iter_results(pdf_path, int_workers, executor, str_backend):
+        records.extend(rec)
+        if func_progress:
+            func_progress(int_done, int_count, rec)
+
+    # Build the DataFrame straight from the column lists, typed once here
+    df = data_schema.apply_schema(records.to_frame())
+
+    return df
+
+def _subject_fields(subjects):
+    """
+    Columns derived from the distinct 'subject' lines, with the same string operations
+    reformat_results used to run on every row (session before ' - ', subject name and
+    level, and the EE/TOK subject and flags).
+    """
+    df = pd.DataFrame(index=subjects.index)
+    df[['session', 'subject']]  = subjects.str.split(' - ', n=1, expand=True)
+    # Extract before and after 'SL', 'HL', 'EE' or 'TK'
+    df[['subject_', 'sub']]     = df['subject'].str.extract(r'^(.*?)(\b(?:SL|HL|EE|TK)\b.*)$')
+    df['subject_']              = df['subject_'].str.strip()
+    df['sub']                   = df['sub'].str.strip()
+    for i in lst_exclude_keyword_ee_tok:
+        # e.g. r'^(.*?)\se+e\b'
+        pattern = r'^(.*?)\s' + '+'.join(i) + r'\b'
+        df[i + '_sub']          = df['subject'].str.extract(pattern, flags=re.IGNORECASE, expand=False)
+        df['is_' + i]           = df['subject'].str.contains(i, case=False, na=False).astype(bool)
+    return df
 
+def _candidate_fields(candidates):
+    """Session, candidate, session number and personal code from the distinct 'candidate' lines."""
+    df = pd.DataFrame(index=candidates.index)
+    df[['session', 'candidate']]                = candidates.str.split(' - ', n=1, expand=True)
+    df[['session_number', 'personal_code']]     = df['candidate'].str.extract(r'^(.+?)\s*(\([^)]+\))$')
     return df
 
 def reformat_results(df):
-    # 1. Split 'subject' into session and subject name
-    # Split the 'subject' column on ' - ' into two new columns: 'session' and 'subject'
-    df[['session', 'subject']] = df['subject'].str.split(' - ', n=1, expand=True)
-    df[['session', 'candidate']] = df['candidate'].str.split(' - ', n=1, expand=True)
-
-    # 2. Extract core subject name and type (SL/HL/EE/TK)
-    # Extract before and after 'SL', 'HL', or 'EE' using regex
-    #df[['sub', 'uni_pg']] = df['subject'].str.extract(r'^(.*?)(SL|HL|EE.*)$')
-    df[['subject_', 'sub']]                     = df['subject'].str.extract(r'^(.*?)(\b(?:SL|HL|EE|TK)\b.*)$')
-
-    #df[['session_number', 'personal_code']]     = df['candidate'].str.extract(r'^(\d{6}) (\d{4})')
-    df[['session_number', 'personal_code']]    = df['candidate'].str.extract(r'^(.+?)\s*(\([^)]+\))$')
-
-    # Clean whitespace
-    df['subject_'] = df['subject_'].str.strip()
-    df['sub'] = df['sub'].str.strip()
-    
-    # 3. Assign grade components
-    df['uni_pg'] = ""
-    #df['sub'] = ""
-    #df['uni_pg'] = ""
-    df['PG'] = ""
+    # A report has a few dozen distinct subject lines and one candidate line per candidate:
+    # the string work runs once per distinct value and the results are mapped back by code
+    codes_subject, subjects = data_schema.distinct(df['subject'])
+    codes_candidate, candidates = data_schema.distinct(df['candidate'])
+    df_subject = _subject_fields(subjects)
+    df_candidate = _candidate_fields(candidates)
+
+    # 1. Split 'subject' and 'candidate' on ' - ' (the session comes from the candidate)
+    df['session']   = data_schema.take(df_candidate['session'], codes_candidate, 'string')
+    df['subject']   = data_schema.take(df_subject['subject'], codes_subject, 'category')
+    df['candidate'] = data_schema.take(df_candidate['candidate'], codes_candidate, 'string')
+
+    # 2. Core subject name and type (SL/HL/EE/TK), session number and personal code
+    df['subject_']          = data_schema.take(df_subject['subject_'], codes_subject, 'category')
+    df['sub']               = data_schema.take(df_subject['sub'], codes_subject, 'category')
+    df['session_number']    = data_schema.take(df_candidate['session_number'], codes_candidate, 'string')
+    df['personal_code']     = data_schema.take(df_candidate['personal_code'], codes_candidate, 'string')
+
+    # 3. Assign grade components (PG and scaled_total are filled in by the subject merge)
+    df['uni_pg'] = data_schema.blank_column(df, 'grade')
+    df['PG'] = data_schema.blank_column(df, 'grade')
     df['FG'] = df['grade']
-    df['scaled_total'] = ""
+    df['scaled_total'] = data_schema.blank_column(df, 'decimal')
 
     #==============================================================================================
-    # map EE and TOK sub and FG to 
+    # map EE and TOK sub and FG to
     for i in lst_exclude_keyword_ee_tok:
-        # Join into regex pattern: 'ee|tk'
-        #         r'^(.*?)\s+ee\b'
-        pattern = r'^(.*?)\s' + '+'.join(i) + r'\b'
-        df[i + '_sub'] = df['subject'].str.extract( pattern, flags=re.IGNORECASE)
-        df[i + '_fg'] = np.where(
-                                    df['subject'].str.contains( i , case=False, na=False),
-                                    #df['subject'].str.extract( i , case=False, na=False),
-                                    df['grade'],
-                                    np.nan
-                                )
-        df[i + '_pg'] = ""
+        df[i + '_sub'] = data_schema.take(df_subject[i + '_sub'], codes_subject, 'category')
+        mask = (df_subject['is_' + i].to_numpy()[codes_subject]) & (codes_subject >= 0)
+        series_fg = df['grade'].where(mask)
+        if isinstance(series_fg.dtype, pd.CategoricalDtype):
+            series_fg = series_fg.cat.remove_unused_categories()
+        df[i + '_fg'] = series_fg
+        df[i + '_pg'] = data_schema.blank_column(df, 'grade')
     #==============================================================================================
 
-    return df
+    # Type the derived columns
+    return data_schema.apply_schema(df)
 
-def reformat_results_sub(df):
+def _candidate_codes(df):
+    """
+    Number the candidates (common_keys) of df in sorted key order.
+    Returns (code per row, MultiIndex of the candidates), as groupby(common_keys) would
+    give, but from one factorize per key column.
+    """
+    codes_candidate = np.zeros(len(df), dtype=np.intp)
+    lst_codes, lst_levels = [], []
+    for col in common_keys:
+        codes, uniques = pd.factorize(df[col], sort=True)
+        lst_codes.append(codes)
+        lst_levels.append(uniques)
+        # Rank of the key prefix so far; stays below len(df), so it never overflows
+        _, codes_candidate = np.unique(codes_candidate * len(uniques) + codes, return_inverse=True)
+        codes_candidate = codes_candidate.reshape(-1)
+
+    # First row of each candidate gives its key codes
+    first_row = np.empty(codes_candidate.max() + 1 if len(df) else 0, dtype=np.intp)
+    first_row[codes_candidate[::-1]] = np.arange(len(df) - 1, -1, -1)
+    index_candidates = pd.MultiIndex(
+        levels=lst_levels, codes=[codes[first_row] for codes in lst_codes], names=common_keys
+    )
+    return codes_candidate, index_candidates
 
-    # Join into regex pattern: 'ee|tk'
-    pattern = r'\b(' + '|'.join(lst_exclude_keyword_ee_tok) + r')\b'
-    
+def reformat_results_sub(df):
+    """
+    One row per candidate (common_keys, sorted) and a (subject, field) column for every
+    subject (sorted) and each of lst_subject_fields; EE and TK rows are left out.
+    Same result as pd.pivot_table(..., aggfunc='first') followed by reordering the fields,
+    but built directly: the rows are numbered once per candidate and per subject, and every
+    output column is gathered from its field with one position array.
+    """
     # Corrected pattern for case-insensitivity within the regex
     # re.IGNORECASE is embedded as (?i)
     pattern = r'(?i)\b(' + '|'.join(lst_exclude_keyword_ee_tok) + r')\b'
-    
-    # Filter rows where 'subject' does NOT contain any keyword
-    #df = df[~df['subject'].str.contains(pattern, case=False, na=False, flags=re.IGNORECASE)]
-    #df = df[~df['subject'].str.extract(pattern, case=False, na=False, flags=re.IGNORECASE)]
-
-    # The fix: remove 'case' and 'flags' arguments from str.extract()
-    # Use .notna() to filter out rows where no match was found (NaN)
-    df = df[~df['subject'].str.extract(pattern, expand=False).notna()]
-
-    # 4. Pivot table: group by student, columns by subject, values are grade fields
-    pivot_table = pd.pivot_table(
-      df,
-      values    =   ['sub', 'uni_pg', 'PG', 'FG', 'scaled_total'],
-      index     =   ['session_number', 'personal_code', 'name', 'birth_date'],
-      columns   =   ['subject_'],
-      aggfunc   =   'first'
-    )
 
-    # 5. Reorder column levels to [subject, field]
-    pivot_table.columns = pivot_table.columns.reorder_levels([1, 0])
-    pivot_table = pivot_table.sort_index(axis=1, level=0)
-
-    # 6. Reset index for clean export
-    #pivot_table = pivot_table.reset_index()
-
-    #==============================================================================================
-    # Get all unique subjects from the first level of columns
-    subjects = pivot_table.columns.get_level_values(0).unique()
-    # Build new column order
-    new_columns = []
-    for subject in subjects:
-        for col in ['sub', 'uni_pg', 'PG', 'FG', 'scaled_total']:
-            if (subject, col) in pivot_table.columns:
-                new_columns.append((subject, col))
-
-    # Reindex the columns to the new order
-    pivot_table = pivot_table.reindex(columns=pd.MultiIndex.from_tuples(new_columns))
-    #========================================================================================
-    # 6. Reset index for clean export
-    #pivot_table = pivot_table.reset_index()
-    
+    # Rows where 'subject' does NOT contain any keyword; as pivot_table, rows with a missing
+    # key are dropped, and so are (candidate, subject) pairs without any value.
+    # One selection, of the columns used below only.
+    mask = df['subject'].str.extract(pattern, expand=False).isna()
+    mask &= df[common_keys + ['subject_']].notna().all(axis=1)
+    mask &= df[lst_subject_fields].notna().any(axis=1)
+    df = df.loc[mask, common_keys + ['subject_'] + lst_subject_fields]
+
+    codes_subject, subjects = pd.factorize(df['subject_'], sort=True)
+    codes_candidate, index_candidates = _candidate_codes(df)
+    codes_pair = codes_candidate * len(subjects) + codes_subject
+    if len(codes_pair) and np.bincount(codes_pair).max() > 1:
+        # Repeated (candidate, subject): first non-missing value per field, as aggfunc='first'
+        df = df.groupby(common_keys + ['subject_'], observed=True, sort=False)[lst_subject_fields].first().reset_index()
+        codes_subject, subjects = pd.factorize(df['subject_'], sort=True)
+        codes_candidate, index_candidates = _candidate_codes(df)
+
+    # Row of df holding each (subject, candidate), -1 where the candidate has no such subject
+    positions = np.full((len(subjects), len(index_candidates)), -1, dtype=np.intp)
+    positions[codes_subject, codes_candidate] = np.arange(len(df))
+
+    lst_values = []
+    for i in range(len(subjects)):
+        for col in lst_subject_fields:
+            values = pd.api.extensions.take(df[col].array, positions[i], allow_fill=True)
+            # pivot_table drops all-missing columns and reindexing brings them back as float NaN
+            if pd.isna(values).all():
+                values = np.full(len(index_candidates), np.nan)
+            lst_values.append(values)
+
+    pivot_table = pd.DataFrame(dict(enumerate(lst_values)), index=index_candidates)
+    pivot_table.columns = pd.MultiIndex.from_arrays([
+        np.repeat(np.asarray(subjects, dtype=object), len(lst_subject_fields)),
+        np.tile(np.array(lst_subject_fields, dtype=object), len(subjects))
+    ])
     return pivot_table
 
 
@@ -218,8 +286,7 @@ def reformat_results_overall(df):
             'pt_ee_tok', 'pt_total', 'result']]
 
     # If you want to group by these columns (for aggregation), for example to get the first record per group:
-    df = df.groupby(['session_number', 'personal_code', 'name', 'birth_date'], as_index=True).first()
-    print(df)
+    df = df.groupby(['session_number', 'personal_code', 'name', 'birth_date'], as_index=True, observed=True).first()
     # Create MultiIndex columns
     arrays = [
         ['pt_ee_tok', 'pt_ee_tok', 'ee', 'ee', 'ee',  'tk',  'tk', 'tk',    'pt_total', 'pt_total', 'result',                             'result'],
@@ -291,6 +358,9 @@ def main():
     df.to_csv('raw_' + CSV_PATH)
     merged_df.to_csv(CSV_PATH)
     merged_df.to_excel(XLSX_PATH)
+    # Typed copies; the consolidator reads these in preference to the CSVs
+    data_export.write_parquet(df, 'raw_' + PARQUET_PATH)
+    data_export.write_parquet(merged_df, PARQUET_PATH)
     #==================================================================================================
 
 
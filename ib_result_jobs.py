@@ -0,0 +1,173 @@
+import os
+import time
+import threading
+import traceback
+from collections import OrderedDict, deque
+
+import ib_result_lazy as data_lazy
+
+# The shared pool is only started by the first extraction
+data_pdf = data_lazy.lazy_import('ib_result_pdf')
+
+
+#============================================================================
+# Jobs run at once (threads; each drives one consolidation)
+INT_JOB_WORKERS         = int(os.environ.get('IB_JOB_WORKERS', '4'))
+# Jobs waiting or running before new submissions are refused
+INT_JOB_QUEUE_MAX       = int(os.environ.get('IB_JOB_QUEUE', '32'))
+# Jobs one user (session) may have waiting or running
+INT_JOBS_PER_USER       = 1
+# Processes of the pool shared by all jobs for page extraction (0 = one per CPU)
+INT_JOB_PROCESSES       = int(os.environ.get('IB_JOB_PROCESSES', '0'))
+#============================================================================
+
+
+
+
+class QueueFullError(RuntimeError):
+    """Raised by JobQueue.submit when the queue or the user's share of it is full."""
+
+
+class Job:
+    """
+    One submitted call. state goes 'queued' -> 'running' -> 'done' or 'failed'; result
+    or error (with its traceback text) is set when it finishes.
+    """
+
+    def __init__(self, str_user, func, args, kwargs):
+        self.str_user = str_user
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.state = 'queued'
+        self.result = None
+        self.error = None
+        self.str_traceback = None
+        self.float_submitted = time.monotonic()
+        self.float_started = None
+        self.float_finished = None
+        self._event = threading.Event()
+
+    def done(self):
+        return self._event.is_set()
+
+    def wait(self, float_timeout=None):
+        """Block until the job finished (or float_timeout passed); returns done()."""
+        return self._event.wait(float_timeout)
+
+    def seconds(self):
+        """Time spent running so far (or in total once finished)."""
+        if self.float_started is None:
+            return 0.0
+        return (self.float_finished or time.monotonic()) - self.float_started
+
+
+class JobQueue:
+    """
+    Runs submitted calls on int_workers threads, shared by every session of the server.
+
+    Waiting jobs are kept per user and started round-robin across users, so one user
+    submitting several jobs does not delay everyone else. At most int_max_jobs jobs wait
+    or run at once, and int_max_per_user per user; submit() raises QueueFullError beyond
+    that. CPU-heavy work inside a job (page extraction) should go to process_pool(), one
+    process pool shared by all jobs, so concurrent jobs spread across all cores.
+    Threads and the pool start on first use.
+    """
+
+    def __init__(self, int_workers=INT_JOB_WORKERS, int_max_jobs=INT_JOB_QUEUE_MAX,
+                 int_max_per_user=INT_JOBS_PER_USER, int_processes=INT_JOB_PROCESSES):
+        self.int_workers = int_workers
+        self.int_max_jobs = int_max_jobs
+        self.int_max_per_user = int_max_per_user
+        self.int_processes = int_processes or os.cpu_count() or 1
+        # user -> waiting jobs; the first user is served next
+        self.dict_waiting = OrderedDict()
+        self.dict_user_jobs = {}
+        self.lst_threads = []
+        self.pool = None
+        self.condition = threading.Condition()
+
+    def submit(self, str_user, func, *args, **kwargs):
+        """Queue func(*args, **kwargs) for str_user; returns its Job."""
+        with self.condition:
+            if sum(self.dict_user_jobs.values()) >= self.int_max_jobs:
+                raise QueueFullError(f"{self.int_max_jobs} jobs are already waiting or running")
+            if self.dict_user_jobs.get(str_user, 0) >= self.int_max_per_user:
+                raise QueueFullError("a job of this session is already waiting or running")
+            job = Job(str_user, func, args, kwargs)
+            self.dict_waiting.setdefault(str_user, deque()).append(job)
+            self.dict_user_jobs[str_user] = self.dict_user_jobs.get(str_user, 0) + 1
+            if len(self.lst_threads) < self.int_workers:
+                thread = threading.Thread(target=self._work, name=f'ib-job-{len(self.lst_threads)}', daemon=True)
+                self.lst_threads.append(thread)
+                thread.start()
+            self.condition.notify()
+        return job
+
+    def position(self, job):
+        """Jobs that will start before a waiting job (0 = next), or None once it started."""
+        with self.condition:
+            if job.state != 'queued':
+                return None
+            # Replay the round-robin order over the waiting queues
+            lst_queues = [list(jobs) for jobs in self.dict_waiting.values()]
+            int_position = 0
+            for int_round in range(max((len(jobs) for jobs in lst_queues), default=0)):
+                for jobs in lst_queues:
+                    if int_round < len(jobs):
+                        if jobs[int_round] is job:
+                            return int_position
+                        int_position += 1
+            return None
+
+    def counts(self):
+        """(waiting, running) jobs."""
+        with self.condition:
+            int_waiting = sum(len(jobs) for jobs in self.dict_waiting.values())
+            return int_waiting, sum(self.dict_user_jobs.values()) - int_waiting
+
+    def process_pool(self):
+        """The process pool shared by all jobs (replaced if a worker process died)."""
+        with self.condition:
+            if self.pool is not None and self.pool._broken:
+                self.pool.shutdown(wait=False, cancel_futures=True)
+                self.pool = None
+            if self.pool is None:
+                self.pool = data_pdf.new_process_pool(self.int_processes)
+            return self.pool
+
+    def _next(self):
+        with self.condition:
+            while not self.dict_waiting:
+                self.condition.wait()
+            str_user, jobs = next(iter(self.dict_waiting.items()))
+            job = jobs.popleft()
+            if jobs:
+                self.dict_waiting.move_to_end(str_user)
+            else:
+                del self.dict_waiting[str_user]
+            job.state = 'running'
+            job.float_started = time.monotonic()
+            return job
+
+    def _work(self):
+        while True:
+            job = self._next()
+            try:
+                job.result = job.func(*job.args, **job.kwargs)
+                job.state = 'done'
+            except Exception as e:
+                job.error = e
+                job.str_traceback = traceback.format_exc()
+                job.state = 'failed'
+            finally:
+                job.float_finished = time.monotonic()
+                # Drop the call so a finished job held by a session keeps no inputs alive
+                job.func = job.args = job.kwargs = None
+                with self.condition:
+                    self.dict_user_jobs[job.str_user] -= 1
+                    if not self.dict_user_jobs[job.str_user]:
+                        del self.dict_user_jobs[job.str_user]
+                job._event.set()
+
+job_queue = JobQueue()
@@ -0,0 +1,30 @@
+import importlib
+
+
+class LazyModule:
+    """
+    Stands in for a module that is only imported on first attribute access.
+
+    Used for heavy dependencies of modules the app needs before anything is uploaded, so
+    a new session renders without paying for them: pandas and pyarrow load with the first
+    results, pdfplumber with the first upload, openpyxl with the first Excel download.
+    importlib serialises concurrent first imports, so this is safe from job threads.
+    """
+
+    def __init__(self, str_name):
+        self.__dict__['_str_name'] = str_name
+        self.__dict__['_module'] = None
+
+    def __getattr__(self, str_attr):
+        module = self._module
+        if module is None:
+            module = importlib.import_module(self._str_name)
+            self.__dict__['_module'] = module
+        return getattr(module, str_attr)
+
+    def __repr__(self):
+        return f"<lazy module '{self._str_name}'{' (loaded)' if self._module is not None else ''}>"
+
+def lazy_import(str_name):
+    """`pd = lazy_import('pandas')` in place of `import pandas as pd`."""
+    return LazyModule(str_name)
@@ -0,0 +1,392 @@
+import io
+import os
+import hashlib
+import contextlib
+import tempfile
+import weakref
+import multiprocessing
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import pdfplumber
+
+from pdfminer.utils import apply_matrix_pt, mult_matrix
+from pdfminer.pdffont import PDFUnicodeNotDefined
+from pdfminer.pdfdevice import PDFTextDevice
+from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
+
+
+#============================================================================
+# Worker processes used for page extraction (1 = serial, 0 = one per CPU)
+INT_EXTRACT_WORKERS         = int(os.environ.get('IB_EXTRACT_WORKERS', '1'))
+# Below this many pages the pool start-up costs more than it saves
+INT_MIN_PAGES_PARALLEL      = 16
+# Page ranges per worker; more, smaller ranges even out slow pages
+INT_RANGES_PER_WORKER       = 4
+# How extraction processes start. Not 'fork': pools are created from threads of the
+# Streamlit server, and a forked child can inherit a lock another thread held (and hang)
+STR_POOL_START_METHOD       = ('forkserver' if 'forkserver' in multiprocessing.get_all_start_methods()
+                               else 'spawn')
+# Page text backend (see dict_backends): 'pdfplumber' or the faster 'textruns'
+STR_EXTRACT_BACKEND         = os.environ.get('IB_EXTRACT_BACKEND', 'pdfplumber')
+# Gaps (points) within which text runs join a word / a line, as pdfplumber's defaults
+FLOAT_X_TOLERANCE           = 3
+FLOAT_Y_TOLERANCE           = 3
+#============================================================================
+
+
+
+
+def _remove_file(str_path):
+    try:
+        os.remove(str_path)
+    except OSError:
+        pass
+
+
+class PdfSource:
+    """
+    An uploaded PDF kept in memory.
+    Detection and extraction share one pdfplumber handle opened over the bytes.
+    A temp file is only written when a worker pool needs a path (spill_path); close()
+    removes it and releases the handle, and a finalizer does the same if the owning
+    Streamlit session is dropped without closing it.
+    """
+
+    def __init__(self, bytes_data, str_name=''):
+        self.bytes_data = bytes_data
+        self.str_name = str_name
+        self._str_digest = None
+        self._pdf = None
+        self._str_spill_path = None
+        self._finalizer = None
+
+    @property
+    def str_digest(self):
+        """SHA-256 of the bytes, computed once."""
+        if self._str_digest is None:
+            self._str_digest = hashlib.sha256(self.bytes_data).hexdigest()
+        return self._str_digest
+
+    def stream(self):
+        return io.BytesIO(self.bytes_data)
+
+    def open(self):
+        """The shared pdfplumber handle; opened on first use, stays open until close()."""
+        if self._pdf is None:
+            self._pdf = pdfplumber.open(self.stream())
+        return self._pdf
+
+    def spill_path(self):
+        """Write the bytes to a temp file once (for worker processes) and return its path."""
+        if self._str_spill_path is None:
+            fd, str_path = tempfile.mkstemp(suffix='.pdf')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(self.bytes_data)
+            self._str_spill_path = str_path
+            self._finalizer = weakref.finalize(self, _remove_file, str_path)
+        return self._str_spill_path
+
+    def is_open(self):
+        """Whether a pdfplumber handle or a spill file is held (both released by close())."""
+        return self._pdf is not None or self._str_spill_path is not None
+
+    def close(self):
+        """Release the pdfplumber handle and delete the spill file, if any. The bytes stay usable."""
+        if self._pdf is not None:
+            # pdfplumber's close() builds every Page just to close it; skip that if none were built
+            if hasattr(self._pdf, '_pages'):
+                self._pdf.close()
+            self._pdf = None
+        if self._finalizer is not None:
+            self._finalizer()
+            self._finalizer = None
+            self._str_spill_path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def as_pdf_source(pdf_source):
+    """
+    Wrap bytes or a binary file object in a PdfSource; paths and PdfSources are returned as is.
+    Returns (source, bool_owned); an owned source should be closed by the caller.
+    """
+    if isinstance(pdf_source, (bytes, bytearray)):
+        return PdfSource(bytes(pdf_source)), True
+    if hasattr(pdf_source, 'read'):
+        if hasattr(pdf_source, 'seek'):
+            pdf_source.seek(0)
+        return PdfSource(pdf_source.read(), getattr(pdf_source, 'name', '')), True
+    return pdf_source, False
+
+def resolve_workers(int_workers=None):
+    """Turn a worker setting into a process count (None = module default, <= 0 = all CPUs)."""
+    if int_workers is None:
+        int_workers = INT_EXTRACT_WORKERS
+    if int_workers <= 0:
+        int_workers = os.cpu_count() or 1
+    return int_workers
+
+def new_process_pool(int_workers):
+    """A ProcessPoolExecutor of int_workers processes started with STR_POOL_START_METHOD."""
+    return ProcessPoolExecutor(max_workers=int_workers,
+                               mp_context=multiprocessing.get_context(STR_POOL_START_METHOD))
+
+def split_page_ranges(int_page_count, int_chunks):
+    """
+    Split pages [0, int_page_count) into at most int_chunks contiguous ranges.
+    Returns a list of (start, stop) tuples in page order.
+    """
+    int_chunks = max(1, min(int_chunks, int_page_count))
+    int_size, int_extra = divmod(int_page_count, int_chunks)
+
+    lst_ranges = []
+    int_start = 0
+    for i in range(int_chunks):
+        int_stop = int_start + int_size + (1 if i < int_extra else 0)
+        if int_stop > int_start:
+            lst_ranges.append((int_start, int_stop))
+        int_start = int_stop
+    return lst_ranges
+
+class PdfplumberBackend:
+    """Page text from pdfplumber's extract_text(): character objects and layout analysis."""
+
+    str_name = 'pdfplumber'
+
+    def page_texts(self, pages):
+        """Yield (page index, text) for pdfplumber Pages of one document, in order."""
+        for page in pages:
+            text = page.extract_text()
+            page.close()
+            yield page.page_number - 1, text
+
+
+class TextRunDevice(PDFTextDevice):
+    """
+    pdfminer device that keeps only the text runs of a page: (x0, x1, y, text) in page
+    space for every string of a Tj/TJ operator. Character widths are summed to place
+    the runs, but no per-character objects are built. Horizontal text only.
+    """
+
+    def __init__(self, rsrcmgr):
+        super().__init__(rsrcmgr)
+        self.lst_runs = []
+
+    def render_string(self, textstate, seq, ncs, graphicstate):
+        font = textstate.font
+        if font is None or font.is_vertical():
+            return
+        matrix = mult_matrix(textstate.matrix, self.ctm)
+        float_size = textstate.fontsize
+        float_scaling = textstate.scaling * 0.01
+        float_charspace = textstate.charspace * float_scaling
+        float_wordspace = 0 if font.is_multibyte() else textstate.wordspace * float_scaling
+        float_dxscale = 0.001 * float_size * float_scaling
+        float_rise = textstate.rise
+        x, y = textstate.linematrix
+        # Same positioning as PDFTextDevice.render_string_horizontal
+        bool_charspace = False
+        for obj in seq:
+            if isinstance(obj, (int, float)):
+                x -= obj * float_dxscale
+                bool_charspace = True
+                continue
+            if not isinstance(obj, bytes):
+                continue
+            float_x0 = float_x1 = None
+            lst_text = []
+            for cid in font.decode(obj):
+                if bool_charspace:
+                    x += float_charspace
+                if float_x0 is None:
+                    float_x0 = x
+                x += font.char_width(cid) * float_size * float_scaling
+                float_x1 = x
+                if cid == 32 and float_wordspace:
+                    x += float_wordspace
+                bool_charspace = True
+                try:
+                    lst_text.append(font.to_unichr(cid))
+                except PDFUnicodeNotDefined:
+                    lst_text.append(f"(cid:{cid})")
+            if float_x0 is not None:
+                float_left, float_y = apply_matrix_pt(matrix, (float_x0, y + float_rise))
+                float_right, _ = apply_matrix_pt(matrix, (float_x1, y + float_rise))
+                self.lst_runs.append((float_left, float_right, float_y, ''.join(lst_text)))
+        textstate.linematrix = (x, y)
+
+
+def runs_to_text(lst_runs, float_x_tolerance=FLOAT_X_TOLERANCE, float_y_tolerance=FLOAT_Y_TOLERANCE):
+    """
+    Page text from positioned text runs, assembled the way pdfplumber's extract_text()
+    assembles characters: runs within float_y_tolerance of each other form a line (top to
+    bottom), a line is read left to right, a gap wider than float_x_tolerance separates
+    words, and words are joined by single spaces.
+    """
+    lst_lines = []
+    lst_line = []
+    float_last_y = None
+    for run in sorted(lst_runs, key=lambda run: -run[2]):
+        if float_last_y is not None and float_last_y - run[2] > float_y_tolerance:
+            lst_lines.append(lst_line)
+            lst_line = []
+        lst_line.append(run)
+        float_last_y = run[2]
+    if lst_line:
+        lst_lines.append(lst_line)
+
+    lst_text = []
+    for lst_line in lst_lines:
+        lst_parts = []
+        float_last_x1 = None
+        for float_x0, float_x1, _, str_text in sorted(lst_line, key=lambda run: run[0]):
+            if float_last_x1 is not None and float_x0 > float_last_x1 + float_x_tolerance:
+                lst_parts.append(' ')
+            lst_parts.append(str_text)
+            float_last_x1 = float_x1
+        str_line = ' '.join(''.join(lst_parts).split())
+        if str_line:
+            lst_text.append(str_line)
+    return '\n'.join(lst_text)
+
+
+class TextRunBackend:
+    """
+    Page text from the text runs of each page's content stream (TextRunDevice), put in
+    reading order by position. Skips pdfplumber's character objects and word/line
+    clustering; for machine-generated reports it yields the same lines, several times faster.
+    """
+
+    str_name = 'textruns'
+
+    def page_texts(self, pages):
+        """Yield (page index, text) for pdfplumber Pages of one document, in order."""
+        # One resource manager per document: fonts are cached by object id
+        rsrcmgr = PDFResourceManager(caching=True)
+        device = TextRunDevice(rsrcmgr)
+        interpreter = PDFPageInterpreter(rsrcmgr, device)
+        for page in pages:
+            device.lst_runs = []
+            interpreter.process_page(page.page_obj)
+            page.close()
+            yield page.page_number - 1, runs_to_text(device.lst_runs)
+
+
+# Extraction backends by name; STR_EXTRACT_BACKEND picks the deployment default
+dict_backends = {backend.str_name: backend for backend in (PdfplumberBackend(), TextRunBackend())}
+
+def get_backend(str_backend=None):
+    """The backend named str_backend (None = STR_EXTRACT_BACKEND)."""
+    str_backend = str_backend or STR_EXTRACT_BACKEND
+    try:
+        return dict_backends[str_backend]
+    except KeyError:
+        raise ValueError(f"Unknown extraction backend {str_backend!r} "
+                         f"(expected one of {', '.join(dict_backends)})") from None
+
+def parse_page_range(pdf_path, int_start, int_stop, func_parse_page, str_backend=None):
+    """
+    Extract and parse pages [int_start, int_stop) of a PDF.
+    Runs in a worker process; returns (page index, parse result) pairs in page order.
+    """
+    lst_parsed = []
+    # pdfplumber page numbers are 1-based
+    with pdfplumber.open(pdf_path, pages=range(int_start + 1, int_stop + 1)) as pdf:
+        for int_page, text in get_backend(str_backend).page_texts(pdf.pages):
+            if not text:
+                continue
+            lst_parsed.append((int_page, func_parse_page(text)))
+    return lst_parsed
+
+def iter_parsed_pages(pdf_source, func_parse_page, int_workers=None, executor=None, str_backend=None):
+    """
+    Yield (int_pages_done, int_page_count, func_parse_page(text)) for every page of the
+    PDF that has text, in page order, as soon as each page (or page range) is parsed.
+    pdf_source: a PdfSource, bytes, a binary file object or a path.
+    With more than one worker the document is split into page ranges that are
+    extracted and parsed in a process pool; the output is the same as the serial path.
+    func_parse_page must be a module-level function so it can be sent to the workers.
+    executor: a running process pool to use instead of starting one for this document
+    (e.g. one shared by concurrent extractions); int_workers then only sets how the
+    document is split, and defaults to all CPUs.
+    str_backend: how page text is extracted (see dict_backends; None = STR_EXTRACT_BACKEND).
+    """
+    backend = get_backend(str_backend)
+    if executor is not None and int_workers is None:
+        int_workers = 0
+    int_workers = resolve_workers(int_workers)
+    source, bool_owned = as_pdf_source(pdf_source)
+    try:
+        if isinstance(source, PdfSource):
+            pdf = source.open()
+        else:
+            pdf = pdfplumber.open(source)
+        try:
+            int_page_count = len(pdf.pages)
+            if int_workers == 1 or int_page_count < INT_MIN_PAGES_PARALLEL:
+                for int_page, text in backend.page_texts(pdf.pages):
+                    if not text:
+                        continue
+                    yield int_page + 1, int_page_count, func_parse_page(text)
+                return
+        finally:
+            # The shared handle of a PdfSource stays open for its owner
+            if not isinstance(source, PdfSource):
+                pdf.close()
+
+        # Workers open the document themselves, from a path
+        str_path = source.spill_path() if isinstance(source, PdfSource) else source
+        lst_ranges = split_page_ranges(int_page_count, int_workers * INT_RANGES_PER_WORKER)
+        context = (contextlib.nullcontext(executor) if executor is not None
+                   else new_process_pool(min(int_workers, len(lst_ranges))))
+        with context as pool:
+            lst_futures = [
+                pool.submit(parse_page_range, str_path, int_start, int_stop, func_parse_page, backend.str_name)
+                for int_start, int_stop in lst_ranges
+            ]
+            # Collect in submission order so records come back in page order
+            for future in lst_futures:
+                for int_page, parsed in future.result():
+                    yield int_page + 1, int_page_count, parsed
+    finally:
+        if bool_owned:
+            source.close()
+
+
+
+class ColumnBuffer:
+    """
+    Accumulates parsed records column by column (one list per field).
+    Batches are dicts of equal-length lists; a field missing from a batch is padded
+    with NaN, as pd.json_normalize would. to_frame() builds the DataFrame directly.
+    """
+
+    def __init__(self):
+        self.dict_columns = {}
+        self.int_rows = 0
+
+    def extend(self, dict_batch):
+        int_batch = max((len(lst_values) for lst_values in dict_batch.values()), default=0)
+        if int_batch == 0:
+            return
+
+        for key, lst_values in self.dict_columns.items():
+            if key in dict_batch:
+                lst_values.extend(dict_batch[key])
+            else:
+                lst_values.extend([np.nan] * int_batch)
+        for key, lst_values in dict_batch.items():
+            if key not in self.dict_columns:
+                self.dict_columns[key] = [np.nan] * self.int_rows + list(lst_values)
+        self.int_rows += int_batch
+
+    def to_frame(self):
+        return pd.DataFrame(self.dict_columns)
@@ -0,0 +1,140 @@
+import os
+import sys
+import json
+import time
+
+try:
+    import resource
+except ImportError:     # Windows
+    resource = None
+
+import ib_result_lazy as data_lazy
+
+# Only to_frame() needs pandas
+pd = data_lazy.lazy_import('pandas')
+
+
+#============================================================================
+# Default for new recorders; the app overrides it per session
+BOOL_PERF_ENABLED   = os.environ.get('IB_PERF', '0') == '1'
+# ru_maxrss is in kilobytes on Linux and bytes on macOS
+INT_MAXRSS_UNIT     = 1 if sys.platform == 'darwin' else 1024
+INT_PAGE_SIZE       = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+#============================================================================
+
+
+
+
+def current_rss_mb():
+    """Resident set size of this process now (Linux /proc), or None where unavailable."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * INT_PAGE_SIZE / 2**20
+    except (OSError, ValueError, IndexError):
+        return None
+
+def peak_rss_mb():
+    """High-water mark of this process' resident set size, or None where unavailable."""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * INT_MAXRSS_UNIT / 2**20
+
+def _children_cpu():
+    # CPU time of finished child processes, i.e. extraction workers
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class _Stage:
+    """One timed stage; set .rows inside the with-block to record a row count."""
+    __slots__ = ('recorder', 'str_stage', 'dict_labels', 'bool_replace', 'rows',
+                 'float_wall', 'float_cpu', 'float_cpu_children')
+
+    def __init__(self, recorder, str_stage, dict_labels, bool_replace):
+        self.recorder = recorder
+        self.str_stage = str_stage
+        self.dict_labels = dict_labels
+        self.bool_replace = bool_replace
+        self.rows = None
+
+    def __enter__(self):
+        self.float_cpu_children = _children_cpu()
+        self.float_cpu = time.process_time()
+        self.float_wall = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        float_wall = time.perf_counter() - self.float_wall
+        float_cpu = time.process_time() - self.float_cpu
+        dict_record = {
+            'stage'             : self.str_stage,
+            **self.dict_labels,
+            'wall_s'            : round(float_wall, 6),
+            'cpu_s'             : round(float_cpu, 6),
+            'cpu_workers_s'     : round(_children_cpu() - self.float_cpu_children, 6),
+            'rss_mb'            : current_rss_mb(),
+            'peak_rss_mb'       : peak_rss_mb(),
+            'rows'              : self.rows,
+            'ok'                : exc_type is None
+        }
+        self.recorder._add(dict_record, self.bool_replace)
+        return False
+
+
+class _NullStage:
+    """Stand-in used when recording is off: no clocks, no allocation per stage."""
+    __slots__ = ('rows',)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+_null_stage = _NullStage()
+
+
+class PerfRecorder:
+    """
+    Records wall time, CPU time (own and worker processes), RSS and row counts per
+    pipeline stage, optionally labelled per file:
+
+        with recorder.stage('extract', file='Results summary') as s:
+            df = ...
+            s.rows = len(df)
+
+    When disabled, stage() returns a shared no-op context.
+    """
+
+    def __init__(self, bool_enabled=None):
+        self.bool_enabled = BOOL_PERF_ENABLED if bool_enabled is None else bool_enabled
+        self.lst_records = []
+
+    def stage(self, str_stage, bool_replace=False, **labels):
+        """
+        Context manager timing one stage. bool_replace overwrites an earlier record with
+        the same stage and labels (for work that reruns, such as exports).
+        """
+        if not self.bool_enabled:
+            _null_stage.rows = None
+            return _null_stage
+        return _Stage(self, str_stage, labels, bool_replace)
+
+    def _add(self, dict_record, bool_replace):
+        if bool_replace:
+            dict_key = {k: v for k, v in dict_record.items() if k not in _lst_measure_keys}
+            self.lst_records = [
+                r for r in self.lst_records
+                if {k: v for k, v in r.items() if k not in _lst_measure_keys} != dict_key
+            ]
+        self.lst_records.append(dict_record)
+
+    def to_frame(self):
+        return pd.DataFrame(self.lst_records)
+
+    def to_json(self):
+        return json.dumps({'records': self.lst_records}, indent=2)
+
+_lst_measure_keys = ['wall_s', 'cpu_s', 'cpu_workers_s', 'rss_mb', 'peak_rss_mb', 'rows', 'ok']
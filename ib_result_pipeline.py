@@ -0,0 +1,223 @@
+import threading
+
+import ib_result_lazy as data_lazy
+
+# The app creates a pipeline per session before anything is uploaded; the modules
+# doing the work load on the first run
+pd = data_lazy.lazy_import('pandas')
+data_handler_sum = data_lazy.lazy_import('ib_result_handler_summary')
+data_handler_sub = data_lazy.lazy_import('ib_result_handler_subject')
+consolidator = data_lazy.lazy_import('ib_result_consolidator')
+data_export = data_lazy.lazy_import('ib_result_export')
+
+
+#============================================================================
+# Report whose rows every merge step fills in (the Student Level report)
+STR_MAIN_HEADER     = 'Results summary'
+# Bump whenever merge or reshape output changes for the same inputs
+PIPELINE_VERSION    = 1
+
+# Report types by first-page header, with their display names (used by the app and the batch CLI)
+dict_file_types = {
+    'Results summary'       : 'IB Result (Student Level)',
+    'Subject Results'       : 'IB Result (Subject Level)',
+    '(EXTENDED ESSAY)'      : 'IB Result (Subject Level) - Extended Essay',
+    '(THEORY OF KNOWLEDGE)' : 'IB Result (Subject Level) - Theory of Knowledge'
+}
+# Header -> file type suffix for ib_result_detect, in detection priority order
+dict_header_map = {
+    'Results summary'       :   '',
+    '(EXTENDED ESSAY)'      :   '_sub_ee',
+    '(THEORY OF KNOWLEDGE)' :   '_sub_tk',
+    'Subject Results'       :   '_sub'
+}
+# Merge steps onto the Student Level report, in merge order
+dict_merge_steps = {
+    "Subject Results": {
+        'merge_file_substring'  : '',
+        'index_cols'            : ['session_number', 'personal_code', 'subject'],
+        'merge_cols'            : ['pg', 'scaled_total'],
+        'rename_map'            : {'pg': 'PG'}
+    },
+    "(EXTENDED ESSAY)": {
+        'merge_file_substring'  : '(EXTENDED ESSAY)',
+        'index_cols'            : ['session_number', 'personal_code', 'subject'],
+        'merge_cols'            : ['pg'],
+        'rename_map'            : {'pg': 'ee_pg'}
+    },
+    "(THEORY OF KNOWLEDGE)": {
+        'merge_file_substring'  : '(THEORY OF KNOWLEDGE)',
+        'index_cols'            : ['session_number', 'personal_code', 'subject'],
+        'merge_cols'            : ['pg'],
+        'rename_map'            : {'pg': 'tk_pg'}
+    }
+}
+#============================================================================
+
+
+
+
+class ResultPipeline:
+    """
+    Consolidation as a graph of stages, each memoized under a key derived from its inputs:
+
+        extract:<header>  ->  reformat:<header>  --+
+                                                   v
+        reformat:Results summary -> merge:<step 1> -> merge:<step 2> -> ... -> reshape
+
+    The key of extract is the handler, its PARSER_VERSION and the PDF's SHA-256; every other
+    key hashes the keys of the stage's inputs. Keys are known before anything runs, so a
+    stage is only computed when its key changed, and only the stages it needs are
+    evaluated: replacing the EE report re-extracts that PDF and replays the EE merge and
+    the steps after it, while the other reports, earlier merge steps and (when nothing
+    changed) the reshape are reused. Stages of reports no longer present are dropped.
+
+    Extraction itself is not kept in memory (the on-disk ExtractionCache covers it; only
+    its reformatted frame is needed downstream). One pipeline belongs to one session;
+    run() executes on a job thread while the session's script thread (and memory totals
+    of other sessions) read or clear the memo, so the memo is only touched under lock.
+    """
+
+    def __init__(self, dict_merge_steps=dict_merge_steps, dict_file_types=dict_file_types):
+        """
+        dict_merge_steps: header -> step ('index_cols', 'merge_cols', 'rename_map'), in merge order.
+        dict_file_types: header -> display name used to label the recorded stages.
+        """
+        self.dict_merge_steps = dict_merge_steps
+        self.dict_file_types = dict_file_types or {}
+        # node -> (key, value) of the latest evaluation
+        self.dict_memo = {}
+        # merge node -> source rows its latest evaluation dropped for duplicate keys
+        self.dict_dropped = {}
+        self.lock = threading.Lock()
+        # node -> (key, func, dependency nodes, keep in memo) for the current run
+        self.dict_plan = {}
+        self.lst_computed = []
+        self.str_result_key = None
+
+    def _add(self, str_node, str_key, func, lst_deps=(), bool_memo=True):
+        self.dict_plan[str_node] = (str_key, func, list(lst_deps), bool_memo)
+        return str_key
+
+    def _evaluate(self, str_node):
+        str_key, func, lst_deps, bool_memo = self.dict_plan[str_node]
+        with self.lock:
+            memo = self.dict_memo.get(str_node)
+        if memo is not None and memo[0] == str_key:
+            return memo[1]
+        value = func(*[self._evaluate(str_dep) for str_dep in lst_deps])
+        if bool_memo:
+            with self.lock:
+                self.dict_memo[str_node] = (str_key, value)
+        self.lst_computed.append(str_node)
+        return value
+
+    def _label(self, str_header):
+        return self.dict_file_types.get(str_header, str_header)
+
+    def run(self, dict_sources, func_extract, recorder):
+        """
+        Consolidate the reports in dict_sources (header -> PdfSource; None = not uploaded).
+        func_extract(header, handler, source) returns handler.extract_results output for the
+        source (e.g. through an ExtractionCache, with progress reporting); it is only called
+        for reports whose reformatted frame is not memoized.
+        Returns (df_merged, df_merged_final); str_result_key identifies them afterwards,
+        lst_computed lists the stages that ran and dropped_rows() the source rows no merge took.
+        """
+        self.dict_plan = {}
+        self.lst_computed = []
+
+        def add_report(str_header, handler):
+            source = dict_sources[str_header]
+            str_label = self._label(str_header)
+
+            def extract():
+                with recorder.stage('extract', bool_replace=True, file=str_label) as stage:
+                    result = func_extract(str_header, handler, source)
+                    stage.rows = len(result[0] if isinstance(result, tuple) else result)
+                return result
+
+            def reformat(result):
+                df = result[0] if isinstance(result, tuple) else result
+                with recorder.stage('reformat', bool_replace=True, file=str_label) as stage:
+                    # The handlers add columns to the frame they are given; keep the input intact
+                    df = handler.reformat_results(df.copy(deep=False))
+                    stage.rows = len(df)
+                return df
+
+            str_extract_key = self._add(
+                f'extract:{str_header}',
+                data_export.fingerprint(handler.__name__, handler.PARSER_VERSION, source.str_digest),
+                extract, bool_memo=False
+            )
+            self._add(f'reformat:{str_header}', data_export.fingerprint('reformat', str_extract_key),
+                      reformat, [f'extract:{str_header}'])
+            return f'reformat:{str_header}'
+
+        str_node = add_report(STR_MAIN_HEADER, data_handler_sum)
+        for str_header, step in self.dict_merge_steps.items():
+            if dict_sources.get(str_header) is None:
+                continue
+            str_source_node = add_report(str_header, data_handler_sub)
+
+            def merge(df_main, df_source, step=step, str_label=self._label(str_header),
+                      str_merge_node=f'merge:{str_header}'):
+                lst_dropped = []
+                with recorder.stage('merge', bool_replace=True, file=str_label) as stage:
+                    df_merged = consolidator.merge_all_results(df_main, [(df_source, step)], lst_dropped)
+                    stage.rows = len(df_merged)
+                with self.lock:
+                    if lst_dropped:
+                        self.dict_dropped[str_merge_node] = lst_dropped[0][1]
+                    else:
+                        self.dict_dropped.pop(str_merge_node, None)
+                return df_merged
+
+            str_key = data_export.fingerprint(PIPELINE_VERSION, self.dict_plan[str_node][0],
+                                              self.dict_plan[str_source_node][0], repr(sorted(step.items())))
+            self._add(f'merge:{str_header}', str_key, merge, [str_node, str_source_node])
+            str_node = f'merge:{str_header}'
+
+        def reshape(df_merged):
+            with recorder.stage('pivot', bool_replace=True) as stage:
+                df_sub = data_handler_sum.reformat_results_sub(df_merged)
+                stage.rows = len(df_sub)
+            with recorder.stage('overall', bool_replace=True) as stage:
+                df_overall = data_handler_sum.reformat_results_overall(df_merged)
+                df_merged_final = pd.merge(df_sub, df_overall, on=data_handler_sum.common_keys, how='outer')
+                stage.rows = len(df_merged_final)
+            return df_merged_final
+
+        str_result_key = self._add('reshape', data_export.fingerprint(PIPELINE_VERSION, 'reshape',
+                                                                      self.dict_plan[str_node][0]),
+                                   reshape, [str_node])
+
+        df_merged = self._evaluate(str_node)
+        df_merged_final = self._evaluate('reshape')
+        self.str_result_key = str_result_key
+
+        # Forget stages of reports that are gone or were replaced
+        with self.lock:
+            for str_stale in set(self.dict_memo) - set(self.dict_plan):
+                del self.dict_memo[str_stale]
+            for str_stale in set(self.dict_dropped) - set(self.dict_plan):
+                del self.dict_dropped[str_stale]
+        return df_merged, df_merged_final
+
+    def dropped_rows(self):
+        """
+        Report display name -> rows of that report left out of the latest run because
+        their merge key was already taken (see consolidator.merge_all_results).
+        """
+        with self.lock:
+            return {self._label(str_node.split(':', 1)[1]): df for str_node, df in self.dict_dropped.items()}
+
+    def memo_values(self):
+        """Snapshot of the memoized stage values."""
+        with self.lock:
+            return [value for _, value in self.dict_memo.values()]
+
+    def clear(self):
+        """Release the memoized stages; the next run recomputes them (str_result_key stays valid)."""
+        with self.lock:
+            self.dict_memo.clear()
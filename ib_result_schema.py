@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+
+
+#============================================================================
+# Storage type of every column the handlers produce (same name = same meaning in
+# both handlers). Applied once per frame right after extraction and again after
+# reformat_results for the derived columns; columns already in their type are left alone.
+#   category : few distinct values repeated on many rows
+#   string   : (nearly) unique per candidate
+#   grade    : IB grade, 1-7 or A-E; Int8 when every value is a number, else category
+#   points   : small whole numbers; Int16 when every value is a number, else category
+#   decimal  : Float64 when every value is a number, else category
+# Blank strings are missing values in every type.
+dict_column_kind = {
+    'date_printed'      : 'category',
+    'category'          : 'category',
+    'result'            : 'category',
+    'subject'           : 'category',
+    'subject_'          : 'category',
+    'sub'               : 'category',
+    'ee_sub'            : 'category',
+    'tk_sub'            : 'category',
+    'candidate'         : 'string',
+    'session'           : 'string',
+    'name'              : 'string',
+    'birth_date'        : 'string',
+    'session_number'    : 'string',
+    'personal_code'     : 'string',
+    'grade'             : 'grade',
+    'pg'                : 'grade',
+    'fg'                : 'grade',
+    'PG'                : 'grade',
+    'FG'                : 'grade',
+    'uni_pg'            : 'grade',
+    'ee_pg'             : 'grade',
+    'ee_fg'             : 'grade',
+    'tk_pg'             : 'grade',
+    'tk_fg'             : 'grade',
+    'pt_ee_tok'         : 'points',
+    'pt_total'          : 'points',
+    'scaled_total'      : 'decimal'
+}
+dict_numeric_dtype = {
+    'grade'             : 'Int8',
+    'points'            : 'Int16',
+    'decimal'           : 'Float64'
+}
+# Storage type of 'string' columns: pandas' text dtype (Arrow-backed where pyarrow is
+# installed) with NaN as missing value, as 'str' is on pandas 3 (on pandas 2 'str' is object)
+dtype_string = pd.StringDtype(na_value=np.nan)
+#============================================================================
+
+
+
+
+def to_category(series):
+    """Categorical of the series' values, with blank strings as missing values."""
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype('category')
+    lst_blank = [c for c in series.cat.categories if isinstance(c, str) and not c.strip()]
+    if lst_blank:
+        series = series.cat.remove_categories(lst_blank)
+    return series
+
+def to_numeric_or_category(series, str_dtype):
+    """
+    Nullable numeric column (str_dtype, e.g. 'Int8') when every non-blank value parses
+    as one, otherwise a categorical. Parsing happens once per distinct value.
+    """
+    if series.dtype == str_dtype:
+        return series
+    series_cat = to_category(series)
+    categories = series_cat.cat.categories
+    values = pd.to_numeric(pd.Series(categories.astype(str)), errors='coerce')
+    if values.isna().any():
+        return series_cat
+    try:
+        array_values = pd.array(values.to_numpy(), dtype=str_dtype)
+    except (TypeError, ValueError, OverflowError):
+        # Fractions in an integer column, or out of range
+        return series_cat
+    array_result = pd.api.extensions.take(array_values, series_cat.cat.codes.to_numpy(), allow_fill=True)
+    return pd.Series(array_result, index=series.index, name=series.name)
+
+def to_string(series):
+    """pandas string column (Arrow-backed where pyarrow is installed)."""
+    if isinstance(series.dtype, pd.StringDtype):
+        return series
+    return series.astype(dtype_string)
+
+def apply_schema(df):
+    """Convert the columns of df listed in dict_column_kind in place; returns df."""
+    for col in df.columns.intersection(list(dict_column_kind)):
+        str_kind = dict_column_kind[col]
+        series = df[col]
+        if str_kind == 'category':
+            df[col] = to_category(series)
+        elif str_kind == 'string':
+            df[col] = to_string(series)
+        else:
+            df[col] = to_numeric_or_category(series, dict_numeric_dtype[str_kind])
+    return df
+
+def distinct(series):
+    """
+    (code per row, distinct values as a string Series); code -1 marks a missing value.
+    For deriving columns once per distinct value and mapping them back with take().
+    """
+    codes, uniques = pd.factorize(series)
+    return codes, pd.Series(np.asarray(uniques, dtype=object), dtype=dtype_string)
+
+def take(values, codes, str_kind):
+    """values[codes] (code -1 = missing) as a 'category' or 'string' column, without a per-row pass."""
+    if str_kind == 'category':
+        cat = pd.Categorical(values)
+        return pd.Categorical.from_codes(np.where(codes >= 0, cat.codes[codes], -1), categories=cat.categories)
+    return pd.array(values, dtype=dtype_string).take(codes, allow_fill=True)
+
+def blank_column(df, str_kind):
+    """All-missing column of the storage type for str_kind, aligned to df."""
+    if str_kind in dict_numeric_dtype:
+        return pd.Series(pd.NA, index=df.index, dtype=dict_numeric_dtype[str_kind])
+    return pd.Series(np.nan, index=df.index, dtype='category')
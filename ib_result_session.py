@@ -0,0 +1,253 @@
+import os
+import time
+import shutil
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+
+import ib_result_lazy as data_lazy
+
+# Needed only once a frame is spilled or read back
+data_export = data_lazy.lazy_import('ib_result_export')
+
+
+#============================================================================
+# Memory one session may hold in DataFrames before they are spilled to disk
+INT_SESSION_BUDGET_BYTES    = int(os.environ.get('IB_SESSION_MB', '256')) * 1024 * 1024
+# Sessions without activity for this long have everything spilled
+FLOAT_SESSION_IDLE_S        = float(os.environ.get('IB_SESSION_IDLE_MIN', '20')) * 60
+STR_SPILL_SUFFIX            = '.arrow'
+#============================================================================
+
+
+
+
+def frame_bytes(df):
+    """Memory held by a DataFrame: values, index and column labels."""
+    return int(df.memory_usage(deep=True, index=True).sum())
+
+
+class SessionStore:
+    """
+    The result frames of one session, held within a memory budget.
+
+    The session's uploaded PDFs (sources, the app's {header: PdfSource or None}) count
+    towards the budget too; they cannot be spilled, as the next run needs them, so they
+    leave less room for frames.
+
+    Frames are kept in memory in least-recently-used order. When the session holds more
+    than int_budget_bytes, first the pipeline's memoized stages and the session's leases
+    on shared extraction results are released (both can be rebuilt from the on-disk
+    extraction cache), then the least recently used frames
+    are written to Arrow IPC files and dropped. get() maps a spilled frame back in and
+    keeps it in memory again if it fits the budget; otherwise it is only loaded for that
+    call. A frame is written at most once, since stored frames are never modified.
+
+    job is the session's consolidation Job while it is queued or running (set by the
+    app); idle eviction leaves the session alone until it has finished. Otherwise it also
+    closes the sources, releasing their pdfplumber handles and spill files.
+
+    Streamlit drops a session's state some time after the browser disconnects; a
+    finalizer then deletes the spill directory.
+    """
+
+    def __init__(self, int_budget_bytes=INT_SESSION_BUDGET_BYTES, pipeline=None, leases=None, sources=None):
+        self.int_budget_bytes = int_budget_bytes
+        # Memoized stages (ResultPipeline) and shared extraction results (ResultLeases)
+        # released first under memory pressure
+        self.pipeline = pipeline
+        self.leases = leases
+        # Uploaded PDFs by header; the dict is updated in place by the app
+        self.sources = sources if sources is not None else {}
+        self.job = None
+        self.dict_frames = OrderedDict()
+        self.dict_sizes = {}
+        self.dict_spilled = {}
+        self.str_spill_dir = None
+        self._finalizer = None
+        self.float_last_active = time.monotonic()
+        self.lock = threading.RLock()
+        registry.add(self)
+
+    def _spill_dir(self):
+        if self.str_spill_dir is None:
+            self.str_spill_dir = tempfile.mkdtemp(prefix='ib_session_')
+            self._finalizer = weakref.finalize(self, shutil.rmtree, self.str_spill_dir, True)
+        return self.str_spill_dir
+
+    def touch(self):
+        self.float_last_active = time.monotonic()
+
+    def has(self, str_name):
+        return str_name in self.dict_sizes
+
+    def put(self, str_name, df):
+        """Store df under str_name (None removes it), then enforce the budget."""
+        with self.lock:
+            self.touch()
+            self._discard(str_name)
+            if df is not None:
+                self.dict_frames[str_name] = df
+                self.dict_sizes[str_name] = frame_bytes(df)
+            self.enforce_budget()
+
+    def get(self, str_name):
+        """The frame stored under str_name, or None."""
+        with self.lock:
+            self.touch()
+            if str_name in self.dict_frames:
+                self.dict_frames.move_to_end(str_name)
+                return self.dict_frames[str_name]
+            str_path = self.dict_spilled.get(str_name)
+            if str_path is None:
+                return None
+            df = data_export.read_frame(str_path)
+            if self.resident_bytes() + self.source_bytes() + self.dict_sizes[str_name] <= self.int_budget_bytes:
+                self.dict_frames[str_name] = df
+            return df
+
+    def take(self, str_name, positions, columns=None):
+        """
+        Rows at positions (restricted to columns, if given) of the frame stored under
+        str_name. A spilled frame is not loaded: only these rows are read from its file.
+        """
+        with self.lock:
+            self.touch()
+            if str_name in self.dict_frames:
+                self.dict_frames.move_to_end(str_name)
+                df = self.dict_frames[str_name].iloc[positions]
+            elif str_name in self.dict_spilled:
+                df = data_export.read_rows(self.dict_spilled[str_name], positions)
+            else:
+                return None
+        return df if columns is None else df[columns]
+
+    def _discard(self, str_name):
+        self.dict_frames.pop(str_name, None)
+        self.dict_sizes.pop(str_name, None)
+        str_path = self.dict_spilled.pop(str_name, None)
+        if str_path is not None:
+            try:
+                os.remove(str_path)
+            except OSError:
+                pass
+
+    def pipeline_bytes(self):
+        """Memory of memoized pipeline stages not shared with a stored frame (an upper bound:
+        consecutive merge steps share most of their columns)."""
+        if self.pipeline is None:
+            return 0
+        with self.lock:
+            set_stored = {id(df) for df in self.dict_frames.values()}
+        dict_unique = {id(value): value for value in self.pipeline.memo_values()}
+        return sum(frame_bytes(df) for key, df in dict_unique.items() if key not in set_stored)
+
+    def resident_bytes(self):
+        with self.lock:
+            return sum(self.dict_sizes[str_name] for str_name in self.dict_frames)
+
+    def _sources(self):
+        return [source for source in list(self.sources.values()) if source is not None]
+
+    def source_bytes(self):
+        """Memory of the uploaded PDFs."""
+        return sum(len(source.bytes_data) for source in self._sources())
+
+    def memory_bytes(self):
+        """Everything this session holds in memory: frames, memoized stages and uploaded PDFs."""
+        return self.resident_bytes() + self.pipeline_bytes() + self.source_bytes()
+
+    def holds_releasable(self):
+        """Whether evict() would release anything."""
+        return bool(self.dict_frames or self.pipeline_bytes()
+                    or (self.leases is not None and self.leases.held())
+                    or any(source.is_open() for source in self._sources()))
+
+    def spilled_bytes(self):
+        with self.lock:
+            return sum(self.dict_sizes[str_name] for str_name in self.dict_spilled
+                       if str_name not in self.dict_frames)
+
+    def job_active(self):
+        job = self.job
+        return job is not None and not job.done()
+
+    def _spill(self, str_name):
+        if str_name not in self.dict_spilled:
+            str_path = os.path.join(self._spill_dir(), str_name + STR_SPILL_SUFFIX)
+            data_export.write_arrow(self.dict_frames[str_name], str_path)
+            self.dict_spilled[str_name] = str_path
+        del self.dict_frames[str_name]
+
+    def _release_recomputable(self):
+        if self.pipeline is not None:
+            self.pipeline.clear()
+        if self.leases is not None:
+            self.leases.release_all()
+
+    def enforce_budget(self):
+        with self.lock:
+            if self.memory_bytes() <= self.int_budget_bytes:
+                return
+            self._release_recomputable()
+            int_sources = self.source_bytes()
+            while self.dict_frames and self.resident_bytes() + int_sources > self.int_budget_bytes:
+                self._spill(next(iter(self.dict_frames)))
+
+    def evict(self):
+        """Release everything this session holds in memory (e.g. when it is idle)."""
+        with self.lock:
+            self._release_recomputable()
+            for str_name in list(self.dict_frames):
+                self._spill(str_name)
+            for source in self._sources():
+                source.close()
+
+    def close(self):
+        with self.lock:
+            for str_name in list(self.dict_sizes):
+                self._discard(str_name)
+            if self._finalizer is not None:
+                self._finalizer()
+
+
+class SessionRegistry:
+    """All live SessionStores of the server process, for totals and idle eviction."""
+
+    def __init__(self):
+        self.set_stores = weakref.WeakSet()
+        self.lock = threading.Lock()
+
+    def add(self, store):
+        with self.lock:
+            self.set_stores.add(store)
+
+    def stores(self):
+        with self.lock:
+            return list(self.set_stores)
+
+    def evict_idle(self, float_idle_s=FLOAT_SESSION_IDLE_S):
+        """
+        Spill the frames and close the PDFs of every session idle for float_idle_s or longer;
+        returns how many. Sessions with a queued or running job are skipped: the job uses their
+        pipeline, leases and PDFs.
+        """
+        float_now = time.monotonic()
+        int_evicted = 0
+        for store in self.stores():
+            if store.job_active():
+                continue
+            if float_now - store.float_last_active >= float_idle_s and store.holds_releasable():
+                store.evict()
+                int_evicted += 1
+        return int_evicted
+
+    def totals(self):
+        """(sessions, bytes in memory, bytes spilled) over all sessions."""
+        lst_stores = self.stores()
+        return (len(lst_stores),
+                sum(store.memory_bytes() for store in lst_stores),
+                sum(store.spilled_bytes() for store in lst_stores))
+
+registry = SessionRegistry()
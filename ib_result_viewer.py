@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+
+import ib_result_schema as data_schema
+
+
+#============================================================================
+# Rows per page of the result grid, and the choices offered
+INT_PAGE_ROWS           = 50
+lst_page_rows           = [25, 50, 100, 250]
+# Column groups of the formatted results that hold overall (not per-subject) values
+lst_overall_groups      = ['pt_ee_tok', 'ee', 'tk', 'pt_total', 'result']
+# Candidate fields searched by the candidate filter
+lst_candidate_fields    = ['session_number', 'personal_code', 'name']
+#============================================================================
+
+
+
+
+def _field(df, str_name):
+    """Values of str_name, from an index level or a (flat) column; None if the frame has neither."""
+    if str_name in df.index.names:
+        return df.index.get_level_values(str_name)
+    if not isinstance(df.columns, pd.MultiIndex) and str_name in df.columns:
+        return df[str_name]
+    return None
+
+def _positions_by_value(values):
+    """dict value -> sorted row positions, for every non-missing value."""
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+    return {value: order[bounds[i]:bounds[i + 1]] for i, value in enumerate(uniques)}
+
+
+class ResultIndex:
+    """
+    Row-position indexes of one result frame (consolidated: a row per candidate and
+    subject; formatted: a row per candidate, a column group per subject), built once per
+    result so that filtering a page never scans the frame:
+
+        candidate : sorted lower-case keys (session number, personal code, full name and
+                    each word of the name) searched by prefix
+        subject   : subject -> rows with a value for it
+        result    : diploma result -> rows
+
+    Only positions are kept, never the frame.
+    """
+
+    def __init__(self, df):
+        self.int_rows = len(df)
+        self.columns = df.columns
+        self.bool_wide = isinstance(df.columns, pd.MultiIndex)
+
+        # Candidate search keys
+        lst_keys, lst_positions = [], []
+        positions = np.arange(self.int_rows)
+        for str_name in lst_candidate_fields:
+            values = _field(df, str_name)
+            if values is None:
+                continue
+            keys = pd.Series(np.asarray(values, dtype=object), index=positions, dtype=data_schema.dtype_string)
+            keys = keys.str.lower().str.strip('() ')
+            lst_keys.append(keys.to_numpy(dtype=object, na_value=''))
+            lst_positions.append(positions)
+            if str_name == 'name':
+                words = keys.str.split(r'[\s,]+', regex=True).explode()
+                words = words[words.str.len() > 0]
+                lst_keys.append(words.to_numpy(dtype=object))
+                lst_positions.append(words.index.to_numpy())
+        keys = np.concatenate(lst_keys) if lst_keys else np.array([], dtype=object)
+        order = np.argsort(keys, kind='stable')
+        self.array_keys = keys[order].astype(str)
+        self.array_key_rows = (np.concatenate(lst_positions)[order] if lst_positions
+                               else np.array([], dtype=np.int64))
+
+        # Subject -> rows
+        if self.bool_wide:
+            self.dict_subject_rows = {}
+            for str_group in df.columns.get_level_values(0).unique():
+                if str_group in lst_overall_groups:
+                    continue
+                columns = df.columns[df.columns.get_level_values(0) == str_group]
+                self.dict_subject_rows[str_group] = np.flatnonzero(df[columns].notna().any(axis=1).to_numpy())
+        else:
+            values = _field(df, 'subject_')
+            self.dict_subject_rows = _positions_by_value(values) if values is not None else {}
+
+        # Result -> rows
+        if self.bool_wide:
+            values = df[('result', 'FG')] if ('result', 'FG') in df.columns else None
+        else:
+            values = _field(df, 'result')
+        self.dict_result_rows = _positions_by_value(values) if values is not None else {}
+
+    def subjects(self):
+        return sorted(self.dict_subject_rows, key=str)
+
+    def results(self):
+        return sorted(self.dict_result_rows, key=str)
+
+    def match_candidate(self, str_query):
+        """Sorted rows whose candidate has a key starting with str_query (case-insensitive)."""
+        str_query = str_query.strip().lower().strip('()')
+        int_start = np.searchsorted(self.array_keys, str_query, side='left')
+        int_stop = np.searchsorted(self.array_keys, str_query + '\U0010ffff', side='left')
+        return np.unique(self.array_key_rows[int_start:int_stop])
+
+    def select(self, str_candidate='', str_subject=None, str_result=None):
+        """Sorted positions of the rows passing every given filter (all rows when none is)."""
+        empty = np.array([], dtype=np.int64)
+        rows = None
+        for rows_filter in (
+            self.match_candidate(str_candidate) if str_candidate and str_candidate.strip() else None,
+            self.dict_subject_rows.get(str_subject, empty) if str_subject is not None else None,
+            self.dict_result_rows.get(str_result, empty) if str_result is not None else None
+        ):
+            if rows_filter is None:
+                continue
+            rows = rows_filter if rows is None else np.intersect1d(rows, rows_filter, assume_unique=True)
+        return np.arange(self.int_rows) if rows is None else rows
+
+    def columns_for(self, str_subject):
+        """
+        Columns to show for str_subject: in the formatted results its own column group plus the
+        overall groups (None = all columns).
+        """
+        if not self.bool_wide or str_subject is None:
+            return None
+        groups = self.columns.get_level_values(0)
+        return self.columns[(groups == str_subject) | groups.isin(lst_overall_groups)]
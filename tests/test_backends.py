@@ -0,0 +1,52 @@
+"""
+The text-run backend against pdfplumber's extract_text() on the synthetic reports, in
+both PDF layouts: the same text on every page, and so the same extracted frames.
+
+    python -m pytest tests
+"""
+import io
+
+import pandas as pd
+import pdfplumber
+import pytest
+
+import ib_result_pdf as data_pdf
+import ib_result_pipeline as data_pipeline
+import ib_result_handler_summary as data_handler_sum
+import ib_result_handler_subject as data_handler_sub
+
+from benchmarks import synthetic_reports
+
+
+INT_CANDIDATES  = 30
+lst_layouts     = ['lines', 'runs']
+STR_REFERENCE   = data_pdf.PdfplumberBackend.str_name
+STR_TEXTRUNS    = data_pdf.TextRunBackend.str_name
+
+
+
+
+def page_texts(bytes_pdf, str_backend):
+    with pdfplumber.open(io.BytesIO(bytes_pdf)) as pdf:
+        return list(data_pdf.get_backend(str_backend).page_texts(pdf.pages))
+
+def extract(header, bytes_pdf, str_backend):
+    """The handler's extract_results for a report, serially; the frame of a subject report."""
+    if header == data_pipeline.STR_MAIN_HEADER:
+        return data_handler_sum.extract_results(bytes_pdf, int_workers=1, str_backend=str_backend)
+    df, _ = data_handler_sub.extract_results(bytes_pdf, int_workers=1, str_backend=str_backend)
+    return df
+
+@pytest.mark.parametrize('str_layout', lst_layouts)
+def test_backends_give_the_same_page_text(str_layout):
+    for header, bytes_pdf in synthetic_reports.report_pdfs(INT_CANDIDATES, 0, str_layout).items():
+        lst_reference = page_texts(bytes_pdf, STR_REFERENCE)
+        assert lst_reference, header
+        assert page_texts(bytes_pdf, STR_TEXTRUNS) == lst_reference, header
+
+@pytest.mark.parametrize('str_layout', lst_layouts)
+def test_backends_give_the_same_frames(str_layout):
+    for header, bytes_pdf in synthetic_reports.report_pdfs(INT_CANDIDATES, 1, str_layout).items():
+        df_reference = extract(header, bytes_pdf, STR_REFERENCE)
+        assert len(df_reference), header
+        pd.testing.assert_frame_equal(extract(header, bytes_pdf, STR_TEXTRUNS), df_reference, obj=header)
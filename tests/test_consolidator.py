@@ -0,0 +1,60 @@
+"""
+merge_all_results with duplicate keys in a source.
+
+    python -m pytest tests
+"""
+import pandas as pd
+
+import ib_result_consolidator as consolidator
+
+
+step_subject = {
+    'index_cols'    : ['session_number', 'personal_code', 'subject'],
+    'merge_cols'    : ['pg'],
+    'rename_map'    : {'pg': 'PG'}
+}
+
+
+
+
+def make_main():
+    return pd.DataFrame({
+        'session_number'    : ['001', '001', '002'],
+        'personal_code'     : ['(aa01)', '(aa01)', '(bb02)'],
+        'subject'           : ['Biology', 'History', 'Biology'],
+        'FG'                : ['6', '5', '7'],
+    })
+
+def test_unique_keys_drop_nothing():
+    df_source = pd.DataFrame({
+        'session_number'    : ['001', '002'],
+        'personal_code'     : ['(aa01)', '(bb02)'],
+        'subject'           : ['Biology', 'Biology'],
+        'pg'                : ['6', '7'],
+    })
+    lst_dropped = []
+    df_merged = consolidator.merge_all_results(make_main(), [(df_source, step_subject)], lst_dropped)
+    assert lst_dropped == []
+    assert df_merged['PG'].fillna('-').tolist() == ['6', '-', '7']
+
+def test_duplicate_keys_merge_first_row_and_report_the_rest(caplog):
+    df_source = pd.DataFrame({
+        'session_number'    : ['001', '001', '002', '001'],
+        'personal_code'     : ['(aa01)', '(aa01)', '(bb02)', '(aa01)'],
+        'subject'           : ['Biology', 'Biology', 'Biology', 'Biology'],
+        'pg'                : ['6', '4', '7', '3'],
+    })
+    lst_dropped = []
+    df_merged = consolidator.merge_all_results(make_main(), [(df_source, step_subject)], lst_dropped)
+
+    # One row per main row, the first source row of a key wins
+    assert len(df_merged) == 3
+    assert df_merged['PG'].fillna('-').tolist() == ['6', '-', '7']
+
+    # The other rows of that key are reported, with their original index
+    assert len(lst_dropped) == 1
+    int_source, df_dropped = lst_dropped[0]
+    assert int_source == 0
+    assert df_dropped.index.tolist() == [1, 3]
+    assert df_dropped['pg'].tolist() == ['4', '3']
+    assert "2 source row(s) with a duplicate" in caplog.text
@@ -0,0 +1,43 @@
+"""
+File-type detection on first pages whose text is split over several content streams.
+
+    python -m pytest tests
+"""
+import io
+
+import pdfplumber
+
+import ib_result_detect as data_detect
+from ib_result_pipeline import dict_header_map
+
+from benchmarks import synthetic_reports
+
+
+
+
+def first_page_pdf(lst_lines):
+    """One page with each line in a content stream of its own."""
+    return synthetic_reports.pdf_bytes([lst_lines], int_streams=len(lst_lines))
+
+def test_fixture_has_one_stream_per_line():
+    with pdfplumber.open(io.BytesIO(first_page_pdf(['(EXTENDED ESSAY)', 'Subject Results']))) as pdf:
+        assert len(list(data_detect.iter_first_page_streams(pdf.doc))) == 2
+        assert pdf.pages[0].extract_text() == '(EXTENDED ESSAY)\nSubject Results'
+
+def test_parent_header_in_a_later_stream():
+    # The EE marker comes first; its report title is only in the second stream
+    bytes_pdf = first_page_pdf(['(EXTENDED ESSAY)', 'Subject Results'])
+    assert data_detect.detect_file_type(bytes_pdf, dict_header_map) == ('(EXTENDED ESSAY)', data_detect.FLOAT_CONF_EXACT)
+
+def test_conflicting_header_in_a_later_stream():
+    # A higher-priority header in a later stream wins, with the conflict weighed in
+    bytes_pdf = first_page_pdf(['(EXTENDED ESSAY)', 'Results summary'])
+    assert data_detect.detect_file_type(bytes_pdf, dict_header_map) == (
+        'Results summary', data_detect.FLOAT_CONF_EXACT * data_detect.FLOAT_CONF_CONFLICT
+    )
+
+def test_whole_reports_split_into_streams():
+    lst_cohort = synthetic_reports.make_cohort(5)
+    for header, (_, func_pages) in synthetic_reports.dict_report_builders.items():
+        bytes_pdf = synthetic_reports.pdf_bytes(func_pages(lst_cohort), int_streams=3)
+        assert data_detect.detect_file_type(bytes_pdf, dict_header_map)[0] == header
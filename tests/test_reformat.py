@@ -0,0 +1,50 @@
+"""
+Missing values through the handlers' reformat_results stay missing (NA), not 'None'/'nan'.
+
+    python -m pytest tests
+"""
+import pandas as pd
+
+import ib_result_handler_summary as data_handler_sum
+import ib_result_handler_subject as data_handler_sub
+
+
+lst_string_columns = ['session', 'candidate', 'session_number', 'personal_code']
+
+
+
+
+def assert_string_column(series, lst_expected):
+    assert isinstance(series.dtype, pd.StringDtype), series.dtype
+    assert [None if pd.isna(value) else value for value in series] == lst_expected
+
+def test_summary_reformat_keeps_missing_values():
+    df = pd.DataFrame({
+        'candidate' : ['M25 - 100000 (gt0000)', None, 'M25 - 100001', 'M25 - 100000 (gt0000)'],
+        'name'      : ['Surname0, Given0', None, 'Surname1, Given1', 'Surname0, Given0'],
+        'subject'   : ['M25 - Biology HL', 'M25 - History SL', None, 'M25 - History EE'],
+        'grade'     : ['7', '5', '4', 'B'],
+    })
+    df = data_handler_sum.reformat_results(df)
+
+    assert_string_column(df['session'], ['M25', None, 'M25', 'M25'])
+    assert_string_column(df['candidate'], ['100000 (gt0000)', None, '100001', '100000 (gt0000)'])
+    assert_string_column(df['session_number'], ['100000', None, None, '100000'])
+    assert_string_column(df['personal_code'], ['(gt0000)', None, None, '(gt0000)'])
+    assert_string_column(df['name'], ['Surname0, Given0', None, 'Surname1, Given1', 'Surname0, Given0'])
+    assert df['subject_'].isna().tolist() == [False, False, True, False]
+    assert 'None' not in df['subject_'].cat.categories and 'nan' not in df['subject_'].cat.categories
+
+def test_subject_reformat_keeps_missing_values():
+    df = pd.DataFrame({
+        'candidate' : ['100001 (ky0001) - Surname1, Given1', None, '100002 - Surname2, Given2'],
+        'subject'   : ['Mathematics: analysis and approaches HL', 'Physics SL', None],
+        'pg'        : [7, 4, 5],
+    })
+    df = data_handler_sub.reformat_results(df)
+
+    assert_string_column(df['session'], ['100001 (ky0001)', None, '100002'])
+    assert_string_column(df['candidate'], ['Surname1, Given1', None, 'Surname2, Given2'])
+    assert_string_column(df['session_number'], ['100001', None, None])
+    assert_string_column(df['personal_code'], ['(ky0001)', None, None])
+    assert df['sub'].isna().tolist() == [False, False, True]